@@ -1,107 +1,319 @@
+import asyncio
 import os
-import re
-import time
-from flask import Flask, request, jsonify, send_file
-from google.genai import Client
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context, g, abort
 import json
-from docx import Document
-from docx.shared import Inches, RGBColor
-from docx.enum.text import WD_ALIGN_PARAGRAPH
 from io import BytesIO
-
-app = Flask(__name__, static_folder='.', static_url_path='')
+from response_cache import open_cache, make_key, normalize_text
+from singleflight import SingleFlight, AsyncSingleFlight
+from llm_gateway import LLMGateway, LLMUnavailable
+from model_router import ModelRouter, load_routes
+from llm_backend import create_llm_client
+from json_stream import IncrementalJSONParser
+from json_extract import extract_json, extract_json_detail, extract_stats
+from session_store import create_session_store
+from docx_sesion import DOCX_MIMETYPE, docx_filename, render_docx
+from docx_cache import DocxRenderCache
+from zip_stream import open_zip_stream
+from job_queue import JobQueue, QueueFull
+from curriculo import load_curriculo
+from retrieval import CurriculumRetriever
+from fallback_corpus import FallbackCorpus, FALLBACK_CORPUS_PATH
+from ept_catalog import open_catalog
+from metrics import REGISTRY, REQUEST_SECONDS, RequestTimings, stage, log_event, capture_raw_response, record_fallback
+from static_assets import register_static_assets, register_public_files, PageCache
+from schemas import SESION_SCHEMA, EPT_SCHEMA, sugerencias_schema, sugerencias_bulk_schema, seccion_schema, generation_config, parse_structured, parse_structured_detail, validate, structured_stats
+
+# Sin carpeta estática: la raíz del proyecto contiene código y bases SQLite que no deben descargarse
+app = Flask(__name__, static_folder=None)
+# Archivos sueltos del frontend (styles.css, script.js, imágenes...) por lista blanca
+register_public_files(app)
+# static/dist (build_assets.py): archivos con hash y cabeceras immutable
+register_static_assets(app)
+# Páginas HTML de entrada en memoria (invalidación por mtime)
+page_cache = PageCache(check_interval=float(os.environ.get('PAGE_CACHE_CHECK_INTERVAL', 2)))
+
+# Currículo (CNEB) indexado en memoria, leído una sola vez desde minedu_data.js
+curriculo = load_curriculo()
+
+# Recuperación local (TF-IDF de n-gramas) para responder /suggest sin Gemini cuando hay confianza
+retriever = CurriculumRetriever(curriculo)
+SUGGEST_LOCAL_THRESHOLD = float(os.environ.get('SUGGEST_LOCAL_THRESHOLD', 0.35))
+
+# Respaldo de /suggest cuando la IA falla (generado offline con fallback_corpus.py)
+fallback_corpus = FallbackCorpus.load(os.environ.get('FALLBACK_CORPUS_PATH', FALLBACK_CORPUS_PATH), curriculo)
 
 # --- CONFIGURACIÓN DE GEMINI API (¡VERSIÓN SEGURA!) ---
 # [CAMBIO DE SEGURIDAD] Uso exlusivo de variable de entorno (Render/Local)
 API_KEY = os.environ.get("GEMINI_API_KEY")
 
-if not API_KEY:
+# Backend LLM: gemini (real), fake (en proceso) o fake_server (fake_gemini_server.py) para pruebas de carga
+LLM_BACKEND = os.environ.get('LLM_BACKEND', 'gemini')
+
+if not API_KEY and LLM_BACKEND == 'gemini':
     # [VALIDACIÓN] Error bloqueante si no existe la clave
     raise ValueError("FATAL: La variable de entorno GEMINI_API_KEY no está definida. Configurela en el dashboard de Render o en su entorno local.")
 
 
 try:
-    client = Client(api_key=API_KEY)
+    client = create_llm_client(LLM_BACKEND, API_KEY)
 except Exception as e:
+    client = None
     print(f"ERROR: No se pudo crear el cliente Gemini. Detalle: {e}")
 
-# Variable global para almacenar la última sesión generada
-ultima_sesion = None
-import threading
-suggest_lock = threading.Lock()
+# Gateway async compartido por todos los endpoints (concurrencia acotada + limitador adaptativo)
+llm_gateway = LLMGateway(
+    client,
+    max_concurrency=int(os.environ.get('LLM_MAX_CONCURRENCY', 8)),
+    rate=float(os.environ.get('LLM_RATE_PER_SECOND', 2.0)),
+    burst=int(os.environ.get('LLM_BURST', 4)),
+    # Circuito: se abre tras N errores 429/503 seguidos y prueba de nuevo pasado el enfriamiento
+    breaker_threshold=int(os.environ.get('LLM_BREAKER_THRESHOLD', 5)),
+    breaker_cooldown=float(os.environ.get('LLM_BREAKER_COOLDOWN', 30)),
+    # Fracción máxima de reintentos respecto de las llamadas nuevas (compartida por todos los requests)
+    retry_budget_ratio=float(os.environ.get('LLM_RETRY_BUDGET_RATIO', 0.2)),
+    # Fracción máxima de llamadas que pueden duplicarse al modelo alternativo
+    hedge_budget_ratio=float(os.environ.get('LLM_HEDGE_BUDGET_RATIO', 0.1)),
+    # Segundos que una vista espera a Gemini (reintentos incluidos) antes de responder 429 con Retry-After
+    request_timeout=float(os.environ.get('LLM_REQUEST_TIMEOUT', 120))
+)
+
+# Modelo y tope de tokens por endpoint / tipo de sesión (LLM_ROUTES), con duplicado pasado el p95
+model_router = ModelRouter(
+    load_routes(),
+    llm_gateway,
+    hedge_quantile=float(os.environ.get('LLM_HEDGE_QUANTILE', 0.95)),
+    min_hedge_delay=float(os.environ.get('LLM_HEDGE_MIN_DELAY', 0.5))
+)
+
+# Sesiones generadas por session_id (compartidas entre workers, con TTL y tope de tamaño)
+session_store = create_session_store()
+
+# Progreso de los lotes de /generate_batch (consultable desde cualquier worker)
+batch_progress = open_cache('batch_progress.sqlite3', max_entries=500, ttl=6 * 3600)
+BATCH_MAX_SESSIONS = int(os.environ.get('BATCH_MAX_SESSIONS', 15))
+BATCH_MAX_PARALLEL = int(os.environ.get('BATCH_MAX_PARALLEL', 3))
+
+# Documentos Word pre-renderizados en segundo plano por session_id y versión
+docx_cache = DocxRenderCache(
+    max_bytes=int(os.environ.get('DOCX_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+    workers=int(os.environ.get('DOCX_RENDER_WORKERS', 2))
+)
+
+
+def docx_key(session_id, version=1):
+    # Con la versión en la clave, un worker nunca entrega el .docx de una versión anterior
+    return f"{session_id}:{version}"
+
+
+# Caché persistente de sugerencias (compartida entre workers y reinicios)
+suggest_cache = open_cache(
+    'suggest_cache.sqlite3',
+    max_entries=int(os.environ.get('SUGGEST_CACHE_MAX', 5000)),
+    ttl=int(os.environ.get('SUGGEST_CACHE_TTL', 7 * 24 * 3600))
+)
+
+# Catálogo curricular de EPT por (especialidad, nivel, grado); se llena con ept_catalog.py --warm y con la IA
+ept_catalog = open_catalog()
+
+# Agrupa prompts idénticos en curso para hacer una sola llamada a Gemini
+gemini_flight = SingleFlight()
+gemini_aflight = AsyncSingleFlight()
+
+# Salida estructurada: Gemini responde JSON según un esquema (STRUCTURED_OUTPUT=0 vuelve al modo texto)
+STRUCTURED_OUTPUT = os.environ.get('STRUCTURED_OUTPUT', '1') != '0'
+
+
+def generate_with_retry(route, prompt, retries=5, delay=3, config=None):
+    """
+    Intenta generar contenido con reintentos automáticos en caso de error 503 (Sobrecarga) o 429 (Resource Exhausted).
+    Los reintentos y el limitador de tasa corren en el gateway async, no en el hilo del request.
+    Si la llamada supera el p95 observado de la ruta, se duplica al modelo alternativo
+    y gana la primera respuesta. Devuelve (modelo, respuesta).
+    """
+    return llm_gateway.generate_routed(route, prompt, config=config, retries=retries, delay=delay)
 
 
-def extract_json_from_text(text):
+def parse_llm_json(model_name, response, schema=None):
     """
-    Intenta extraer un objeto JSON válido de un texto que puede contener Markdown.
+    JSON de una respuesta de Gemini: el objeto validado por esquema o el extraído del texto.
+    Devuelve (objeto, truncado); truncado es True si la respuesta llegó cortada y se reparó.
     """
-    # 1. Intentar encontrar bloque de código JSON ```json ... ```
-    match = re.search(r'```json\s*(\{.*?\})\s*```', text, re.DOTALL)
-    if match:
-        return match.group(1)
-    
-    # 2. Intentar parsear todo el texto directamente (por si ya es JSON limpio)
+    text = (response.text or '').strip()
+    capture_raw_response(model_name, text)
     try:
-        json.loads(text)
-        return text
+        with stage('extract'):
+            if schema is None:
+                return extract_json_detail(text)
+            return parse_structured_detail(text, schema, getattr(response, 'parsed', None))
     except json.JSONDecodeError:
-        pass
+        capture_raw_response(model_name, text, force=True)
+        raise
 
-    # 3. Intentar encontrar cualquier bloque entre llaves {}
-    # Buscamos la primera llave { y la última llave }
-    match = re.search(r'(\{.*\})', text, re.DOTALL)
-    if match:
-        return match.group(1)
-        
-    # 4. Si no hay marcadores, intentar el texto completo (limpiando espacios)
-    return text.strip()
 
+def generate_json(ruta, prompt, schema=None):
+    return generate_json_detail(ruta, prompt, schema)[0]
 
-def generate_with_retry(model_name, prompt, retries=5, delay=3):
+
+def generate_json_detail(ruta, prompt, schema=None):
     """
-    Intenta generar contenido con reintentos automáticos en caso de error 503 (Sobrecarga) o 429 (Resource Exhausted).
+    Genera contenido y devuelve el JSON ya parseado. `ruta` ("suggest",
+    "sesion_detallada"...) decide el modelo y el tope de tokens (model_router.py).
+    Con un esquema (y STRUCTURED_OUTPUT activo) Gemini responde directamente un
+    objeto validado; sin él se extrae el JSON del texto. Si varios requests
+    envían el mismo prompt a la misma ruta a la vez, comparten una única llamada.
+    Devuelve (objeto, truncado), como parse_llm_json; generate_json solo el objeto.
     """
-    for attempt in range(retries):
-        try:
-            response = client.models.generate_content(
-                model=model_name,
-                contents=prompt
-            )
-            return response
-        except Exception as e:
-            error_str = str(e)
-            # Detectar error 503, "overloaded" o 429 "ResourceExhausted"
-            is_overloaded = "503" in error_str or "overloaded" in error_str.lower()
-            is_resource_exhausted = "429" in error_str or "ResourceExhausted" in error_str or "RESOURCE_EXHAUSTED" in error_str
-
-            if is_overloaded or is_resource_exhausted:
-                if attempt < retries - 1:
-                    wait_time = delay * (2 ** attempt) # Backoff exponencial: 2s, 4s...
-                    print(f"ALERTA: Modelo ocupado (429/503). Reintentando en {wait_time}s... (Intento {attempt + 1}/{retries})")
-                    time.sleep(wait_time)
-                    continue
-            
-            # Si es el último intento y sigue fallando con 429/503, lanzamos un error que podamos capturar
-            if attempt == retries - 1 and (is_overloaded or is_resource_exhausted):
-                raise Exception("SERVICE_UNAVAILABLE_429")
-                
-            raise e
+    if not STRUCTURED_OUTPUT:
+        schema = None
+
+    def _call():
+        route = model_router.route(ruta)
+        config = generation_config(schema, route.max_output_tokens)
+        modelo, response = generate_with_retry(route, prompt, config=config)
+        return parse_llm_json(modelo, response, schema)
+
+    with stage('llm'):
+        return gemini_flight.do((ruta, prompt, schema is not None), _call)
+
+
+async def agenerate_json(ruta, prompt, schema=None):
+    return (await agenerate_json_detail(ruta, prompt, schema))[0]
+
+
+async def agenerate_json_detail(ruta, prompt, schema=None):
+    """
+    Igual que generate_json_detail pero sin bloquear: para el servidor ASGI (asgi.py).
+    La llamada corre en el loop del gateway y se espera sin ocupar un hilo.
+    """
+    if not STRUCTURED_OUTPUT:
+        schema = None
+
+    async def _call():
+        route = model_router.route(ruta)
+        config = generation_config(schema, route.max_output_tokens)
+        future = llm_gateway.submit(llm_gateway.agenerate_routed(route, prompt, config=config))
+        modelo, response = await asyncio.wrap_future(future)
+        return parse_llm_json(modelo, response, schema)
+
+    with stage('llm'):
+        return await gemini_aflight.do((ruta, prompt, schema is not None), _call)
+
+
+def json_response(result):
+    """
+    Convierte (payload, status, headers) de la lógica compartida en una respuesta Flask.
+    """
+    payload, status, headers = result
+    return jsonify(payload), status, headers
+
+
+@app.before_request
+def iniciar_metricas():
+    g.timings = RequestTimings(request.endpoint)
+
+
+@app.after_request
+def registrar_metricas(response):
+    """
+    Agrega Server-Timing con las etapas medidas y, al cerrar la respuesta (también
+    en streaming), registra la duración total y una línea de log estructurada.
+    """
+    timings = g.get('timings')
+    if timings is None:
+        return response
+    response.headers['Server-Timing'] = timings.server_timing()
+    method = request.method
+    path = request.path
+
+    def finalizar():
+        elapsed = timings.elapsed()
+        REQUEST_SECONDS.observe(elapsed, endpoint=timings.endpoint, method=method, status=response.status_code)
+        log_event('request', request_id=timings.request_id, endpoint=timings.endpoint, method=method, path=path,
+                  status=response.status_code, duration_ms=round(elapsed * 1000, 1),
+                  stages={k: round(v * 1000, 1) for k, v in timings.stages.items()})
+
+    response.call_on_close(finalizar)
+    return response
+
+
+@app.route('/metrics')
+def metrics():
+    """
+    Métricas en formato Prometheus (por proceso/worker).
+    """
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
 
 
 @app.route('/')
+@app.route('/index.html')
 def index():
-    try:
-        with open('index.html', 'r', encoding='utf-8') as f:
-            return f.read()
-    except FileNotFoundError:
+    # Desde memoria (versión de build_assets.py si existe), con ETag/304 y br/gzip
+    response = page_cache.response('index.html')
+    if response is None:
         return "Error: No se encuentra el archivo index.html.", 500
+    return response
 
 
-@app.route('/suggest', methods=['POST'])
-def generar_sugerencias():
-    
-    datos = request.json
+@app.route('/home.html')
+def home():
+    response = page_cache.response('home.html')
+    if response is None:
+        abort(404)
+    return response
+
+
+def curriculo_response(payload, etag):
+    response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'public, max-age=0, must-revalidate'
+    return response.make_conditional(request)
+
+
+@app.route('/curriculum')
+def curriculum():
+    """
+    Currículo completo, o solo el de un nivel con ?nivel=Primaria. Soporta ETag / 304.
+    """
+    nivel = request.args.get('nivel')
+    if not nivel:
+        return curriculo_response(curriculo.data, curriculo.etag)
+
+    slice_nivel = curriculo.slice(nivel)
+    if slice_nivel is None:
+        return jsonify({"error": f"Nivel desconocido: {nivel}"}), 404
+    return curriculo_response(*slice_nivel)
+
+
+@app.route('/curriculum/search')
+def curriculum_search():
+    q = request.args.get('q', '')
+    tipo = request.args.get('tipo')
+    try:
+        limit = min(int(request.args.get('limit', 20)), 100)
+    except ValueError:
+        limit = 20
+    return jsonify({"resultados": curriculo.search(q, tipo=tipo, limit=limit)})
+
+
+@app.route('/curriculum/validate', methods=['POST'])
+def curriculum_validate():
+    errores = curriculo.validate(request.json or {})
+    return jsonify({"valido": not errores, "errores": errores})
+
+
+SUGGEST_ROUTE = "suggest"
+SUGGEST_BULK_ROUTE = "suggest_bulk"
+
+
+def preparar_sugerencias(datos):
+    """
+    Lo que /suggest resuelve sin IA (validación, caché y currículo local).
+    Devuelve (respuesta, None) si ya hay respuesta, o (None, contexto) para llamar a la IA.
+    """
+    datos = datos or {}
     campo = datos.get("campo")
     tema = datos.get("tema")
     nivel = datos.get("nivel")
@@ -110,24 +322,26 @@ def generar_sugerencias():
 
     # Validar datos estrictamente
     if not all([campo, tema, nivel, grado, area]):
-        return jsonify({"error": "Faltan datos requeridos (Tema, Nivel, Grado o Área)."}), 400
-    # -------------------------------------------------------------
-    # FALLBACK PROFESIONAL (Respaldo estático cuando falla la AI)
-    # -------------------------------------------------------------
-    FALLBACK_SUGGESTIONS = {
-        "Inicial": {
-            "desempeno": ["Participa en conversaciones espontáneas.", "Explora materiales con sus sentidos.", "Reconoce partes de su cuerpo.", "Expresa sus emociones verbal y no verbalmente."]
-        },
-        "Primaria": {
-            "desempeno": ["Recupera información explícita de textos orales.", "Explica el tema y el propósito comunicativo.", "Deduce características implícitas de personas y personajes.", "Adecúa el texto a la situación comunicativa."]
-        },
-        "Secundaria": {
-            "desempeno": ["Identifica información explícita, relevante y complementaria.", "Infiere e interpreta información del texto escrito.", "Justifica su posición sobre textos leídos.", "Evalúa el uso del lenguaje y la intención del autor."]
-        }
-    }
+        return ({"error": "Faltan datos requeridos (Tema, Nivel, Grado o Área)."}, 400, {}), None
 
-    try:
-        prompt = f"""
+    # force_ai: el docente pide explícitamente una respuesta nueva de la IA
+    force_ai = bool(datos.get("force_ai"))
+    cache_key = make_key(campo, tema, nivel, grado, area)
+
+    if force_ai:
+        retriever.record_forced()
+    else:
+        # Respuesta desde caché si alguien ya pidió lo mismo (sin tildes, mayúsculas ni espacios extra)
+        cached = suggest_cache.get(cache_key)
+        if cached is not None:
+            return ({"sugerencias": cached, "origen": "cache"}, 200, {}), None
+
+        # Respuesta local desde el currículo si el mejor candidato es suficientemente parecido
+        locales = retriever.suggest(tema, campo, curriculo.canonical_area(area), grado, SUGGEST_LOCAL_THRESHOLD)
+        if locales:
+            return ({"sugerencias": locales, "origen": "local"}, 200, {}), None
+
+    prompt = f"""
 Eres experto en el Currículo MINEDU.
 Con los datos:
 Tema: {tema}
@@ -146,37 +360,54 @@ Genera SOLO un JSON válido:
 }}
 """
 
-        try:
-            response = generate_with_retry("gemini-2.5-flash-lite", prompt)
-            
-            texto = response.text.strip()
-            json_text = extract_json_from_text(texto)
-            data = json.loads(json_text)
-            key = campo + "_sugerencias"
-            
-            if key in data:
-                return jsonify({"sugerencias": data[key]})
-            
-            # Si la key no está, intentar buscar cualquier lista
-            first_key = list(data.keys())[0] if data.keys() else None
-            if first_key and isinstance(data[first_key], list):
-                return jsonify({"sugerencias": data[first_key]})
+    contexto = {
+        "campo": campo, "nivel": nivel, "grado": grado, "area": area,
+        "cache_key": cache_key, "prompt": prompt, "schema": sugerencias_schema(campo)
+    }
+    return None, contexto
+
+
+def sugerencias_de_ia(contexto, data, truncado=False):
+    key = contexto["campo"] + "_sugerencias"
+
+    if key in data:
+        lista = data[key]
+    else:
+        # Si la key no está, intentar buscar cualquier lista
+        first_key = list(data.keys())[0] if data.keys() else None
+        lista = data[first_key] if first_key and isinstance(data[first_key], list) else None
+
+    if lista is not None:
+        # Una respuesta truncada y reparada puede traer menos opciones: se usa, pero no se cachea
+        if not truncado:
+            suggest_cache.set(contexto["cache_key"], lista)
+        return {"sugerencias": lista}, 200, {}
+
+    return {"error": "No se pudieron generar sugerencias."}, 500, {}
+
+
+def sugerencias_de_respaldo(contexto, e):
+    # Si falla la IA (429, 500, Json error...), usamos FALLBACK
+    print(f"⚠️ ERROR IA ({e}) -> USANDO FALLBACK LOCAL")
+    record_fallback('fallback_corpus')
+
+    # Respaldo precalculado por nivel/área/grado/campo (genérico si no hay nada mejor)
+    sugerencias = fallback_corpus.lookup(contexto["nivel"], contexto["area"], contexto["grado"], contexto["campo"])
+    return {"sugerencias": sugerencias, "origen": "respaldo"}, 200, {}
+
+
+@app.route('/suggest', methods=['POST'])
+def generar_sugerencias():
+    try:
+        respuesta, contexto = preparar_sugerencias(request.json)
+        if respuesta is not None:
+            return json_response(respuesta)
 
+        try:
+            data, truncado = generate_json_detail(SUGGEST_ROUTE, contexto["prompt"], schema=contexto["schema"])
+            return json_response(sugerencias_de_ia(contexto, data, truncado))
         except Exception as e:
-            # Si falla la IA (429, 500, Json error...), usamos FALLBACK
-            print(f"⚠️ ERROR IA ({e}) -> USANDO FALLBACK LOCAL")
-            
-            # Determinar fallback según nivel
-            nivel_key = nivel if nivel in FALLBACK_SUGGESTIONS else "Primaria"
-            campo_key = "desempeno" # Por ahora solo tenemos fallback robusto para desempeno
-            
-            if campo_key in FALLBACK_SUGGESTIONS[nivel_key]:
-                return jsonify({"sugerencias": FALLBACK_SUGGESTIONS[nivel_key][campo_key]})
-            
-            # Si no hay fallback específico, devolver genérico
-            return jsonify({"sugerencias": ["Opción sugerida estándar 1 (IA ocupada)", "Opción sugerida estándar 2 (IA ocupada)"]})
-
-        return jsonify({"error": "No se pudieron generar sugerencias."}), 500
+            return json_response(sugerencias_de_respaldo(contexto, e))
 
     except Exception as e:
         print(f"ERROR CRITICO EN SUGGEST: {e}")
@@ -184,35 +415,187 @@ Genera SOLO un JSON válido:
 
 
 
-@app.route('/generate', methods=['POST'])
-def generar_sesion():
-    global ultima_sesion
+# Campos que /suggest_bulk resuelve por defecto, con lo que se le pide a la IA para cada uno
+SUGGEST_BULK_CAMPOS = {
+    'competencia': 'competencias del área para el tema',
+    'capacidad': 'capacidades de esas competencias',
+    'desempeno': 'desempeños precisados para el grado',
+    'criterios': 'criterios de evaluación observables',
+    'evidencia': 'evidencias de aprendizaje (productos o actuaciones)',
+    'proposito': 'propósitos de aprendizaje de la sesión',
+}
+SUGGEST_BULK_MAX_CAMPOS = 12
+
+
+def preparar_sugerencias_bulk(datos):
+    """
+    Como preparar_sugerencias, pero para varios campos a la vez. Cada campo se
+    busca en la caché (misma clave que /suggest) y en el currículo local; los que
+    faltan se piden a la IA en un solo prompt. Devuelve (respuesta, None) si no
+    hace falta la IA, o (None, contexto).
+    """
+    datos = datos or {}
+    tema = datos.get("tema")
+    nivel = datos.get("nivel")
+    grado = datos.get("grado")
+    area = datos.get("area")
+
+    if not all([tema, nivel, grado, area]):
+        return ({"error": "Faltan datos requeridos (Tema, Nivel, Grado o Área)."}, 400, {}), None
+
+    campos = datos.get("campos") or list(SUGGEST_BULK_CAMPOS)
+    if not isinstance(campos, list) or not all(isinstance(c, str) and c.strip() for c in campos):
+        return ({"error": "'campos' debe ser una lista de nombres de campo."}, 400, {}), None
+    if len(campos) > SUGGEST_BULK_MAX_CAMPOS:
+        return ({"error": f"Máximo {SUGGEST_BULK_MAX_CAMPOS} campos por solicitud."}, 400, {}), None
+
+    force_ai = bool(datos.get("force_ai"))
+    sugerencias, origen, pendientes = {}, {}, {}
+
+    for campo in campos:
+        cache_key = make_key(campo, tema, nivel, grado, area)
+        if force_ai:
+            retriever.record_forced()
+        else:
+            cached = suggest_cache.get(cache_key)
+            if cached is not None:
+                sugerencias[campo], origen[campo] = cached, "cache"
+                continue
+            locales = retriever.suggest(tema, campo, curriculo.canonical_area(area), grado, SUGGEST_LOCAL_THRESHOLD)
+            if locales:
+                sugerencias[campo], origen[campo] = locales, "local"
+                continue
+        # Clave JSON sin tildes ni espacios ("Desempeño" -> "desempeno")
+        clave = normalize_text(campo).replace(' ', '_')
+        pendientes.setdefault(clave, []).append((campo, cache_key))
+
+    if not pendientes:
+        return ({"sugerencias": sugerencias, "origen": origen}, 200, {}), None
+
+    lineas = []
+    for clave in pendientes:
+        descripcion = SUGGEST_BULK_CAMPOS.get(clave)
+        lineas.append(f"- {clave}_sugerencias: {descripcion}" if descripcion else f"- {clave}_sugerencias")
+    plantilla = ',\n'.join(f'    "{clave}_sugerencias": ["Opción 1", "Opción 2", "Opción 3", "Opción 4"]' for clave in pendientes)
+
+    prompt = f"""
+Eres experto en el Currículo MINEDU.
+Con los datos:
+Tema: {tema}
+Nivel: {nivel}
+Grado: {grado}
+Área: {area}
+
+Da 4 opciones breves y coherentes entre sí para cada campo:
+{chr(10).join(lineas)}
+
+Genera SOLO un JSON válido:
+{{
+{plantilla}
+}}
+"""
 
+    contexto = {
+        "nivel": nivel, "grado": grado, "area": area,
+        "sugerencias": sugerencias, "origen": origen, "pendientes": pendientes,
+        "prompt": prompt, "schema": sugerencias_bulk_schema(list(pendientes))
+    }
+    return None, contexto
+
+
+def sugerencias_bulk_de_ia(contexto, data, truncado=False):
+    sugerencias, origen = dict(contexto["sugerencias"]), dict(contexto["origen"])
+    for clave, campos in contexto["pendientes"].items():
+        lista = data.get(f"{clave}_sugerencias") if isinstance(data, dict) else None
+        for campo, cache_key in campos:
+            if isinstance(lista, list) and lista:
+                # Cada campo queda en la caché de /suggest: el próximo foco en ese campo no llama a la IA
+                # (salvo que la respuesta se haya reparado: esa lista puede estar incompleta)
+                if not truncado:
+                    suggest_cache.set(cache_key, lista)
+                sugerencias[campo], origen[campo] = lista, "ia"
+            else:
+                sugerencias[campo] = fallback_corpus.lookup(contexto["nivel"], contexto["area"], contexto["grado"], campo)
+                origen[campo] = "respaldo"
+    return {"sugerencias": sugerencias, "origen": origen}, 200, {}
+
+
+def sugerencias_bulk_de_respaldo(contexto, e):
+    print(f"⚠️ ERROR IA ({e}) -> USANDO FALLBACK LOCAL (bulk)")
+    record_fallback('fallback_corpus')
+    return sugerencias_bulk_de_ia(contexto, {})
+
+
+@app.route('/suggest_bulk', methods=['POST'])
+def generar_sugerencias_bulk():
     try:
-        datos = request.json
+        respuesta, contexto = preparar_sugerencias_bulk(request.json)
+        if respuesta is not None:
+            return json_response(respuesta)
 
-        # OBTENER TODOS LOS DATOS DEL FORMULARIO
-        tema = datos.get('tema', 'Tema no especificado')
-        nivel = datos.get('nivel', 'N/A')
-        grado = datos.get('grado', 'N/A')
-        area = datos.get('area', 'N/A')
-        competencia = datos.get('competencia', 'N/A')
-        capacidad = datos.get('capacidad', 'N/A')
-        desempeno = datos.get('desempeno', 'N/A')
-        comp_transversal = datos.get('comp_transversal', 'N/A')
-        cap_transversal = datos.get('cap_transversal', 'N/A')
-        enfoque = datos.get('enfoque', 'N/A')
-        valor = datos.get('valor', 'N/A')
-        
         try:
-            tiempo_total_user = int(datos.get('tiempo', 90))
-        except ValueError:
-            tiempo_total_user = 90
-
-        tipo_sesion = datos.get('tipo_sesion', 'Detallada')
-        
-        # --- PROMPT MAESTRO OPTIMIZADO DEL USUARIO ---
-        prompt = f"""
+            data, truncado = generate_json_detail(SUGGEST_BULK_ROUTE, contexto["prompt"], schema=contexto["schema"])
+            return json_response(sugerencias_bulk_de_ia(contexto, data, truncado))
+        except Exception as e:
+            return json_response(sugerencias_bulk_de_respaldo(contexto, e))
+
+    except Exception as e:
+        print(f"ERROR CRITICO EN SUGGEST_BULK: {e}")
+        return jsonify({"error": f"Error interno: {str(e)}"}), 500
+
+
+@app.route('/cache_stats')
+def cache_stats():
+    return jsonify({
+        "suggest": suggest_cache.stats(),
+        "retrieval": retriever.stats(),
+        "fallback_corpus": fallback_corpus.stats(),
+        "ept_catalog": ept_catalog.stats(),
+        "pages": page_cache.stats()
+    })
+
+
+@app.route('/llm_stats')
+def llm_stats():
+    return jsonify({
+        "singleflight": gemini_flight.stats(),
+        "singleflight_async": gemini_aflight.stats(),
+        "json_extraction": extract_stats(),
+        "structured_output": structured_stats(),
+        "gateway": llm_gateway.stats(),
+        "routing": model_router.stats(),
+        "jobs": generation_jobs.stats(),
+        "sessions": session_store.stats(),
+        "docx_cache": docx_cache.stats()
+    })
+
+
+def build_session_prompt(datos):
+    """
+    Construye el prompt maestro de la sesión a partir de los datos del formulario.
+    """
+    # OBTENER TODOS LOS DATOS DEL FORMULARIO
+    tema = datos.get('tema', 'Tema no especificado')
+    nivel = datos.get('nivel', 'N/A')
+    grado = datos.get('grado', 'N/A')
+    area = datos.get('area', 'N/A')
+    competencia = datos.get('competencia', 'N/A')
+    capacidad = datos.get('capacidad', 'N/A')
+    desempeno = datos.get('desempeno', 'N/A')
+    comp_transversal = datos.get('comp_transversal', 'N/A')
+    cap_transversal = datos.get('cap_transversal', 'N/A')
+    enfoque = datos.get('enfoque', 'N/A')
+    valor = datos.get('valor', 'N/A')
+    
+    try:
+        tiempo_total_user = int(datos.get('tiempo', 90))
+    except ValueError:
+        tiempo_total_user = 90
+
+    tipo_sesion = datos.get('tipo_sesion', 'Detallada')
+    
+    # --- PROMPT MAESTRO OPTIMIZADO DEL USUARIO ---
+    prompt = f"""
 Eres un especialista en diseño curricular del MINEDU – Perú.
 Actúas como asistente pedagógico del docente.
 
@@ -270,51 +653,398 @@ SALIDA OBLIGATORIA (JSON EXACTO):
   }}
 }}
 """
+    return prompt
+
+
+def ia_ocupada(e):
+    """
+    429 con Retry-After cuando Gemini no está disponible (circuito abierto o reintentos agotados).
+    """
+    payload = {
+        'error': 'La IA está ocupada en este momento. Por favor espera unos segundos.',
+        'retry_after': int(e.retry_after_header())
+    }
+    return payload, 429, {'Retry-After': e.retry_after_header()}
+
+
+def ruta_sesion(datos):
+    # Una sesión Resumida responde bastante menos texto: otro tope de tokens y su propio p95
+    tipo = str((datos or {}).get('tipo_sesion') or 'Detallada').strip().lower()
+    return 'sesion_resumida' if tipo == 'resumida' else 'sesion_detallada'
+
+
+def sesion_generada(datos, sesion_data):
+    # Guardar la sesión para la descarga
+    session_id = session_store.save(datos, sesion_data)
+    docx_cache.schedule(docx_key(session_id), datos, sesion_data)
+
+    # Devolver el JSON de la sesión
+    return {'sesion': sesion_data, 'session_id': session_id}, 200, {}
+
 
-        # Llamada a la API de Gemini con Retry
-        response = generate_with_retry(
-            model_name='gemini-2.5-flash-lite',
-            prompt=prompt
+def sesion_desde_datos(datos):
+    """
+    Genera la sesión completa para `datos` (usado por /generate y por la cola de trabajos).
+    """
+    try:
+        prompt = build_session_prompt(datos)
+
+        # Llamada a la API de Gemini con Retry (y extracción robusta de JSON)
+        sesion_data = generate_json(
+            ruta=ruta_sesion(datos),
+            prompt=prompt,
+            schema=SESION_SCHEMA
         )
+        return sesion_generada(datos, sesion_data)
+
+    except Exception as e:
+        return error_sesion(e)
 
-        response_text = response.text.strip()
 
-        # Extracción robusta de JSON
-        json_text = extract_json_from_text(response_text)
+def quiere_trabajo(datos):
+    # Modo asíncrono: {"async": true} devuelve un job_id en vez de esperar la generación
+    return isinstance(datos, dict) and bool(datos.get('async'))
 
-        sesion_data = json.loads(json_text)
 
-        # Guardar la sesión para la descarga
-        ultima_sesion = {
-            'datos_form': datos,
-            'sesion': sesion_data
+def encolar_sesion(datos):
+    """
+    Encola la generación y responde 202 con el job_id, o 429 con un Retry-After
+    estimado a partir de la profundidad de la cola y del ritmo observado.
+    """
+    prioridad = datos.get('prioridad', 'normal')
+    datos = {k: v for k, v in datos.items() if k not in ('async', 'prioridad')}
+    try:
+        estado = generation_jobs.submit(datos, prioridad)
+    except QueueFull as e:
+        payload = {
+            'error': 'Hay muchas sesiones en cola en este momento. Intenta de nuevo en unos segundos.',
+            'retry_after': e.retry_after
         }
+        return payload, 429, {'Retry-After': str(e.retry_after)}
+
+    url = f"/jobs/{estado['job_id']}"
+    payload = {**estado, 'status_url': url, 'events_url': f"{url}/events"}
+    return payload, 202, {'Location': url, 'Retry-After': str(estado.get('retry_after', 1))}
 
-        # Devolver el JSON de la sesión
-        return jsonify({'sesion': sesion_data})
 
-    except json.JSONDecodeError as e:
+def error_sesion(e):
+    if isinstance(e, json.JSONDecodeError):
+        response_text = e.doc
         error_msg = f"Error de formato JSON. La IA respondió: {response_text[:200]}..."
         print(f"TRACEBACK: {str(e)}")
-        print(f"RAW RESPONSE TEXT:\n{response_text}") # Log clave para depuración
-        return jsonify({'error': error_msg}), 500
+        # La respuesta cruda ya quedó en el log estructurado (llm_raw_response)
+        return {'error': error_msg}, 500, {}
+
+    if isinstance(e, LLMUnavailable):
+        # Respuesta inmediata: el cliente sabe cuándo volver a intentar
+        return ia_ocupada(e)
+
+    error_msg = str(e)
+    print(f"TRACEBACK: {error_msg}")
+    return {'error': f"Error al generar la sesión: {error_msg}"}, 500, {}
 
+
+@app.route('/generate', methods=['POST'])
+def generar_sesion():
+    try:
+        datos = request.json
     except Exception as e:
-        error_msg = str(e)
-        if "SERVICE_UNAVAILABLE_429" in error_msg:
-             return jsonify({'error': 'La IA está ocupada en este momento. Por favor espera unos segundos.'}), 429
+        return json_response(error_sesion(e))
+    if quiere_trabajo(datos):
+        return json_response(encolar_sesion(datos))
+    return json_response(sesion_desde_datos(datos))
+
+
+# Trabajos de /generate en modo asíncrono: cola con prioridad y pool acotado de hilos.
+# La cola es por proceso: GENERATE_QUEUE_MAX (total) se reparte entre los WEB_CONCURRENCY workers
+generation_jobs = JobQueue(
+    sesion_desde_datos,
+    open_cache('jobs.sqlite3', max_entries=5000, ttl=6 * 3600),
+    workers=int(os.environ.get('GENERATE_JOB_WORKERS', 4)),
+    max_depth=max(1, int(os.environ.get('GENERATE_QUEUE_MAX', 100)) // int(os.environ.get('WEB_CONCURRENCY', 1))),
+    endpoint='generar_sesion_job'
+)
+JOB_MAX_WAIT = float(os.environ.get('JOB_MAX_WAIT', 25))
+
+
+@app.route('/jobs/<job_id>')
+def estado_trabajo(job_id):
+    """
+    Estado de un trabajo. Con ?wait=N (segundos) hace long-poll hasta que termine.
+    """
+    wait = min(max(request.args.get('wait', 0, type=float), 0), JOB_MAX_WAIT)
+    estado = generation_jobs.wait(job_id, wait) if wait else generation_jobs.status(job_id)
+    if estado is None:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    headers = {}
+    if estado['estado'] in ('en_cola', 'procesando'):
+        headers['Retry-After'] = str(estado.get('retry_after', 1))
+    return jsonify(estado), 200, headers
+
+
+@app.route('/jobs/<job_id>/events')
+def eventos_trabajo(job_id):
+    """
+    Suscripción por Server-Sent Events: un evento 'estado' por cada cambio y 'done' al terminar.
+    """
+    if generation_jobs.status(job_id) is None:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+
+    def eventos():
+        anterior = None
+        while True:
+            estado = generation_jobs.wait(job_id, JOB_MAX_WAIT)
+            if estado is None:
+                yield sse_event('error', {'error': 'Trabajo no encontrado'})
+                return
+            if estado['estado'] in ('completado', 'error'):
+                yield sse_event('done', estado)
+                return
+            # Si no hubo cambios se manda igual como latido (mantiene viva la conexión)
+            clave = (estado['estado'], estado.get('posicion'))
+            yield sse_event('estado', estado) if clave != anterior else ": ping\n\n"
+            anterior = clave
+
+    return Response(
+        stream_with_context(eventos()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+# Secciones que /generate_stream envía al navegador apenas están completas
+STREAM_SECTIONS = {
+    ('titulo_sesion',),
+    ('proposito',),
+    ('evidencia',),
+    ('estandar_aprendizaje',),
+    ('criterios_evaluacion',),
+    ('secuencia_didactica', 'inicio'),
+    ('secuencia_didactica', 'desarrollo'),
+    ('secuencia_didactica', 'cierre'),
+}
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.route('/generate_stream', methods=['POST'])
+def generar_sesion_stream():
+    """
+    Variante de /generate con Server-Sent Events: usa el streaming de Gemini y envía
+    cada sección (propósito, evidencia, criterios, inicio/desarrollo/cierre) apenas
+    se completa. Al final envía la sesión completa y la deja lista para /download.
+    """
+    datos = request.json or {}
+    prompt = build_session_prompt(datos)
+    route = model_router.route(ruta_sesion(datos))
+    # El streaming no se duplica (las secciones ya se están enviando), pero respeta modelo y tope de la ruta
+    config = generation_config(SESION_SCHEMA if STRUCTURED_OUTPUT else None, route.max_output_tokens)
+    structured = STRUCTURED_OUTPUT
+
+    def eventos():
+        parser = IncrementalJSONParser()
+        partes = []
+        try:
+            # Si el router pasó al alternativo, un solo intento (como en agenerate_routed)
+            for texto in llm_gateway.stream(route.model, prompt, config=config, retries=1 if route.failover else 5):
+                partes.append(texto)
+                for path, value in parser.feed(texto):
+                    if path in STREAM_SECTIONS:
+                        yield sse_event('section', {'path': '.'.join(path), 'value': value})
+
+            response_text = ''.join(partes).strip()
+            capture_raw_response(route.model, response_text)
+            with stage('extract'):
+                if structured:
+                    sesion_data = parse_structured(response_text, SESION_SCHEMA)
+                else:
+                    sesion_data = extract_json(response_text)
+
+            # Guardar la sesión para la descarga
+            session_id = session_store.save(datos, sesion_data)
+            docx_cache.schedule(docx_key(session_id), datos, sesion_data)
+            yield sse_event('done', {'sesion': sesion_data, 'session_id': session_id})
+
+        except json.JSONDecodeError as e:
+            print(f"TRACEBACK: {str(e)}")
+            capture_raw_response(route.model, e.doc, force=True)
+            yield sse_event('error', {'error': f"Error de formato JSON. La IA respondió: {e.doc[:200]}..."})
+
+        except LLMUnavailable as e:
+            yield sse_event('error', {
+                'error': 'La IA está ocupada en este momento. Por favor espera unos segundos.',
+                'status': 429,
+                'retry_after': int(e.retry_after_header())
+            })
 
-        print(f"TRACEBACK: {error_msg}")
-        return jsonify({'error': f"Error al generar la sesión: {error_msg}"}), 500
+        except Exception as e:
+            error_msg = str(e)
+            print(f"TRACEBACK: {error_msg}")
+            yield sse_event('error', {'error': f"Error al generar la sesión: {error_msg}"})
 
+    return Response(
+        stream_with_context(eventos()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
-@app.route('/generate_ept_structure', methods=['POST'])
-def generate_ept_structure():
+
+SECCION_ROUTE = "seccion"
+
+# Secciones que /regenerate_section puede rehacer (el título y los datos del docente no se tocan)
+SECCIONES_REGENERABLES = (STREAM_SECTIONS - {('titulo_sesion',)}) | {('secuencia_didactica',)}
+# Secciones que se pasan como contexto (recortadas) para que la nueva sea coherente con el resto
+SECCIONES_CONTEXTO = (
+    ('proposito',), ('evidencia',), ('criterios_evaluacion',),
+    ('secuencia_didactica', 'inicio'), ('secuencia_didactica', 'desarrollo'), ('secuencia_didactica', 'cierre'),
+)
+SECCION_CONTEXTO_MAX_CHARS = 600
+
+
+def valor_en(sesion, path):
+    for key in path:
+        sesion = sesion.get(key) if isinstance(sesion, dict) else None
+    return sesion
+
+
+def _recortar(valor, limite=SECCION_CONTEXTO_MAX_CHARS):
+    texto = valor if isinstance(valor, str) else json.dumps(valor, ensure_ascii=False)
+    return texto if len(texto) <= limite else texto[:limite].rstrip() + '…'
+
+
+def build_section_prompt(datos, sesion, path, indicaciones=None):
     """
-    Genera un CONJUNTO de opciones curriculares para EPT (Competencias, Capacidades, Desempeños)
-    para que el docente elija.
+    Prompt reducido para rehacer una sola sección: los datos del docente, el resto
+    de la sesión recortado (solo como contexto) y la versión actual de la sección.
+    """
+    clave = path[-1]
+    nombre = '.'.join(path)
+    contexto = []
+    for otra in SECCIONES_CONTEXTO:
+        if otra[:len(path)] == path:
+            continue
+        valor = valor_en(sesion, otra)
+        if valor:
+            contexto.append(f"- {'.'.join(otra)}: {_recortar(valor)}")
+
+    schema = seccion_schema(path)['properties'][clave]
+    if schema['type'] == 'array':
+        ejemplo = ["Criterio observable alineado al desempeño.", "Criterio medible relacionado con la competencia."]
+    elif schema['type'] == 'object':
+        ejemplo = {k: f"Describe las actividades de {k} respetando el tipo de sesión." for k in schema['properties']}
+    else:
+        ejemplo = f"Nueva versión de {clave}."
+    formato = json.dumps({clave: ejemplo}, ensure_ascii=False, indent=2)
+
+    actual = valor_en(sesion, path)
+    pedido = f"\nINDICACIONES DEL DOCENTE: {indicaciones}\n" if indicaciones else ""
+
+    return f"""
+Eres un especialista en diseño curricular del MINEDU – Perú.
+El docente ya tiene su sesión de aprendizaje y quiere rehacer SOLO la sección "{nombre}".
+
+DATOS DEFINIDOS POR EL DOCENTE (NO MODIFICAR):
+- Título de la sesión (tema): {datos.get('tema', 'Tema no especificado')}
+- Nivel: {datos.get('nivel', 'N/A')}
+- Grado: {datos.get('grado', 'N/A')}
+- Área: {datos.get('area', 'N/A')}
+- Competencia: {datos.get('competencia', 'N/A')}
+- Capacidad: {datos.get('capacidad', 'N/A')}
+- Desempeño: {datos.get('desempeno', 'N/A')}
+- Tiempo total: {datos.get('tiempo', 90)} minutos
+- Tipo de sesión: {datos.get('tipo_sesion', 'Detallada')} (Resumida = breve y directa; Detallada = extensa, con acciones del docente, del estudiante y preguntas orientadoras)
+
+RESTO DE LA SESIÓN (solo contexto, NO lo reescribas):
+{chr(10).join(contexto) or '- (sin otras secciones)'}
+
+VERSIÓN ACTUAL DE "{nombre}" (el docente quiere otra distinta):
+{_recortar(actual, 2000) if actual else '(vacía)'}
+{pedido}
+RESPONDE ÚNICAMENTE con un JSON válido, sin markdown:
+{formato}
+"""
+
+
+def preparar_seccion(datos):
+    """
+    Valida el pedido y arma el prompt de la sección. Devuelve (respuesta, None) si hay error, o (None, contexto).
     """
-    datos = request.json
+    datos = datos or {}
+    session_id = datos.get('session_id')
+    seccion = datos.get('path')
+    if not session_id or not isinstance(seccion, str):
+        return ({'error': 'Debe enviar session_id y path (p. ej. "secuencia_didactica.cierre").'}, 400, {}), None
+
+    path = tuple(seccion.strip().split('.'))
+    if path not in SECCIONES_REGENERABLES:
+        opciones = ', '.join(sorted('.'.join(p) for p in SECCIONES_REGENERABLES))
+        return ({'error': f'Sección no regenerable: "{seccion}". Opciones: {opciones}.'}, 400, {}), None
+
+    guardada = session_store.get(session_id)
+    if not guardada:
+        return ({'error': 'No hay sesión generada (o ya expiró).'}, 404, {}), None
+
+    prompt = build_section_prompt(guardada['datos_form'], guardada['sesion'], path, datos.get('indicaciones'))
+    contexto = {'session_id': session_id, 'path': path, 'prompt': prompt, 'schema': seccion_schema(path)}
+    return None, contexto
+
+
+def seccion_regenerada(contexto, data):
+    """
+    Combina la sección nueva con la sesión guardada y descarta el .docx cacheado.
+    """
+    session_id, path = contexto['session_id'], contexto['path']
+    if not isinstance(data, dict) or validate(data, contexto['schema']):
+        return {'error': 'La IA no devolvió la sección pedida. Intenta de nuevo.'}, 500, {}
+    valor = data[path[-1]]
+
+    def reemplazar(datos, sesion):
+        destino = sesion
+        for key in path[:-1]:
+            destino = destino.setdefault(key, {})
+        destino[path[-1]] = valor
+
+    # Compare-and-set: si otra sección (en cualquier worker) se guardó mientras
+    # esperábamos a la IA, se aplica sobre esa versión en vez de pisarla
+    guardada = session_store.update(session_id, reemplazar)
+    if not guardada:
+        return {'error': 'No hay sesión generada (o ya expiró).'}, 404, {}
+    datos, sesion, version = guardada['datos_form'], guardada['sesion'], guardada['version']
+
+    # El documento Word de la versión anterior ya no corresponde
+    docx_cache.invalidate(docx_key(session_id, version - 1))
+    docx_cache.schedule(docx_key(session_id, version), datos, sesion)
+
+    return {'session_id': session_id, 'path': '.'.join(path), 'valor': valor, 'sesion': sesion}, 200, {}
+
+
+@app.route('/regenerate_section', methods=['POST'])
+def regenerar_seccion():
+    """
+    Rehace una sola sección de una sesión ya generada (p. ej. "secuencia_didactica.cierre")
+    con un prompt mucho más corto, y la guarda en la sesión para /download.
+    """
+    respuesta, contexto = preparar_seccion(request.json)
+    if respuesta is not None:
+        return json_response(respuesta)
+    try:
+        data = generate_json(SECCION_ROUTE, contexto['prompt'], schema=contexto['schema'])
+        return json_response(seccion_regenerada(contexto, data))
+    except Exception as e:
+        return json_response(error_sesion(e))
+
+
+EPT_ROUTE = "ept"
+
+
+def preparar_ept(datos):
+    """
+    Valida el pedido y busca la especialidad en el catálogo. Devuelve (respuesta, None)
+    si hay error o ya está catalogada, o (None, contexto) con el prompt para la IA.
+    """
+    datos = datos or {}
     nivel = datos.get("nivel", "Secundaria")
     grado = datos.get("grado", "Grado no especificado")
     especialidad = datos.get("especialidad", "No especificada")
@@ -322,7 +1052,13 @@ def generate_ept_structure():
 
     # Validar que sea EPT (aunque el frontend debe controlar esto) y que haya especialidad
     if not especialidad:
-         return jsonify({"error": "La especialidad es obligatoria para EPT."}), 400
+         return ({"error": "La especialidad es obligatoria para EPT."}, 400, {}), None
+
+    # refresh: el docente pide opciones nuevas; la respuesta reemplaza la del catálogo
+    if not datos.get("refresh"):
+        estructura = ept_catalog.get(especialidad, nivel, grado)
+        if estructura is not None:
+            return ({**estructura, "origen": "catalogo"}, 200, {}), None
 
     prompt = f"""
 Actúa como especialista del Ministerio de Educación del Perú (MINEDU),
@@ -373,552 +1109,173 @@ Cantidad:
 
 Genera solo el JSON.
 """
+    contexto = {"especialidad": especialidad, "nivel": nivel, "grado": grado, "prompt": prompt}
+    return None, contexto
+
+
+def normalizar_ept(data):
+    # Validación básica de estructura
+    if "competencias" not in data or not isinstance(data["competencias"], list):
+         # Intento de corrección si la IA devolvió lista directa
+         if isinstance(data, list):
+             data = {"competencias": data}
+         else:
+             raise ValueError("Estructura JSON inválida: Falta clave 'competencias'")
+    return data
+
+
+def estructura_ept(contexto, data):
+    data = normalizar_ept(data)
+    # Las respuestas completas quedan en el catálogo para la próxima vez
+    ept_catalog.put(contexto["especialidad"], contexto["nivel"], contexto["grado"], data)
+    return data, 200, {}
+
+
+def generar_estructura_ept(especialidad, nivel, grado):
+    """
+    Estructura EPT nueva de la IA, sin tocar el catálogo (para ept_catalog.py --warm).
+    """
+    _, contexto = preparar_ept({
+        "especialidad": especialidad, "nivel": nivel, "grado": grado,
+        "tema": "Visión general de la especialidad", "refresh": True
+    })
+    return normalizar_ept(generate_json(EPT_ROUTE, contexto["prompt"], schema=EPT_SCHEMA))
+
+
+def error_ept(e):
+    if isinstance(e, LLMUnavailable):
+        return ia_ocupada(e)
+    print(f"ERROR EPT: {str(e)}")
+    return {"error": str(e)}, 500, {}
+
+
+@app.route('/generate_ept_structure', methods=['POST'])
+def generate_ept_structure():
+    """
+    Genera un CONJUNTO de opciones curriculares para EPT (Competencias, Capacidades, Desempeños)
+    para que el docente elija.
+    """
+    respuesta, contexto = preparar_ept(request.json)
+    if respuesta is not None:
+        return json_response(respuesta)
     try:
-        # Usamos generate_with_retry existente
-        response = generate_with_retry("gemini-2.5-flash-lite", prompt)
-        
-        texto = response.text.strip()
-        json_text = extract_json_from_text(texto)
-        data = json.loads(json_text)
-        
-        # Validación básica de estructura
-        if "competencias" not in data or not isinstance(data["competencias"], list):
-             # Intento de corrección si la IA devolvió lista directa
-             if isinstance(data, list):
-                 data = {"competencias": data}
-             else:
-                 raise ValueError("Estructura JSON inválida: Falta clave 'competencias'")
-
-        return jsonify(data)
+        # Usamos generate_with_retry existente (vía generate_json)
+        data = generate_json(EPT_ROUTE, contexto["prompt"], schema=EPT_SCHEMA)
+        return json_response(estructura_ept(contexto, data))
 
     except Exception as e:
-        print(f"ERROR EPT: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+        return json_response(error_ept(e))
+
+
+@app.route('/generate_batch', methods=['POST'])
+def generar_unidad():
+    """
+    Genera varias sesiones de una unidad didáctica en paralelo (acotado) y devuelve
+    un ZIP en streaming: cada .docx se agrega apenas está listo. Si una sesión falla,
+    las demás siguen; el detalle queda en resumen.json dentro del ZIP y en
+    /batch_status/<batch_id>.
+    """
+    datos = request.json or {}
+    comunes = datos.get('datos') or {}
+    especificaciones = datos.get('sesiones')
+
+    if not isinstance(especificaciones, list) or not especificaciones:
+        return jsonify({'error': 'Debe enviar una lista "sesiones" con al menos una sesión.'}), 400
+    if len(especificaciones) > BATCH_MAX_SESSIONS:
+        return jsonify({'error': f'Máximo {BATCH_MAX_SESSIONS} sesiones por unidad.'}), 400
+    if not isinstance(comunes, dict) or not all(isinstance(spec, dict) for spec in especificaciones):
+        return jsonify({'error': '"datos" y cada elemento de "sesiones" deben ser objetos.'}), 400
+
+    batch_id = uuid.uuid4().hex
+    items = [{**comunes, **spec} for spec in especificaciones]
+    progreso = {
+        'total': len(items),
+        'completadas': 0,
+        'fallidas': 0,
+        'terminado': False,
+        'sesiones': [{'indice': i + 1, 'tema': item.get('tema', ''), 'estado': 'pendiente'} for i, item in enumerate(items)]
+    }
+    batch_progress.set(batch_id, progreso)
+
+    def generar_item(item):
+        sesion_data = generate_json(ruta_sesion(item), build_session_prompt(item), schema=SESION_SCHEMA)
+        session_id = session_store.save(item, sesion_data)
+        return session_id, render_docx(item, sesion_data)
+
+    def contenido_zip():
+        buffer, zf = open_zip_stream()
+        pool = ThreadPoolExecutor(max_workers=min(BATCH_MAX_PARALLEL, len(items)))
+        try:
+            futures = {pool.submit(generar_item, item): i for i, item in enumerate(items)}
+            for future in as_completed(futures):
+                i = futures[future]
+                estado = progreso['sesiones'][i]
+                try:
+                    session_id, docx_bytes = future.result()
+                    nombre = f"{i + 1:02d}_{docx_filename(items[i])}"
+                    zf.writestr(nombre, docx_bytes)
+                    estado.update({'estado': 'ok', 'archivo': nombre, 'session_id': session_id})
+                    progreso['completadas'] += 1
+                except Exception as e:
+                    print(f"ERROR LOTE {batch_id} (sesión {i + 1}): {e}")
+                    ocupada = isinstance(e, LLMUnavailable)
+                    estado.update({'estado': 'error', 'error': 'La IA está ocupada.' if ocupada else str(e)})
+                    progreso['fallidas'] += 1
+                batch_progress.set(batch_id, progreso)
+                yield buffer.drain()
+        except GeneratorExit:
+            print(f"LOTE {batch_id} cancelado por el cliente")
+            progreso.update({'terminado': True, 'cancelado': True})
+            batch_progress.set(batch_id, progreso)
+            raise
+        finally:
+            # Si el cliente cortó la descarga, las sesiones que faltan no se generan
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        progreso['terminado'] = True
+        batch_progress.set(batch_id, progreso)
+        zf.writestr('resumen.json', json.dumps(progreso, ensure_ascii=False, indent=2))
+        zf.close()
+        yield buffer.drain()
+
+    return Response(
+        stream_with_context(contenido_zip()),
+        mimetype='application/zip',
+        headers={
+            'Content-Disposition': f'attachment; filename=Unidad_{batch_id[:8]}.zip',
+            'X-Batch-Id': batch_id
+        }
+    )
+
+
+@app.route('/batch_status/<batch_id>')
+def estado_unidad(batch_id):
+    progreso = batch_progress.get(batch_id)
+    if progreso is None:
+        return jsonify({'error': 'Lote no encontrado'}), 404
+    return jsonify(progreso)
 
 
 @app.route('/download')
 def descargar_word():
-    global ultima_sesion
+    session_id = request.args.get('session_id')
+    guardada = session_store.get(session_id)
 
-    if not ultima_sesion:
+    if not guardada:
         return jsonify({'error': 'No hay sesión generada'}), 400
 
     try:
-        from docx.shared import Pt, Inches, RGBColor
-        from docx.enum.text import WD_ALIGN_PARAGRAPH
-        from docx import Document
-        from docx.oxml.ns import qn
-        from docx.oxml import OxmlElement
-        from io import BytesIO
-
-        # --- RECURSOS COMPARTIDOS (Helpers) ---
-        def shade_cell(cell, shade_color):
-            shading_elm = OxmlElement('w:shd')
-            shading_elm.set(qn('w:fill'), shade_color)
-            cell._element.get_or_add_tcPr().append(shading_elm)
-
-        def add_bold_centered_text(cell, text, font_size=10, shade_color=None):
-            if shade_color:
-                shade_cell(cell, shade_color)
-            if cell.paragraphs:
-                p = cell.paragraphs[0]
-            else:
-                p = cell.add_paragraph()
-            p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            run = p.add_run(str(text) if text else '-')
-            run.bold = True
-            run.font.size = Pt(font_size)
-            run.font.name = 'Arial'
-
-        def add_bold_text(cell, text, font_size=10, shade_color=None, align='left'):
-            if shade_color:
-                shade_cell(cell, shade_color)
-            if cell.paragraphs:
-                p = cell.paragraphs[0]
-            else:
-                p = cell.add_paragraph()
-            if align == 'center':
-                p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            elif align == 'justify':
-                p.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-            elif align == 'right':
-                p.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-            run = p.add_run(str(text) if text else '-')
-            run.bold = True
-            run.font.size = Pt(font_size)
-            run.font.name = 'Arial'
-
-        def add_normal_text(cell, text, font_size=10, align='left'):
-            if cell.paragraphs:
-                p = cell.paragraphs[0]
-            else:
-                p = cell.add_paragraph()
-            if align == 'center':
-                p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            elif align == 'justify':
-                p.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-            elif align == 'right':
-                p.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-            run = p.add_run(str(text) if text else '-')
-            run.font.size = Pt(font_size)
-            run.font.name = 'Arial'
-
-        def format_criterios(criterios_list):
-            if isinstance(criterios_list, list):
-                return "\n".join([f"• {c}" for c in criterios_list])
-            return str(criterios_list)
-
-        # --- GENERADORES ESPECÍFICOS ---
-
-        def generar_docx_secundaria(doc, datos, sesion):
-            # ... Data Preparation ...
-            datos_adicionales = sesion.get('datos_adicionales', {})
-            try:
-                tiempo_total = int(str(datos_adicionales.get('tiempo_total', '90')).split(' ')[0])
-            except (ValueError, IndexError):
-                tiempo_total = 90
-            
-            inicio_min = round(tiempo_total * 0.2)
-            desarrollo_min = round(tiempo_total * 0.6)
-            cierre_min = round(tiempo_total * 0.2)
-            
-            # Variables de tiempo para el doc
-            ini_str = f"{inicio_min}'"
-            des_str = f"{desarrollo_min}'"
-            cie_str = f"{cierre_min}'"
-
-            # ... Datos Administrativos ...
-            dre = datos.get('dre', 'San Martín')
-            ugel = datos.get('ugel', 'San Martín')
-            ie = datos.get('ie', 'N/A')
-            distrito = datos.get('distrito', 'Tarapoto')
-            seccion = datos.get('seccion', 'A, B, C, D')
-            ciclo = datos.get('ciclo', 'VI') # Secundaria suele ser VI o VII
-            director = datos.get('director', 'N/A')
-            docente = datos.get('docente', 'N/A')
-            fecha = datos.get('fecha', 'N/A')
-            duracion = datos.get('duracion', '90\'')
-
-
-            # 1. TÍTULO PRINCIPAL
-            titulo_principal = doc.add_paragraph()
-            titulo_principal.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            run_titulo = titulo_principal.add_run('SESIÓN DE APRENDIZAJE\nINNOVACIÓN PEDAGÓGICA')
-            run_titulo.bold = True
-            run_titulo.font.size = Pt(14)
-            run_titulo.font.name = 'Arial'
-            doc.add_paragraph()
-
-            # 2. TÍTULO SESIÓN
-            tabla_titulo = doc.add_table(rows=1, cols=1)
-            tabla_titulo.style = 'Table Grid'
-            add_bold_centered_text(tabla_titulo.cell(0, 0), datos.get('tema', ''), 11)
-            doc.add_paragraph()
-
-            # 3. DATOS INFORMATIVOS
-            p_datos = doc.add_paragraph()
-            p_datos.add_run('☰ ').bold = True
-            p_datos.add_run('DATOS INFORMATIVOS:').bold = True
-            
-            tabla_info = doc.add_table(rows=5, cols=8)
-            tabla_info.style = 'Table Grid'
-            
-            add_bold_text(tabla_info.cell(0, 0), 'DRE', 9, 'D9D9D9')
-            add_normal_text(tabla_info.cell(0, 1), dre, 9)
-            add_bold_text(tabla_info.cell(0, 2), 'UGEL', 9, 'D9D9D9')
-            add_normal_text(tabla_info.cell(0, 3).merge(tabla_info.cell(0, 7)), ugel, 9)
-            
-            add_bold_text(tabla_info.cell(1, 0), 'Institución Educativa', 9, 'D9D9D9')
-            add_normal_text(tabla_info.cell(1, 1).merge(tabla_info.cell(1, 3)), ie, 9)
-            add_bold_text(tabla_info.cell(1, 4), 'Distrito', 9, 'D9D9D9')
-            add_normal_text(tabla_info.cell(1, 5).merge(tabla_info.cell(1, 7)), distrito, 9)
-            
-            add_bold_text(tabla_info.cell(2, 0), 'Área curricular', 9, 'D9D9D9')
-            add_normal_text(tabla_info.cell(2, 1), datos.get('area', 'N/A'), 9)
-            add_bold_text(tabla_info.cell(2, 2), 'Grado', 9, 'D9D9D9')
-            add_normal_text(tabla_info.cell(2, 3), datos.get('grado', 'N/A'), 9)
-            add_bold_text(tabla_info.cell(2, 4), 'Sección', 9, 'D9D9D9')
-            add_normal_text(tabla_info.cell(2, 5), seccion, 9)
-            add_bold_text(tabla_info.cell(2, 6), 'Duración', 9, 'D9D9D9')
-            add_normal_text(tabla_info.cell(2, 7), duracion, 9)
-            
-            add_bold_text(tabla_info.cell(3, 0), 'Ciclo', 9, 'D9D9D9')
-            add_normal_text(tabla_info.cell(3, 1), ciclo, 9)
-            add_bold_text(tabla_info.cell(3, 2), 'Fecha', 9, 'D9D9D9')
-            add_normal_text(tabla_info.cell(3, 3).merge(tabla_info.cell(3, 5)), fecha, 9)
-            add_bold_text(tabla_info.cell(3, 6), 'Director(a)', 9, 'D9D9D9')
-            add_normal_text(tabla_info.cell(3, 7), director, 9)
-            
-            add_bold_text(tabla_info.cell(4, 0), 'Docente', 9, 'D9D9D9')
-            add_normal_text(tabla_info.cell(4, 1).merge(tabla_info.cell(4, 7)), docente, 9)
-            doc.add_paragraph()
-
-            # 4. PROPÓSITO
-            p_proposito = doc.add_paragraph()
-            p_proposito.add_run('☰ ').bold = True
-            p_proposito.add_run('PROPÓSITO DE APRENDIZAJE').bold = True
-            
-            tabla_proposito = doc.add_table(rows=2, cols=5)
-            tabla_proposito.style = 'Table Grid'
-            add_bold_centered_text(tabla_proposito.cell(0, 0), 'COMPETENCIA', 9, 'D9D9D9')
-            add_bold_centered_text(tabla_proposito.cell(0, 1), 'CAPACIDAD', 9, 'D9D9D9')
-            add_bold_centered_text(tabla_proposito.cell(0, 2), 'DESEMPEÑOS\nPRECISADOS', 9, 'D9D9D9')
-            add_bold_centered_text(tabla_proposito.cell(0, 3), 'CRITERIOS DE EVALUACIÓN', 9, 'D9D9D9')
-            add_bold_centered_text(tabla_proposito.cell(0, 4), 'INSTRUMENTO', 9, 'D9D9D9')
-            
-            row = tabla_proposito.rows[1].cells
-            add_normal_text(row[0], datos.get('competencia', ''), 9, 'justify')
-            add_normal_text(row[1], datos.get('capacidad', ''), 9, 'justify')
-            add_normal_text(row[2], datos.get('desempeno', ''), 9, 'justify')
-            add_normal_text(row[3], format_criterios(sesion.get('criterios_evaluacion', [])), 9, 'justify')
-            add_normal_text(row[4], 'Lista de cotejo', 9, 'center')
-            
-            comp_trans = datos.get('comp_transversal')
-            if comp_trans and comp_trans not in ['N/A', '']:
-                row_t = tabla_proposito.add_row().cells
-                add_normal_text(row_t[0], comp_trans, 9, 'justify')
-                add_normal_text(row_t[1], datos.get('cap_transversal', ''), 9, 'justify')
-                add_normal_text(row_t[2], 'Se desenvuelve...', 9, 'justify')
-                add_normal_text(row_t[3], 'Observación', 9, 'justify')
-                add_normal_text(row_t[4], 'Ficha', 9, 'center')
-            doc.add_paragraph()
-
-            # 5. ENFOQUES
-            p_enfoque = doc.add_paragraph()
-            p_enfoque.add_run('☰ ').bold = True
-            p_enfoque.add_run('ENFOQUES TRANSVERSALES').bold = True
-            tabla_enfoques = doc.add_table(rows=2, cols=4)
-            tabla_enfoques.style = 'Table Grid'
-            add_bold_centered_text(tabla_enfoques.cell(0, 0), 'ENFOQUE', 9, 'D9D9D9')
-            add_bold_centered_text(tabla_enfoques.cell(0, 1), 'VALORES', 9, 'D9D9D9')
-            add_bold_centered_text(tabla_enfoques.cell(0, 2), 'ACTITUDES', 9, 'D9D9D9')
-            add_bold_centered_text(tabla_enfoques.cell(0, 3), 'ACCIONES', 9, 'D9D9D9')
-            
-            add_normal_text(tabla_enfoques.cell(1, 0), datos.get('enfoque', ''), 9, 'justify')
-            add_normal_text(tabla_enfoques.cell(1, 1), datos.get('valor', ''), 9, 'justify')
-            add_normal_text(tabla_enfoques.cell(1, 2), 'Actitud de ejemplo.', 9, 'justify')
-            add_normal_text(tabla_enfoques.cell(1, 3), 'Acciones observables.', 9, 'justify')
-            doc.add_paragraph()
-
-            # 6. SECUENCIA
-            p_secuencia = doc.add_paragraph()
-            p_secuencia.add_run('☰ ').bold = True
-            p_secuencia.add_run('SECUENCIA DIDÁCTICA').bold = True
-            tabla_sec = doc.add_table(rows=4, cols=4)
-            tabla_sec.style = 'Table Grid'
-            add_bold_centered_text(tabla_sec.cell(0, 0), 'MOMENTOS', 10, 'D9D9D9')
-            add_bold_centered_text(tabla_sec.cell(0, 1), 'ACTIVIDADES', 10, 'D9D9D9')
-            add_bold_centered_text(tabla_sec.cell(0, 2), 'MATERIALES', 10, 'D9D9D9')
-            add_bold_centered_text(tabla_sec.cell(0, 3), 'TIEMPO', 10, 'D9D9D9')
-            
-            sd = sesion.get('secuencia_didactica', {})
-            # Inicio
-            add_bold_text(tabla_sec.cell(1, 0), 'MOTIVACIÓN', 9)
-            add_normal_text(tabla_sec.cell(1, 1), sd.get('inicio', ''), 9, 'justify')
-            add_normal_text(tabla_sec.cell(1, 2), 'Recursos clase', 9)
-            add_bold_centered_text(tabla_sec.cell(1, 3), ini_str, 10)
-            # Desarrollo
-            add_bold_text(tabla_sec.cell(2, 0), 'DESARROLLO', 9)
-            add_normal_text(tabla_sec.cell(2, 1), sd.get('desarrollo', ''), 9, 'justify')
-            add_normal_text(tabla_sec.cell(2, 2), 'Recursos clase', 9)
-            add_bold_centered_text(tabla_sec.cell(2, 3), des_str, 10)
-            # Cierre
-            add_bold_text(tabla_sec.cell(3, 0), 'CIERRE', 9)
-            add_normal_text(tabla_sec.cell(3, 1), sd.get('cierre', ''), 9, 'justify')
-            add_normal_text(tabla_sec.cell(3, 2), 'Recursos clase', 9)
-            add_bold_centered_text(tabla_sec.cell(3, 3), cie_str, 10)
-            
-            doc.add_paragraph()
-            doc.add_paragraph('• Bibliografía referencial.')
-            
-            # Firmas
-            t_firmas = doc.add_table(rows=1, cols=2)
-            t_firmas.rows[0].cells[0].paragraphs[0].add_run('___________________\nV.B. Director').alignment = WD_ALIGN_PARAGRAPH.CENTER
-            t_firmas.rows[0].cells[1].paragraphs[0].add_run('___________________\nDocente').alignment = WD_ALIGN_PARAGRAPH.CENTER
-
-        def generar_docx_primaria(doc, datos, sesion):
-            # Colores
-            YELLOW_HEADER = 'FEF2CC' # Amarillo claro 
-            GREEN_HEADER = 'E2EFDA' # Verde claro
-            GREEN_BRIGHT = '548235' # Verde fuerte para texto
-
-            # ... Data Preparation ...
-            datos_adicionales = sesion.get('datos_adicionales', {})
-            try:
-                tiempo_total = int(str(datos_adicionales.get('tiempo_total', '90')).split(' ')[0])
-            except:
-                tiempo_total = 90
-            
-            # Datos Administrativos
-            dre = datos.get('dre', 'San Martín')
-            ugel = datos.get('ugel', 'San Martín')
-            ie = datos.get('ie', '')
-            distrito = datos.get('distrito', '')
-            seccion = datos.get('seccion', '')
-            ciclo = datos.get('ciclo', 'III/IV/V')
-            director = datos.get('director', '')
-            docente = datos.get('docente', '')
-            fecha = datos.get('fecha', '')
-            duracion = datos.get('duracion', '90 min')
-
-            # 1. Título General
-            doc.add_paragraph() 
-            titulo = doc.add_paragraph()
-            titulo.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            run = titulo.add_run('SESIÓN DE APRENDIZAJE')
-            run.bold = True
-            run.font.size = Pt(14)
-            run.font.name = 'Arial'
-            run.font.color.rgb = RGBColor(0, 0, 0)
-            doc.add_paragraph()
-
-            # 2. Título Sesión (Recuadro)
-            tbl_tit = doc.add_table(rows=1, cols=1)
-            tbl_tit.style = 'Table Grid'
-            add_bold_centered_text(tbl_tit.cell(0, 0), datos.get('tema', 'TEMA DE SESIÓN'), 12)
-            doc.add_paragraph()
-
-            p_inf = doc.add_paragraph()
-            p_inf.add_run('☰ ').bold = True
-            p_inf.add_run('DATOS INFORMATIVOS:').bold = True
-            # run_inf = p_inf.add_run('I. DATOS INFORMATIVOS:') # Old style
-
-            tabla_info = doc.add_table(rows=5, cols=8)
-            tabla_info.style = 'Table Grid'
-            
-            add_bold_text(tabla_info.cell(0, 0), 'DRE', 9, 'D9D9D9')
-            add_normal_text(tabla_info.cell(0, 1), dre, 9)
-            add_bold_text(tabla_info.cell(0, 2), 'UGEL', 9, 'D9D9D9')
-            add_normal_text(tabla_info.cell(0, 3).merge(tabla_info.cell(0, 7)), ugel, 9)
-            
-            add_bold_text(tabla_info.cell(1, 0), 'Institución Educativa', 9, 'D9D9D9')
-            add_normal_text(tabla_info.cell(1, 1).merge(tabla_info.cell(1, 3)), ie, 9)
-            add_bold_text(tabla_info.cell(1, 4), 'Distrito', 9, 'D9D9D9')
-            add_normal_text(tabla_info.cell(1, 5).merge(tabla_info.cell(1, 7)), distrito, 9)
-            
-            add_bold_text(tabla_info.cell(2, 0), 'Área curricular', 9, 'D9D9D9')
-            add_normal_text(tabla_info.cell(2, 1), datos.get('area', 'N/A'), 9)
-            add_bold_text(tabla_info.cell(2, 2), 'Grado', 9, 'D9D9D9')
-            add_normal_text(tabla_info.cell(2, 3), datos.get('grado', 'N/A'), 9)
-            add_bold_text(tabla_info.cell(2, 4), 'Sección', 9, 'D9D9D9')
-            add_normal_text(tabla_info.cell(2, 5), seccion, 9)
-            add_bold_text(tabla_info.cell(2, 6), 'Duración', 9, 'D9D9D9')
-            add_normal_text(tabla_info.cell(2, 7), duracion, 9)
-            
-            add_bold_text(tabla_info.cell(3, 0), 'Ciclo', 9, 'D9D9D9')
-            add_normal_text(tabla_info.cell(3, 1), ciclo, 9)
-            add_bold_text(tabla_info.cell(3, 2), 'Fecha', 9, 'D9D9D9')
-            add_normal_text(tabla_info.cell(3, 3).merge(tabla_info.cell(3, 5)), fecha, 9)
-            add_bold_text(tabla_info.cell(3, 6), 'Director(a)', 9, 'D9D9D9')
-            add_normal_text(tabla_info.cell(3, 7), director, 9)
-            
-            add_bold_text(tabla_info.cell(4, 0), 'Docente', 9, 'D9D9D9')
-            add_normal_text(tabla_info.cell(4, 1).merge(tabla_info.cell(4, 7)), docente, 9)
-            
-            doc.add_paragraph()
-
-            # 4. PROPÓSITOS DE APRENDIZAJE (Estilo Primaria - Amarillo)
-            p_prop = doc.add_paragraph()
-            run_prop = p_prop.add_run('II. PROPÓSITOS DE APRENDIZAJE Y EVIDENCIAS DE APRENDIZAJE:')
-            run_prop.bold = True
-            run_prop.font.color.rgb = RGBColor(255, 0, 0) # Rojo
-
-            t_prop = doc.add_table(rows=2, cols=4)
-            t_prop.style = 'Table Grid'
-            # Encabezados Amarillos
-            add_bold_centered_text(t_prop.cell(0, 0), 'Competencias', 10, YELLOW_HEADER)
-            add_bold_centered_text(t_prop.cell(0, 1), 'Capacidades', 10, YELLOW_HEADER)
-            add_bold_centered_text(t_prop.cell(0, 2), 'Desempeños', 10, YELLOW_HEADER)
-            add_bold_centered_text(t_prop.cell(0, 3), 'Criterios de\nevaluación', 10, YELLOW_HEADER)
-
-            # Contenido
-            row_p = t_prop.rows[1].cells
-            add_normal_text(row_p[0], datos.get('competencia', ''), 9)
-            add_normal_text(row_p[1], datos.get('capacidad', ''), 9)
-            add_normal_text(row_p[2], datos.get('desempeno', ''), 9)
-            add_normal_text(row_p[3], format_criterios(sesion.get('criterios_evaluacion', [])), 9)
-
-            # TABLA ESTÁNDAR (Amarilla)
-            doc.add_paragraph()
-            t_stand = doc.add_table(rows=2, cols=2) # 2 filas: Header y Contenido
-            t_stand.style = 'Table Grid'
-            
-            # Header Merged
-            cell_header = t_stand.cell(0, 0)
-            cell_header.merge(t_stand.cell(0, 1))
-            add_bold_text(cell_header, 'ESTÁNDAR DE APRENDIZAJE POR COMPETENCIAS Y GRADOS', 10, YELLOW_HEADER)
-            
-            # Contenido (Estándar real)
-            cell_cont = t_stand.cell(1, 0)
-            cell_cont.merge(t_stand.cell(1, 1))
-            
-            estandar_texto = sesion.get('estandar_aprendizaje', 'No especificado en la sesión generada.')
-            add_normal_text(cell_cont, estandar_texto, 9, 'justify')
-            
-            # Tabla Enfoques (Verde)
-            doc.add_paragraph()
-            t_enf = doc.add_table(rows=5, cols=3)
-            t_enf.style = 'Table Grid'
-            # Header color background check image: shows bright Green headers.
-            # Lets try to match the image: Green header for "ENFOQUES TRANSVERSALES", "VALORES", "EJEMPLOS"
-            add_bold_text(t_enf.cell(0, 0), 'ENFOQUES TRANSVERSALES', 9, '548235')
-            add_bold_text(t_enf.cell(0, 1), 'VALORES', 9, '548235')
-            add_bold_text(t_enf.cell(0, 2), 'EJEMPLOS', 9, '548235')
-            # Shading header cells green
-            shade_cell(t_enf.cell(0, 0), '70AD47')
-            shade_cell(t_enf.cell(0, 1), '70AD47')
-            shade_cell(t_enf.cell(0, 2), '70AD47')
-            
-            # Contenido Enfoques
-            add_normal_text(t_enf.cell(1, 0), datos.get('enfoque', ''), 9)
-            add_normal_text(t_enf.cell(1, 1), datos.get('valor', ''), 9)
-            add_normal_text(t_enf.cell(1, 2), 'Ejemplo observable...', 9)
-
-            # Competencias Transversales (Yellow Headers separate)
-            doc.add_paragraph()
-            
-            # Comp Transversal 1
-            t_ct1 = doc.add_table(rows=2, cols=2)
-            t_ct1.style = 'Table Grid'
-            add_bold_centered_text(t_ct1.cell(0, 0), 'Competencia transversal', 9, YELLOW_HEADER)
-            add_bold_centered_text(t_ct1.cell(0, 1), 'Capacidades Transversales', 9, YELLOW_HEADER)
-            comp_t = datos.get('comp_transversal', '')
-            cap_t = datos.get('cap_transversal', '')
-            add_normal_text(t_ct1.cell(1, 0), comp_t if comp_t else 'Se desenvuelve en entornos virtuales...', 9)
-            add_normal_text(t_ct1.cell(1, 1), cap_t if cap_t else 'Personaliza entornos...', 9)
-
-            doc.add_paragraph()
-            
-            # Comp Transversal 2 (Gestiona su aprendizaje - Default en primaria muchas veces)
-            t_ct2 = doc.add_table(rows=2, cols=2)
-            t_ct2.style = 'Table Grid'
-            add_bold_centered_text(t_ct2.cell(0, 0), 'Competencia transversal', 9, YELLOW_HEADER)
-            add_bold_centered_text(t_ct2.cell(0, 1), 'Capacidades Transversales', 9, YELLOW_HEADER)
-            add_normal_text(t_ct2.cell(1, 0), 'Gestiona su aprendizaje de manera autónoma', 9)
-            add_normal_text(t_ct2.cell(1, 1), 'Define metas de aprendizaje', 9)
-
-
-            # III. PREPARACIÓN DE LA SESIÓN
-            doc.add_paragraph()
-            p_prep = doc.add_paragraph()
-            run_prep = p_prep.add_run('III. PREPARACIÓN DE LA SESIÓN')
-            run_prep.bold = True
-            run_prep.font.color.rgb = RGBColor(255, 0, 0)
-
-            t_prep = doc.add_table(rows=2, cols=2)
-            t_prep.style = 'Table Grid'
-            add_bold_centered_text(t_prep.cell(0, 0), '¿Qué se debe hacer antes de la sesión?', 10, YELLOW_HEADER)
-            add_bold_centered_text(t_prep.cell(0, 1), '¿Qué recursos o materiales utilizarán en la sesión?', 10, YELLOW_HEADER)
-            add_normal_text(t_prep.cell(1, 0), 'Preparar fichas, revisar materiales.', 10)
-            add_normal_text(t_prep.cell(1, 1), 'Plumones, papelógrafos, fichas.', 10)
-
-            # IV. MOMENTOS
-            doc.add_paragraph()
-            p_mom = doc.add_paragraph()
-            run_mom = p_mom.add_run('IV. MOMENTOS DE LA SESIÓN')
-            run_mom.bold = True
-            run_mom.font.color.rgb = RGBColor(255, 0, 0)
-            
-            sd = sesion.get('secuencia_didactica', {})
-
-            # Función helper para momento CON CUADRO NEGRO (Table Grid)
-            def add_moment_table(moment_name, time_val, content):
-                # Tabla 2 filas: 
-                # Fila 1: Título (Verde) | Tiempo (Verde)
-                # Fila 2: Contenido (Blanco, con bordes negros)
-                
-                t = doc.add_table(rows=2, cols=2)
-                t.style = 'Table Grid' 
-                
-                # HEADER (Verde)
-                # Celda 1: Nombre
-                c_name = t.cell(0, 0)
-                shade_cell(c_name, 'E2EFDA') # Verde claro header
-                p1 = c_name.paragraphs[0]
-                run1 = p1.add_run(moment_name)
-                run1.bold = True
-                run1.font.size = Pt(10)
-
-                # Celda 2: Tiempo
-                c_time = t.cell(0, 1)
-                shade_cell(c_time, 'E2EFDA') # Verde claro header
-                p2 = c_time.paragraphs[0]
-                p2.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-                run2 = p2.add_run(f"Tiempo aproximado: {time_val} min")
-                run2.font.size = Pt(9)
-                
-                # CONTENIDO (Merged)
-                c_content = t.cell(1, 0)
-                c_content.merge(t.cell(1, 1))
-                add_normal_text(c_content, content, 10, 'justify')
-
-                doc.add_paragraph() # Espacio entre tablas
-
-            add_moment_table('INICIO', '15', sd.get('inicio', ''))
-            add_moment_table('DESARROLLO', '60', sd.get('desarrollo', ''))
-            add_moment_table('CIERRE', '15', sd.get('cierre', ''))
-
-            # V. RECURSOS / BIBLIOGRAFÍA
-            p_rec = doc.add_paragraph()
-            run_rec = p_rec.add_run('V. RECURSOS Y BIBLIOGRAFÍA')
-            run_rec.bold = True
-            run_rec.font.color.rgb = RGBColor(255, 0, 0) # Rojo
-            
-            t_rec = doc.add_table(rows=1, cols=1)
-            t_rec.style = 'Table Grid'
-            c_rec = t_rec.cell(0,0)
-            
-            recursos = sesion.get('recursos_virtuales', [])
-            if isinstance(recursos, list):
-                recursos_txt = "\n".join([f"• {r}" for r in recursos])
-            else:
-                recursos_txt = str(recursos)
-                
-            add_normal_text(c_rec, recursos_txt if recursos_txt else "Bibliografía del MED.", 9)
-
-            # Footer / Docente Ref
-
-            # Footer / Docente Ref
-            doc.add_paragraph()
-            t_foo = doc.add_table(rows=1, cols=1)
-            t_foo.align = WD_ALIGN_PARAGRAPH.CENTER
-            p_foo = t_foo.cell(0,0).paragraphs[0]
-            p_foo.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            p_foo.add_run('__________________________\nDOCENTE')
-
-
-        # --- MAIN LOGIC ---
-        doc = Document()
-        # Margenes
-        sections = doc.sections
-        for section in sections:
-            section.top_margin = Inches(0.5)
-            section.bottom_margin = Inches(0.5)
-            section.left_margin = Inches(0.7)
-            section.right_margin = Inches(0.7)
-
-        sesion = ultima_sesion['sesion']
-        datos = ultima_sesion['datos_form']
-        
-        nivel = datos.get('nivel', 'Secundaria')
-        
-        # Lógica de selección
-        if nivel == 'Primaria':
-            generar_docx_primaria(doc, datos, sesion)
-        else:
-            generar_docx_secundaria(doc, datos, sesion)
-
-        # Guardar
-        file_stream = BytesIO()
-        doc.save(file_stream)
-        file_stream.seek(0)
-        
-        filename = f"Sesion_{nivel}_{datos.get('grado','').replace(' ','_')}.docx"
+        datos = guardada['datos_form']
+
+        # Bytes ya renderizados en segundo plano (o render síncrono si no están)
+        with stage('docx'):
+            docx_bytes = docx_cache.get(docx_key(session_id, guardada['version']), datos, guardada['sesion'])
+
         return send_file(
-            file_stream,
+            BytesIO(docx_bytes),
             as_attachment=True,
-            download_name=filename,
-            mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+            download_name=docx_filename(datos),
+            mimetype=DOCX_MIMETYPE
         )
 
     except Exception as e:
@@ -0,0 +1,178 @@
+"""
+Entrada ASGI: /suggest, /suggest_bulk, /generate, /regenerate_section y
+/generate_ept_structure se atienden con corrutinas (la espera a Gemini no ocupa
+un hilo por request); el resto de la app Flask se sirve igual que antes a
+través de WsgiToAsgi.
+
+    uvicorn asgi:application --host 0.0.0.0 --port $PORT
+    gunicorn asgi:application -k uvicorn.workers.UvicornWorker -w 2
+
+Las respuestas (JSON, códigos, Retry-After y respaldos) son las mismas que las
+de las vistas Flask porque ambas usan las mismas funciones de app.py.
+"""
+import asyncio
+import json
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import (
+    app, agenerate_json, agenerate_json_detail, build_session_prompt,
+    preparar_sugerencias, sugerencias_de_ia, sugerencias_de_respaldo, SUGGEST_ROUTE, SUGGEST_BULK_ROUTE,
+    preparar_sugerencias_bulk, sugerencias_bulk_de_ia, sugerencias_bulk_de_respaldo,
+    sesion_generada, error_sesion, quiere_trabajo, encolar_sesion, ruta_sesion, SESION_SCHEMA,
+    preparar_seccion, seccion_regenerada, SECCION_ROUTE,
+    preparar_ept, estructura_ept, error_ept, EPT_ROUTE, EPT_SCHEMA,
+)
+from metrics import REQUEST_SECONDS, RequestTimings, bind_timings, log_event
+
+
+MAX_BODY_BYTES = 1024 * 1024
+
+flask_asgi = WsgiToAsgi(app)
+
+
+async def sugerencias(datos):
+    try:
+        # Caché SQLite y recuperación local: fuera del event loop
+        respuesta, contexto = await asyncio.to_thread(preparar_sugerencias, datos)
+        if respuesta is not None:
+            return respuesta
+
+        try:
+            data, truncado = await agenerate_json_detail(SUGGEST_ROUTE, contexto["prompt"], schema=contexto["schema"])
+            return await asyncio.to_thread(sugerencias_de_ia, contexto, data, truncado)
+        except Exception as e:
+            return sugerencias_de_respaldo(contexto, e)
+
+    except Exception as e:
+        print(f"ERROR CRITICO EN SUGGEST: {e}")
+        return {"error": f"Error interno: {str(e)}"}, 500, {}
+
+
+async def sugerencias_bulk(datos):
+    try:
+        respuesta, contexto = await asyncio.to_thread(preparar_sugerencias_bulk, datos)
+        if respuesta is not None:
+            return respuesta
+
+        try:
+            data, truncado = await agenerate_json_detail(SUGGEST_BULK_ROUTE, contexto["prompt"], schema=contexto["schema"])
+            return await asyncio.to_thread(sugerencias_bulk_de_ia, contexto, data, truncado)
+        except Exception as e:
+            return await asyncio.to_thread(sugerencias_bulk_de_respaldo, contexto, e)
+
+    except Exception as e:
+        print(f"ERROR CRITICO EN SUGGEST_BULK: {e}")
+        return {"error": f"Error interno: {str(e)}"}, 500, {}
+
+
+async def sesion(datos):
+    if quiere_trabajo(datos):
+        return await asyncio.to_thread(encolar_sesion, datos)
+    try:
+        prompt = build_session_prompt(datos)
+        sesion_data = await agenerate_json(ruta_sesion(datos), prompt, schema=SESION_SCHEMA)
+        return await asyncio.to_thread(sesion_generada, datos, sesion_data)
+    except Exception as e:
+        return error_sesion(e)
+
+
+async def seccion(datos):
+    respuesta, contexto = await asyncio.to_thread(preparar_seccion, datos)
+    if respuesta is not None:
+        return respuesta
+    try:
+        data = await agenerate_json(SECCION_ROUTE, contexto['prompt'], schema=contexto['schema'])
+        return await asyncio.to_thread(seccion_regenerada, contexto, data)
+    except Exception as e:
+        return error_sesion(e)
+
+
+async def ept(datos):
+    # El catálogo EPT está en SQLite: fuera del event loop
+    respuesta, contexto = await asyncio.to_thread(preparar_ept, datos)
+    if respuesta is not None:
+        return respuesta
+    try:
+        data = await agenerate_json(EPT_ROUTE, contexto["prompt"], schema=EPT_SCHEMA)
+        return await asyncio.to_thread(estructura_ept, contexto, data)
+    except Exception as e:
+        return error_ept(e)
+
+
+# path -> (endpoint de Flask, para métricas y logs; handler async)
+ROUTES = {
+    '/suggest': ('generar_sugerencias', sugerencias),
+    '/suggest_bulk': ('generar_sugerencias_bulk', sugerencias_bulk),
+    '/generate': ('generar_sesion', sesion),
+    '/regenerate_section': ('regenerar_seccion', seccion),
+    '/generate_ept_structure': ('generate_ept_structure', ept),
+}
+
+
+async def read_body(receive):
+    partes = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise ValueError("El cuerpo del request es demasiado grande.")
+        partes.append(chunk)
+        if not message.get('more_body'):
+            return b''.join(partes)
+
+
+async def send_json(send, payload, status, headers):
+    # Mismo formato que jsonify en producción (claves ordenadas, separadores compactos)
+    body = (app.json.dumps(payload, separators=(',', ':')) + '\n').encode('utf-8')
+    raw_headers = [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+    raw_headers.extend((k.lower().encode('latin-1'), str(v).encode('latin-1')) for k, v in headers.items())
+    await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def handle_ai_route(scope, receive, send, endpoint, handler):
+    timings = RequestTimings(endpoint)
+    bind_timings(timings)
+    try:
+        body = await read_body(receive)
+        if body is None:
+            return
+        datos = json.loads(body or b'null')
+    except ValueError as e:
+        payload, status, headers = {'error': f"Request inválido: {e}"}, 400, {}
+    else:
+        payload, status, headers = await handler(datos)
+
+    headers = {**headers, 'Server-Timing': timings.server_timing()}
+    await send_json(send, payload, status, headers)
+
+    elapsed = timings.elapsed()
+    REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, method='POST', status=status)
+    log_event('request', method='POST', path=scope['path'], status=status, duration_ms=round(elapsed * 1000, 1),
+              stages={k: round(v * 1000, 1) for k, v in timings.stages.items()})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    route = ROUTES.get(scope.get('path')) if scope['type'] == 'http' and scope.get('method') == 'POST' else None
+    if route is None:
+        await flask_asgi(scope, receive, send)
+        return
+    await handle_ai_route(scope, receive, send, *route)
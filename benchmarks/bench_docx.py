@@ -0,0 +1,191 @@
+"""
+Micro-benchmark del render de Word (docx_sesion.render_docx) para los formatos
+Primaria y Secundaria: sesiones "Resumida" y "Detallada", con y sin filas
+transversales. Mide tiempo (mediana), memoria pico (tracemalloc) y tamaño del
+.docx, y los compara con benchmarks/docx_baseline.json, que guarda una entrada
+por writer ("ooxml" y "python-docx") para que un writer no pise la línea base del otro.
+
+Uso:
+    python benchmarks/bench_docx.py
+    python benchmarks/bench_docx.py --check            # sale con 1 si hay regresión (para CI)
+    python -m pytest -m bench                          # el mismo --check dentro de la suite de tests
+    python benchmarks/bench_docx.py --update-baseline
+    python benchmarks/bench_docx.py --writer python-docx --check
+"""
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from docx_sesion import DOCX_WRITER, render_docx, render_docx_ooxml, render_docx_python_docx  # noqa: E402
+
+WRITERS = {'auto': render_docx, 'ooxml': render_docx_ooxml, 'python-docx': render_docx_python_docx}
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'docx_baseline.json')
+
+_PARRAFO = ("El docente presenta la situación significativa y plantea preguntas retadoras; "
+            "los estudiantes dialogan en equipos, registran sus hipótesis y las contrastan con "
+            "evidencias obtenidas de la lectura, la observación y el trabajo con material concreto. ")
+
+
+def _texto(tipo, frases):
+    # Resumida: una o dos frases; Detallada: varios párrafos narrativos
+    if tipo == 'Resumida':
+        return _PARRAFO[:160]
+    return '\n'.join(_PARRAFO * 2 for _ in range(frases))
+
+
+def make_case(nivel, tipo, transversales):
+    datos = {
+        'nivel': nivel,
+        'grado': '3er Grado' if nivel == 'Primaria' else '2do Grado',
+        'area': 'Matemática',
+        'tema': 'Resolvemos problemas con fracciones equivalentes',
+        'competencia': 'Resuelve problemas de cantidad',
+        'capacidad': 'Traduce cantidades a expresiones numéricas',
+        'desempeno': 'Establece relaciones entre datos y acciones de partir una unidad en partes iguales.',
+        'enfoque': 'Enfoque de orientación al bien común',
+        'valor': 'Solidaridad',
+        'tipo_sesion': tipo,
+        'ie': 'I.E. N° 0001', 'docente': 'Docente de prueba', 'director': 'Director de prueba',
+        'fecha': '15/03/2026', 'seccion': 'A',
+    }
+    if transversales:
+        datos['comp_transversal'] = 'Gestiona su aprendizaje de manera autónoma'
+        datos['cap_transversal'] = 'Define metas de aprendizaje'
+
+    n_criterios = 2 if tipo == 'Resumida' else 6
+    sesion = {
+        'titulo_sesion': datos['tema'],
+        'proposito': _texto(tipo, 1),
+        'evidencia': _texto(tipo, 1),
+        'estandar_aprendizaje': _texto(tipo, 2),
+        'datos_adicionales': {
+            'competencia_transversal': datos.get('comp_transversal', 'N/A'),
+            'capacidad_transversal': datos.get('cap_transversal', 'N/A'),
+            'enfoque_transversal': datos['enfoque'],
+            'valor_asociado': datos['valor'],
+            'tiempo_total': '90 minutos',
+        },
+        'criterios_evaluacion': [f"Criterio {i + 1}: {_PARRAFO[:90]}" for i in range(n_criterios)],
+        'secuencia_didactica': {
+            'inicio': _texto(tipo, 3),
+            'desarrollo': _texto(tipo, 8),
+            'cierre': _texto(tipo, 3),
+        },
+    }
+    return datos, sesion
+
+
+CASES = {
+    f"{nivel.lower()}_{tipo.lower()}_{'con' if trans else 'sin'}_transversales": (nivel, tipo, trans)
+    for nivel in ('Primaria', 'Secundaria')
+    for tipo in ('Resumida', 'Detallada')
+    for trans in (True, False)
+}
+
+
+def measure(datos, sesion, number, render=render_docx):
+    render(datos, sesion)  # calentamiento (imports, plantilla por defecto, esqueleto compilado)
+    tiempos = []
+    # Como timeit: sin el recolector de basura, que mete pausas del orden del propio render
+    gc.disable()
+    try:
+        for _ in range(number):
+            start = time.perf_counter()
+            data = render(datos, sesion)
+            tiempos.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+
+    # La memoria se mide aparte: tracemalloc distorsiona los tiempos
+    tracemalloc.start()
+    render(datos, sesion)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'time_ms': round(statistics.median(tiempos) * 1000, 2),
+        'peak_kb': round(peak / 1024, 1),
+        'size_bytes': len(data),
+    }
+
+
+def compare(name, result, base, tolerances, floors):
+    regresiones = []
+    for metric, tol in tolerances.items():
+        if base is None or metric not in base or not base[metric]:
+            continue
+        ratio = result[metric] / base[metric]
+        # La tolerancia es relativa; el piso solo descarta el ruido del reloj en renders de décimas de ms
+        if result[metric] - base[metric] <= floors.get(metric, 0):
+            continue
+        if ratio > 1 + tol:
+            regresiones.append(f"{name}: {metric} {base[metric]} -> {result[metric]} (+{(ratio - 1) * 100:.0f}%, tolerancia {tol * 100:.0f}%)")
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=50, help='Renders por caso para la mediana de tiempo')
+    parser.add_argument('--check', action='store_true', help='Sale con código 1 si algún caso empeora más de la tolerancia')
+    parser.add_argument('--update-baseline', action='store_true', help='Reescribe docx_baseline.json con los resultados actuales')
+    parser.add_argument('--time-tolerance', type=float, default=0.5, help='Aumento de tiempo permitido (0.5 = +50%%)')
+    parser.add_argument('--time-floor-ms', type=float, default=0.1, help='Aumento absoluto de tiempo que se ignora')
+    parser.add_argument('--memory-tolerance', type=float, default=0.2)
+    parser.add_argument('--size-tolerance', type=float, default=0.1)
+    parser.add_argument('--case', action='append', help='Solo estos casos (se puede repetir)')
+    parser.add_argument('--writer', choices=sorted(WRITERS), default='auto',
+                        help='auto = render_docx (OOXML directo con respaldo python-docx)')
+    args = parser.parse_args(argv)
+
+    baselines = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, encoding='utf-8') as f:
+            baselines = json.load(f)
+    # "auto" se compara con el writer que usa render_docx en este entorno
+    writer = DOCX_WRITER if args.writer == 'auto' else args.writer
+    baseline = baselines.setdefault(writer, {})
+    tolerances = {'time_ms': args.time_tolerance, 'peak_kb': args.memory_tolerance, 'size_bytes': args.size_tolerance}
+
+    results = {}
+    regresiones = []
+    print(f"writer: {writer}")
+    print(f"{'caso':42} {'ms':>8} {'base ms':>8} {'pico KB':>9} {'base KB':>9} {'bytes':>8} {'base':>8}")
+    for name, (nivel, tipo, trans) in CASES.items():
+        if args.case and name not in args.case:
+            continue
+        result = measure(*make_case(nivel, tipo, trans), args.number, WRITERS[args.writer])
+        results[name] = result
+        base = baseline.get(name)
+        b = base or {}
+        print(f"{name:42} {result['time_ms']:8.2f} {b.get('time_ms', '-'):>8} {result['peak_kb']:9.1f} "
+              f"{b.get('peak_kb', '-'):>9} {result['size_bytes']:8d} {b.get('size_bytes', '-'):>8}")
+        regresiones.extend(compare(name, result, base, tolerances, {'time_ms': args.time_floor_ms}))
+
+    if args.update_baseline:
+        baseline.update(results)
+        with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\nBaseline de {writer} actualizado: {BASELINE_PATH}")
+        return 0
+
+    if regresiones:
+        print("\nRegresiones:")
+        for r in regresiones:
+            print(f"  {r}")
+    else:
+        print("\nSin regresiones respecto al baseline.")
+    return 1 if args.check and regresiones else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""
+Benchmark de extracción de JSON sobre respuestas reales (y malformadas) de Gemini.
+
+Compara el extractor anterior (regex + json.loads) con json_extract.extract_json:
+cuántas respuestas se recuperan, si el resultado coincide con el esperado y
+cuánto tarda cada uno.
+
+Uso:
+    python benchmarks/bench_json_extract.py
+    python benchmarks/bench_json_extract.py --update-expected
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from json_extract import extract_json  # noqa: E402
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'json_corpus')
+
+
+def legacy_extract(text):
+    # Extractor anterior de app.py + el json.loads que hacían los endpoints
+    match = re.search(r'```json\s*(\{.*?\})\s*```', text, re.DOTALL)
+    if match:
+        return json.loads(match.group(1))
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    match = re.search(r'(\{.*\})', text, re.DOTALL)
+    if match:
+        return json.loads(match.group(1))
+    return json.loads(text.strip())
+
+
+def try_parse(fn, text):
+    try:
+        return fn(text)
+    except (json.JSONDecodeError, ValueError):
+        return None
+
+
+def load_corpus():
+    cases = []
+    for path in sorted(glob.glob(os.path.join(CORPUS_DIR, '*.txt'))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+        expected_path = os.path.join(CORPUS_DIR, name + '.expected.json')
+        expected = None
+        if os.path.exists(expected_path):
+            with open(expected_path, encoding='utf-8') as f:
+                expected = json.load(f)
+        cases.append((name, text, expected_path, expected))
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--update-expected', action='store_true', help='Reescribe los .expected.json con la salida actual')
+    parser.add_argument('--number', type=int, default=200, help='Repeticiones por caso para medir tiempo')
+    args = parser.parse_args()
+
+    cases = load_corpus()
+    totals = {'legacy': 0, 'nuevo': 0, 'correctos': 0}
+    t_legacy = t_new = 0.0
+
+    print(f"{'caso':32} {'legacy':>7} {'nuevo':>7} {'esperado':>9} {'legacy µs':>10} {'nuevo µs':>10}")
+    for name, text, expected_path, expected in cases:
+        old = try_parse(legacy_extract, text)
+        new = try_parse(extract_json, text)
+
+        if args.update_expected:
+            with open(expected_path, 'w', encoding='utf-8') as f:
+                json.dump(new, f, ensure_ascii=False, indent=2)
+                f.write('\n')
+            expected = new
+
+        ok = new == expected
+        totals['legacy'] += old is not None
+        totals['nuevo'] += new is not None
+        totals['correctos'] += ok
+
+        us_old = timeit.timeit(lambda: try_parse(legacy_extract, text), number=args.number) / args.number * 1e6
+        us_new = timeit.timeit(lambda: try_parse(extract_json, text), number=args.number) / args.number * 1e6
+        t_legacy += us_old
+        t_new += us_new
+        print(f"{name:32} {'ok' if old is not None else '-':>7} {'ok' if new is not None else '-':>7} "
+              f"{'ok' if ok else 'DIFERENTE':>9} {us_old:10.1f} {us_new:10.1f}")
+
+    n = len(cases)
+    print()
+    print(f"Recuperadas: legacy {totals['legacy']}/{n}, nuevo {totals['nuevo']}/{n} "
+          f"(regeneraciones evitadas: {totals['nuevo'] - totals['legacy']})")
+    print(f"Coinciden con lo esperado: {totals['correctos']}/{n}")
+    print(f"Tiempo total por pasada: legacy {t_legacy:.1f} µs, nuevo {t_new:.1f} µs")
+    return 0 if totals['correctos'] == n else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
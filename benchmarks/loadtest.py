@@ -0,0 +1,285 @@
+"""
+Generador de carga para la app: envía /suggest, /generate, /generate_ept_structure
+y /download con la concurrencia indicada y reporta latencias p50/p95/p99 y tasa
+de errores por endpoint. Pensado para correr contra el backend falso:
+
+    python fake_gemini_server.py --latency-ms 800 --rate-429 0.05 --malformed-rate 0.02
+    LLM_BACKEND=fake_server FAKE_GEMINI_URL=http://127.0.0.1:8089 python app.py
+    python benchmarks/loadtest.py --url http://127.0.0.1:5010 --concurrency 16 --requests 400
+
+(o LLM_BACKEND=fake con FAKE_LLM_LATENCY_MS, FAKE_LLM_RATE_429, ... sin servidor aparte)
+
+Tema, nivel, grado y área se sortean de un conjunto amplio; aun así las cachés
+de la app (sugerencias, catálogo EPT, .docx) atienden parte de la carga. Por eso
+se reporta qué fracción de respuestas no pasó por la IA (columna "%caché",
+según el "origen" de cada respuesta) y los aciertos de la caché de .docx que
+informa /llm_stats (con varios workers, solo los del que respondió).
+Con --unique-topics cada request lleva un tema distinto y pide respuesta nueva
+(force_ai en /suggest, refresh en EPT): ninguna caché responde y se mide solo la IA.
+
+Usa httpx, que ya instala google-genai: no hace falta nada aparte de requirements.txt.
+"""
+import argparse
+import itertools
+import json
+import math
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+
+GRADOS = {
+    "Primaria": ["1er Grado", "2do Grado", "3er Grado", "4to Grado", "5to Grado", "6to Grado"],
+    "Secundaria": ["1er Grado", "2do Grado", "3er Grado", "4to Grado", "5to Grado"],
+}
+AREAS = ["Matemática", "Comunicación", "Ciencia y Tecnología", "Personal Social", "Arte y Cultura"]
+TEMAS = [
+    "Fracciones equivalentes", "El texto argumentativo", "Los estados del agua", "Problemas de cantidad",
+    "La célula y sus partes", "Leemos cuentos de nuestra comunidad", "Medimos el perímetro del aula",
+    "El ciclo de vida de las plantas", "Escribimos una carta formal", "Las regiones naturales del Perú",
+    "Proporcionalidad directa", "La energía y sus transformaciones", "Creamos un afiche",
+    "Nuestros derechos y deberes", "Estadística con gráficos de barras", "La cadena alimenticia",
+]
+CAMPOS = ["desempeno", "competencia", "capacidad", "enfoque"]
+ESPECIALIDADES = ["Carpintería", "Computación", "Industria alimentaria"]
+# Valores de "origen" de respuestas que no llamaron a la IA
+ORIGENES_CACHE = {'cache', 'local', 'catalogo'}
+
+
+def percentile(values, p):
+    # Percentil por rango más cercano (los valores ya vienen ordenados)
+    if not values:
+        return 0.0
+    k = max(0, min(len(values) - 1, math.ceil(p / 100 * len(values)) - 1))
+    return values[k]
+
+
+def check_ept(data):
+    """
+    Valida la forma de /generate_ept_structure (lo que revisaba test_ept_endpoint.py).
+    """
+    comps = data.get('competencias')
+    if not isinstance(comps, list) or not comps:
+        return "Falta la lista 'competencias'"
+    for comp in comps:
+        if not all(k in comp for k in ('nombre', 'capacidades', 'desempenos')):
+            return "Competencia sin nombre, capacidades o desempenos"
+    return None
+
+
+class LoadTest:
+    def __init__(self, url, timeout, seed=None, unique_topics=False):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.random = random.Random(seed)
+        self.unique_topics = unique_topics
+        self._serial = itertools.count(1)
+        self.session_ids = []
+        self.results = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _http(self):
+        # Una sesión HTTP (keep-alive) por hilo
+        if not hasattr(self._local, 'http'):
+            self._local.http = httpx.Client()
+        return self._local.http
+
+    def _record(self, endpoint, seconds, error, origen=None):
+        with self._lock:
+            stats = self.results.setdefault(endpoint, {'latencies': [], 'errors': {}, 'origenes': {}})
+            stats['latencies'].append(seconds)
+            if error:
+                stats['errors'][error] = stats['errors'].get(error, 0) + 1
+            elif origen is not None:
+                stats['origenes'][origen] = stats['origenes'].get(origen, 0) + 1
+
+    def _datos(self):
+        nivel = self.random.choice(list(GRADOS))
+        tema = self.random.choice(TEMAS)
+        if self.unique_topics:
+            # Un tema que nadie pidió antes: ninguna caché puede responderlo
+            with self._lock:
+                tema = f"{tema} ({next(self._serial)})"
+        return {'nivel': nivel, 'grado': self.random.choice(GRADOS[nivel]),
+                'area': self.random.choice(AREAS), 'tema': tema}
+
+    @staticmethod
+    def _origen(response):
+        # Sin "origen" la respuesta vino de la IA
+        try:
+            origen = response.json().get('origen')
+        except ValueError:
+            return None
+        return origen if isinstance(origen, str) else 'ia'
+
+    def _request(self, method, path, **kwargs):
+        start = time.perf_counter()
+        error = None
+        response = None
+        try:
+            response = self._http().request(method, self.url + path, timeout=self.timeout, **kwargs)
+            if response.status_code >= 400:
+                error = str(response.status_code)
+        except httpx.HTTPError as e:
+            error = type(e).__name__
+        return response, start, error
+
+    def suggest(self):
+        datos = dict(self._datos(), campo=self.random.choice(CAMPOS))
+        if self.unique_topics:
+            datos['force_ai'] = True
+        response, start, error = self._request('POST', '/suggest', json=datos)
+        elapsed = time.perf_counter() - start
+        self._record('suggest', elapsed, error, self._origen(response) if error is None else None)
+
+    def generate(self):
+        response, start, error = self._request('POST', '/generate', json=self._datos())
+        if error is None:
+            session_id = response.json().get('session_id')
+            if session_id:
+                with self._lock:
+                    self.session_ids.append(session_id)
+        self._record('generate', time.perf_counter() - start, error)
+
+    def ept(self):
+        datos = dict(self._datos(), especialidad=self.random.choice(ESPECIALIDADES))
+        if self.unique_topics:
+            # El catálogo EPT no depende del tema: hay que pedir una estructura nueva
+            datos['refresh'] = True
+        response, start, error = self._request('POST', '/generate_ept_structure', json=datos)
+        elapsed = time.perf_counter() - start
+        origen = None
+        if error is None:
+            try:
+                problema = check_ept(response.json())
+            except ValueError:
+                problema = 'JSON inválido'
+            if problema:
+                error = 'estructura'
+            else:
+                origen = self._origen(response)
+        self._record('ept', elapsed, error, origen)
+
+    def download(self):
+        with self._lock:
+            session_id = self.random.choice(self.session_ids) if self.session_ids else None
+        if session_id is None:
+            # Todavía no hay sesiones: se genera una primero
+            return self.generate()
+        response, start, error = self._request('GET', '/download', params={'session_id': session_id})
+        if error is None:
+            # Se mide hasta recibir el documento completo
+            response.content
+        self._record('download', time.perf_counter() - start, error)
+
+    def server_stats(self):
+        """
+        Contadores de caché de /llm_stats (None si la app no responde).
+        """
+        try:
+            response = httpx.get(self.url + '/llm_stats', timeout=self.timeout)
+            return response.json()
+        except (httpx.HTTPError, ValueError):
+            return None
+
+    def run(self, mix, total, concurrency):
+        acciones = list(itertools.chain.from_iterable([getattr(self, name)] * peso for name, peso in mix.items()))
+        plan = [self.random.choice(acciones) for _ in range(total)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for future in [pool.submit(accion) for accion in plan]:
+                future.result()
+        return time.perf_counter() - start
+
+    def report(self, elapsed, antes=None, despues=None):
+        print(f"{'endpoint':10} {'n':>6} {'errores':>8} {'%err':>6} {'%caché':>7} "
+              f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+        resumen = {}
+        total = errores = 0
+        for endpoint, stats in sorted(self.results.items()):
+            lat = sorted(stats['latencies'])
+            n = len(lat)
+            n_err = sum(stats['errors'].values())
+            total += n
+            errores += n_err
+            # Fracción de respuestas correctas que no pasaron por la IA (None si el endpoint no informa origen)
+            n_origen = sum(stats['origenes'].values())
+            n_cache = sum(c for origen, c in stats['origenes'].items() if origen in ORIGENES_CACHE)
+            hit_ratio = round(n_cache / n_origen, 4) if n_origen else None
+            fila = {
+                'n': n,
+                'errors': n_err,
+                'error_rate': round(n_err / n, 4) if n else 0.0,
+                'cache_hit_ratio': hit_ratio,
+                'origins': stats['origenes'],
+                'p50_ms': round(percentile(lat, 50) * 1000, 1),
+                'p95_ms': round(percentile(lat, 95) * 1000, 1),
+                'p99_ms': round(percentile(lat, 99) * 1000, 1),
+                'max_ms': round(lat[-1] * 1000, 1) if lat else 0.0,
+                'error_kinds': stats['errors'],
+            }
+            resumen[endpoint] = fila
+            cache = f"{hit_ratio * 100:6.1f}%" if hit_ratio is not None else f"{'-':>7}"
+            print(f"{endpoint:10} {n:6d} {n_err:8d} {fila['error_rate'] * 100:5.1f}% {cache} {fila['p50_ms']:9.1f} "
+                  f"{fila['p95_ms']:9.1f} {fila['p99_ms']:9.1f} {fila['max_ms']:9.1f}"
+                  + (f"  {stats['errors']}" if stats['errors'] else ''))
+        print()
+        print(f"Total: {total} requests en {elapsed:.1f}s ({total / elapsed:.1f} req/s), "
+              f"errores {errores} ({errores / total * 100 if total else 0:.1f}%)")
+        if antes and despues:
+            docx_antes, docx_despues = antes.get('docx_cache', {}), despues.get('docx_cache', {})
+            hits = docx_despues.get('hits', 0) - docx_antes.get('hits', 0)
+            misses = docx_despues.get('misses', 0) - docx_antes.get('misses', 0)
+            if hits + misses and 'download' in resumen:
+                resumen['download']['cache_hit_ratio'] = round(hits / (hits + misses), 4)
+                print(f"Caché de .docx (según /llm_stats): {hits}/{hits + misses} aciertos "
+                      f"({hits / (hits + misses) * 100:.1f}%)")
+        return resumen, (errores / total if total else 0.0)
+
+
+def parse_mix(text):
+    mix = {}
+    for parte in text.split(','):
+        name, _, peso = parte.partition('=')
+        if name not in ('suggest', 'generate', 'ept', 'download'):
+            raise argparse.ArgumentTypeError(f"Endpoint desconocido en --mix: {name}")
+        mix[name] = int(peso or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:5010')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='Total de requests a enviar')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('suggest=4,generate=2,ept=1,download=2'),
+                        help='Pesos por endpoint, p. ej. suggest=4,generate=2,ept=1,download=2')
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--unique-topics', action='store_true',
+                        help='Un tema distinto por request: sin aciertos de caché, solo la IA')
+    parser.add_argument('--json', help='Guarda el resumen en este archivo')
+    parser.add_argument('--max-error-rate', type=float, help='Sale con código 1 si la tasa de errores la supera')
+    args = parser.parse_args()
+
+    test = LoadTest(args.url, args.timeout, args.seed, args.unique_topics)
+    antes = test.server_stats()
+    elapsed = test.run(args.mix, args.requests, args.concurrency)
+    resumen, error_rate = test.report(elapsed, antes, test.server_stats())
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'elapsed_s': round(elapsed, 2), 'concurrency': args.concurrency, 'endpoints': resumen},
+                      f, ensure_ascii=False, indent=2)
+    if args.max_error_rate is not None and error_rate > args.max_error_rate:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
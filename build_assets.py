@@ -0,0 +1,340 @@
+"""
+Build de los archivos estáticos para producción (static/dist/):
+
+  - imágenes redimensionadas en WebP y AVIF (más una copia PNG de respaldo),
+  - nombres con hash de contenido para script.js, minedu_data.js, styles.css e imágenes,
+  - versiones precomprimidas .gz y .br de todo lo que es texto (incluidos home.html e index.html),
+  - librerías de CDN con versión fija: se descargan a static/vendor/ en el build y se
+    sirven desde static/dist/; si no se pudieron descargar se usa la URL fija del CDN
+    con el hash guardado en una descarga anterior. El <script> lleva integrity (SRI)
+    y crossorigin; si falta algún hash el build falla (salvo --allow-missing-sri),
+  - manifest.json con la correspondencia nombre lógico -> archivo con hash.
+
+Uso (p. ej. en el build command de Render):
+    pip install -r requirements.txt
+    python build_assets.py             # descarga las librerías que faltan y arma static/dist
+    python build_assets.py --vendor    # vuelve a descargar todas las librerías fijadas
+    python build_assets.py --allow-missing-sri   # sin red: acepta librerías sin hash SRI
+
+Pillow (WebP/AVIF) y brotli (.br) son opcionales: si no están instalados se
+omiten esas variantes y la app sigue sirviendo PNG y gzip.
+"""
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import urllib.error
+import urllib.request
+from io import BytesIO
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DIST_DIR = os.path.join(ROOT, 'static', 'dist')
+VENDOR_DIR = os.path.join(ROOT, 'static', 'vendor')
+DIST_URL = '/static/dist/'
+
+# Imagen de origen -> anchos a generar (además del tamaño original si es menor)
+IMAGES = {
+    'RIO.png': (768, 1280, 1920),
+    'animales.png': (640, 1280),
+    'arbol.png': (640, 1280),
+    '1.png': (),
+}
+IMAGE_SIZES = {
+    'RIO.png': '100vw',
+    'animales.png': '(max-width: 768px) 100vw, 50vw',
+    'arbol.png': '(max-width: 768px) 100vw, 50vw',
+    '1.png': '64px',
+}
+
+ASSETS = ('styles.css', 'script.js', 'minedu_data.js')
+PAGES = ('index.html', 'home.html')
+
+# URL tal como aparece en el HTML -> (archivo en static/vendor, URL fija en el CDN)
+VENDOR_LIBS = {
+    'https://unpkg.com/react@18/umd/react.production.min.js':
+        ('react.production.min.js', 'https://unpkg.com/react@18.3.1/umd/react.production.min.js'),
+    'https://unpkg.com/react-dom@18/umd/react-dom.production.min.js':
+        ('react-dom.production.min.js', 'https://unpkg.com/react-dom@18.3.1/umd/react-dom.production.min.js'),
+    'https://unpkg.com/@babel/standalone/babel.min.js':
+        ('babel.min.js', 'https://unpkg.com/@babel/standalone@7.26.4/babel.min.js'),
+    'https://cdn.tailwindcss.com':
+        ('tailwindcss.js', 'https://cdn.tailwindcss.com/3.4.16'),
+    'https://unpkg.com/framer-motion@10.16.4/dist/framer-motion.js':
+        ('framer-motion.js', 'https://unpkg.com/framer-motion@10.16.4/dist/framer-motion.js'),
+    'https://unpkg.com/lucide@latest':
+        ('lucide.min.js', 'https://unpkg.com/lucide@0.460.0/dist/umd/lucide.min.js'),
+}
+
+VENDOR_INDEX = 'vendor.json'
+
+COMPRESSIBLE = ('.html', '.css', '.js', '.json', '.svg')
+MIN_COMPRESS_BYTES = 512
+
+
+def sri_hash(data):
+    return 'sha384-' + base64.b64encode(hashlib.sha384(data).digest()).decode('ascii')
+
+
+def read_vendor_index(vendor_dir=VENDOR_DIR):
+    try:
+        with open(os.path.join(vendor_dir, VENDOR_INDEX), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def hashed_name(name, data):
+    base, ext = os.path.splitext(name)
+    return f"{base}.{content_hash(data)}{ext}"
+
+
+class Build:
+    """
+    Escribe los archivos en dist_dir y arma el manifest a medida que avanza.
+    """
+
+    def __init__(self, dist_dir=DIST_DIR, vendor_dir=VENDOR_DIR):
+        self.dist_dir = dist_dir
+        self.vendor_dir = vendor_dir
+        self.manifest = {'assets': {}, 'images': {}, 'pages': {}, 'vendor': {}}
+        self.vendor_index = read_vendor_index(vendor_dir)
+        self.written = 0
+
+    def write(self, name, data):
+        path = os.path.join(self.dist_dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        self.written += 1
+        if name.endswith(COMPRESSIBLE) and len(data) >= MIN_COMPRESS_BYTES:
+            # mtime=0: el .gz no cambia entre builds si el contenido no cambia
+            with open(path + '.gz', 'wb') as f:
+                f.write(gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(path + '.br', 'wb') as f:
+                    f.write(brotli.compress(data, quality=11))
+        return DIST_URL + name
+
+    def write_hashed(self, name, data):
+        return self.write(hashed_name(name, data), data)
+
+    # --- imágenes ---
+    def build_image(self, name, widths):
+        with open(os.path.join(ROOT, name), 'rb') as f:
+            original = f.read()
+        info = {'fallback': self.write_hashed(name, original), 'avif': [], 'webp': []}
+        if Image is None:
+            self.manifest['images'][name] = info
+            return
+
+        with Image.open(BytesIO(original)) as img:
+            img.load()
+            if img.mode not in ('RGB', 'RGBA'):
+                img = img.convert('RGBA')
+            sizes = sorted({w for w in widths if w < img.width} | {img.width})
+            base = os.path.splitext(name)[0]
+            for width in sizes:
+                height = round(img.height * width / img.width)
+                resized = img if width == img.width else img.resize((width, height), Image.LANCZOS)
+                for fmt, options in (('webp', {'quality': 80, 'method': 6}), ('avif', {'quality': 55})):
+                    buffer = BytesIO()
+                    try:
+                        resized.save(buffer, fmt.upper(), **options)
+                    except (KeyError, OSError, ValueError):
+                        # Pillow sin soporte AVIF (p. ej. < 11.3 sin el plugin pillow-avif)
+                        continue
+                    url = self.write_hashed(f"{base}-{width}.{fmt}", buffer.getvalue())
+                    info[fmt].append((url, width))
+        self.manifest['images'][name] = info
+
+    # --- librerías de CDN ---
+    def vendor(self, cdn_url):
+        """
+        (url, integrity) de una librería: la copia local con hash o, si no se
+        descargó, la URL fija del CDN con el hash de vendor.json (None si no se conoce).
+        """
+        filename, pinned = VENDOR_LIBS[cdn_url]
+        path = os.path.join(self.vendor_dir, filename)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                data = f.read()
+            url, integrity = self.write_hashed(filename, data), sri_hash(data)
+        else:
+            conocido = self.vendor_index.get(filename, {})
+            url, integrity = pinned, conocido.get('sha384') if conocido.get('url') == pinned else None
+        self.manifest['vendor'][filename] = {'url': url, 'integrity': integrity}
+        return url, integrity
+
+
+def _image_for(ref, images):
+    # Las referencias en HTML/CSS usan rutas distintas (assets/RIO.png, /static/images/1.png...)
+    return images.get(os.path.basename(ref))
+
+
+def _srcset(variants):
+    return ', '.join(f"{url} {width}w" for url, width in variants)
+
+
+def rewrite_css(css, images):
+    """
+    background-image: url(x.png) -> PNG con hash de respaldo + image-set() con AVIF/WebP.
+    """
+    newline = '\r\n' if '\r\n' in css else '\n'
+
+    def replace(m):
+        indent, ref = m.group(1), m.group(2)
+        info = _image_for(ref, images)
+        if info is None:
+            return m.group(0)
+        decl = f"{indent}background-image: url('{info['fallback']}');"
+        options = [f"url('{info[fmt][-1][0]}') type('image/{fmt}')" for fmt in ('avif', 'webp') if info[fmt]]
+        if options:
+            options.append(f"url('{info['fallback']}') type('image/png')")
+            decl += f"{newline}{indent}background-image: image-set({', '.join(options)});"
+        return decl
+
+    return re.sub(r"(?m)^([ \t]*)background-image:\s*url\(['\"]?([^'\")]+\.png)['\"]?\);", replace, css)
+
+
+def rewrite_html(html, build, assets):
+    """
+    Apunta el HTML a los archivos con hash, a las librerías fijadas y a <picture> con AVIF/WebP.
+    """
+    def script_or_link(m):
+        tag, ref = m.group(0), m.group(1)
+        if ref in VENDOR_LIBS:
+            url, integrity = build.vendor(ref)
+            tag = tag.replace(f'"{ref}"', f'"{url}"', 1)
+            if integrity is None:
+                return tag
+            # crossorigin="anonymous" es necesario para que el navegador verifique el hash
+            tag = re.sub(r'\s+crossorigin(?:="[^"]*")?(?=[\s>])', '', tag)
+            return f'{tag[:-1]} integrity="{integrity}" crossorigin="anonymous">'
+        if ref in assets:
+            return tag.replace(f'"{ref}"', f'"{assets[ref]}"', 1)
+        return tag
+
+    html = re.sub(r'<(?:script|link)\b[^>]*?(?:src|href)="([^"]+)"[^>]*>', script_or_link, html)
+
+    def picture(m):
+        info = _image_for(m.group(2), build.manifest['images'])
+        if info is None:
+            return m.group(0)
+        img = f"{m.group(1)}{info['fallback']}{m.group(3)}"
+        if not info['avif'] and not info['webp']:
+            return img
+        sizes = IMAGE_SIZES.get(os.path.basename(m.group(2)), '100vw')
+        sources = ''.join(
+            f'<source type="image/{fmt}" srcset="{_srcset(info[fmt])}" sizes="{sizes}">'
+            for fmt in ('avif', 'webp') if info[fmt]
+        )
+        return f"<picture>{sources}{img}</picture>"
+
+    return re.sub(r'(<img\b[^>]*?src=")([^"]+\.png)("[^>]*>)', picture, html)
+
+
+def build_all(dist_dir=DIST_DIR, vendor_dir=VENDOR_DIR):
+    if os.path.isdir(dist_dir):
+        shutil.rmtree(dist_dir)
+    os.makedirs(dist_dir)
+    build = Build(dist_dir, vendor_dir)
+
+    for name, widths in IMAGES.items():
+        build.build_image(name, widths)
+
+    assets = build.manifest['assets']
+    for name in ASSETS:
+        # newline='' conserva los CRLF de los archivos originales
+        with open(os.path.join(ROOT, name), 'r', encoding='utf-8', newline='') as f:
+            text = f.read()
+        if name.endswith('.css'):
+            text = rewrite_css(text, build.manifest['images'])
+        assets[name] = build.write_hashed(name, text.encode('utf-8'))
+
+    for name in PAGES:
+        with open(os.path.join(ROOT, name), 'r', encoding='utf-8', newline='') as f:
+            html = rewrite_html(f.read(), build, assets)
+        build.manifest['pages'][name] = build.write(name, html.encode('utf-8'))
+
+    with open(os.path.join(dist_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(build.manifest, f, ensure_ascii=False, indent=2)
+    return build
+
+
+def download_vendor(vendor_dir=VENDOR_DIR, refresh=False):
+    """
+    Descarga las librerías que faltan (o todas, con refresh) en su versión fija
+    y guarda su hash SRI en vendor.json. Sin red solo avisa: el build usa el CDN
+    con el hash de una descarga anterior, si la hubo.
+    """
+    integridad = read_vendor_index(vendor_dir)
+    descargadas = 0
+    for filename, url in VENDOR_LIBS.values():
+        path = os.path.join(vendor_dir, filename)
+        if os.path.exists(path) and not refresh:
+            continue
+        try:
+            with urllib.request.urlopen(url, timeout=60) as response:
+                data = response.read()
+        except (urllib.error.URLError, OSError) as e:
+            print(f"  {filename}: no se pudo descargar ({e}); se usará {url}")
+            continue
+        os.makedirs(vendor_dir, exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        integridad[filename] = {'url': url, 'sha384': sri_hash(data)}
+        descargadas += 1
+        print(f"  {filename}: {len(data) // 1024} KB")
+    if descargadas:
+        # vendor.json queda junto a las copias: si luego falta una, el CDN conserva su integrity
+        with open(os.path.join(vendor_dir, VENDOR_INDEX), 'w', encoding='utf-8') as f:
+            json.dump(integridad, f, ensure_ascii=False, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Genera static/dist con archivos optimizados.')
+    parser.add_argument('--vendor', action='store_true', help='Vuelve a descargar todas las librerías de CDN fijadas')
+    parser.add_argument('--allow-missing-sri', action='store_true',
+                        help='No falla si alguna librería queda sin hash SRI (p. ej. un build local sin red)')
+    args = parser.parse_args()
+
+    print("Librerías fijadas...")
+    download_vendor(refresh=args.vendor)
+    if Image is None:
+        print("Aviso: Pillow no está instalado; se omiten las variantes WebP/AVIF.")
+    if brotli is None:
+        print("Aviso: brotli no está instalado; solo se generan versiones .gz.")
+
+    build = build_all()
+    libs = build.manifest['vendor']
+    sin_hash = sorted(name for name, lib in libs.items() if lib['integrity'] is None)
+    if sin_hash:
+        mensaje = f"sin hash SRI (no se descargaron ni están en {VENDOR_INDEX}): {', '.join(sin_hash)}"
+        if not args.allow_missing_sri:
+            raise SystemExit(f"Error: {mensaje}. Descárgalas con red o usa --allow-missing-sri.")
+        print(f"Aviso: {mensaje}")
+    locales = sum(1 for lib in libs.values() if lib['url'].startswith(DIST_URL))
+    print(f"Build listo: {build.written} archivos en {DIST_DIR} "
+          f"({locales}/{len(VENDOR_LIBS)} librerías servidas localmente)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+import bisect
+import hashlib
+import json
+import os
+import re
+
+from response_cache import normalize_text
+
+
+MINEDU_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'minedu_data.js')
+
+
+def _strip_js_comments(source):
+    # Quita comentarios // y /* */ respetando el contenido de los strings
+    out = []
+    i = 0
+    in_string = None
+    while i < len(source):
+        ch = source[i]
+        if in_string:
+            out.append(ch)
+            if ch == '\\':
+                out.append(source[i + 1])
+                i += 1
+            elif ch == in_string:
+                in_string = None
+        elif ch in '"\'':
+            in_string = ch
+            out.append(ch)
+        elif source.startswith('//', i):
+            while i < len(source) and source[i] != '\n':
+                i += 1
+            continue
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            i = len(source) if end == -1 else end + 2
+            continue
+        else:
+            out.append(ch)
+        i += 1
+    return ''.join(out)
+
+
+def parse_minedu_js(source):
+    """
+    Convierte el contenido de minedu_data.js (window.MINEDU_DATA = {...};) en un dict.
+    """
+    source = _strip_js_comments(source)
+    start = source.index('{', source.index('='))
+    end = source.rindex('}') + 1
+    body = re.sub(r',(\s*[}\]])', r'\1', source[start:end])
+    return json.loads(body)
+
+
+class Curriculo:
+    """
+    Modelo del CNEB cargado una sola vez al iniciar, con índices para consultas
+    y validaciones locales (sin llamar a Gemini).
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.niveles = data.get('niveles', {})
+        self.curriculo = data.get('curriculo', {})
+        self.transversales = data.get('transversales', {}).get('competencias', {})
+        self.enfoques = data.get('enfoques', {})
+
+        # nivel -> áreas (área -> competencia -> capacidades es self.curriculo)
+        self.areas_por_nivel = {nivel: list(info.get('areas', [])) for nivel, info in self.niveles.items()}
+        # Búsquedas sin tildes ni mayúsculas
+        self._areas_norm = {normalize_text(a): a for a in self.curriculo}
+        self._niveles_norm = {normalize_text(n): n for n in self.niveles}
+
+        self._build_prefix_index()
+        self._slices = {}
+        self.etag = self._etag(self.data)
+
+    def _build_prefix_index(self):
+        # Se indexa cada nombre desde el inicio de cada palabra: "cantidad" encuentra
+        # "Resuelve problemas de cantidad" igual que "resuelve prob"
+        entries = []
+
+        def add(tipo, nombre, **contexto):
+            norm = normalize_text(nombre)
+            item = dict(tipo=tipo, nombre=nombre, **contexto)
+            for m in re.finditer(r'\S+', norm):
+                entries.append((norm[m.start():], len(entries), item))
+
+        for nivel in self.areas_por_nivel:
+            add('nivel', nivel)
+        for area, comps in self.curriculo.items():
+            add('area', area)
+            for comp, caps in comps.items():
+                add('competencia', comp, area=area)
+                for cap in caps:
+                    add('capacidad', cap, area=area, competencia=comp)
+        for comp, caps in self.transversales.items():
+            add('competencia_transversal', comp)
+            for cap in caps:
+                add('capacidad_transversal', cap, competencia=comp)
+        for enfoque, info in self.enfoques.items():
+            add('enfoque', enfoque)
+            for valor in info.get('valores', []):
+                add('valor', valor, enfoque=enfoque)
+
+        entries.sort(key=lambda e: (e[0], e[1]))
+        self._prefix_keys = [e[0] for e in entries]
+        self._prefix_items = [e[2] for e in entries]
+
+    @staticmethod
+    def _etag(payload):
+        raw = json.dumps(payload, ensure_ascii=False, sort_keys=True).encode('utf-8')
+        return hashlib.sha1(raw).hexdigest()
+
+    def canonical_area(self, area):
+        return self._areas_norm.get(normalize_text(area))
+
+    def canonical_nivel(self, nivel):
+        return self._niveles_norm.get(normalize_text(nivel))
+
+    def search(self, prefix, tipo=None, limit=20):
+        """
+        Busca nombres (áreas, competencias, capacidades, enfoques...) por prefijo.
+        """
+        prefix = normalize_text(prefix)
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        i = bisect.bisect_left(self._prefix_keys, prefix)
+        while i < len(self._prefix_keys) and self._prefix_keys[i].startswith(prefix):
+            item = self._prefix_items[i]
+            ident = id(item)
+            if ident not in seen and (tipo is None or item['tipo'] == tipo):
+                seen.add(ident)
+                results.append(item)
+                if len(results) >= limit:
+                    break
+            i += 1
+        return results
+
+    def slice(self, nivel):
+        """
+        Subconjunto del currículo para un nivel, con su propio ETag (memoizado).
+        """
+        nivel = self.canonical_nivel(nivel)
+        if nivel is None:
+            return None
+        if nivel not in self._slices:
+            areas = self.areas_por_nivel.get(nivel, [])
+            payload = {
+                'nivel': nivel,
+                'areas': areas,
+                'curriculo': {a: self.curriculo[a] for a in areas if a in self.curriculo},
+                'transversales': self.data.get('transversales', {}),
+                'enfoques': self.enfoques,
+            }
+            self._slices[nivel] = (payload, self._etag(payload))
+        return self._slices[nivel]
+
+    def validate(self, datos):
+        """
+        Valida nivel/área/competencia/capacidad contra el CNEB. Devuelve una lista de errores.
+        Las áreas que no están en el currículo (p. ej. EPT por especialidad) no se validan más allá.
+        """
+        errores = []
+        nivel = self.canonical_nivel(datos.get('nivel', ''))
+        if datos.get('nivel') and nivel is None:
+            errores.append(f"Nivel desconocido: {datos.get('nivel')}")
+
+        area = self.canonical_area(datos.get('area', ''))
+        if not datos.get('area') or area is None:
+            return errores
+        if nivel and area not in self.areas_por_nivel.get(nivel, []):
+            errores.append(f"El área '{area}' no corresponde al nivel {nivel}.")
+
+        competencia = datos.get('competencia')
+        comps = {normalize_text(c): c for c in self.curriculo.get(area, {})}
+        if competencia:
+            comp = comps.get(normalize_text(competencia))
+            if comp is None:
+                errores.append(f"La competencia '{competencia}' no pertenece al área '{area}'.")
+            elif datos.get('capacidad'):
+                caps = {normalize_text(c) for c in self.curriculo[area][comp]}
+                if normalize_text(datos['capacidad']) not in caps:
+                    errores.append(f"La capacidad '{datos['capacidad']}' no pertenece a la competencia '{comp}'.")
+        return errores
+
+
+def load_curriculo(path=MINEDU_DATA_PATH):
+    with open(path, 'r', encoding='utf-8') as f:
+        return Curriculo(parse_minedu_js(f.read()))
@@ -1,32 +1,7 @@
-import re
-import json
+from json_extract import extract_json
 
-def extract_json_from_text(text):
-    print(f"--- Processing Text ({len(text)} chars) ---")
-    
-    # 1. Intentar encontrar bloque de código JSON ```json ... ```
-    match = re.search(r'```json\s*(\{.*?\})\s*```', text, re.DOTALL)
-    if match:
-        print("MATCH STEP 1")
-        return match.group(1)
-    
-    # 2. Intentar parsear todo el texto directamente
-    try:
-        json.loads(text)
-        print("MATCH STEP 2")
-        return text
-    except json.JSONDecodeError:
-        pass
-
-    # 3. Intentar encontrar cualquier bloque entre llaves {}
-    # Greedy: First { to Last }
-    match = re.search(r'(\{.*\})', text, re.DOTALL)
-    if match:
-        print("MATCH STEP 3")
-        return match.group(1)
-        
-    print("NO MATCH - STEP 4")
-    return text.strip()
+# Los casos reales (y muchos más) están en benchmarks/json_corpus/;
+# python benchmarks/bench_json_extract.py compara el extractor viejo con el nuevo.
 
 # Test Case 1: Standard Markdown with newline
 text1 = """```json
@@ -42,6 +17,10 @@ text2 = """```json { "titulo": "Hola" } ```"""
 text3 = """```json { "titulo_sesion": "¡Qué rico!", "proposito": "..." }""" 
 # (Note: Missing closing backticks or something?)
 
-print(f"Result 1: {extract_json_from_text(text1)}")
-print(f"Result 2: {extract_json_from_text(text2)}")
-print(f"Result 3: {extract_json_from_text(text3)}")
+# Test Case 4: Respuesta truncada por el modelo
+text4 = """```json { "titulo_sesion": "Hola", "criterios_evaluacion": ["Uno", "Do"""
+
+print(f"Result 1: {extract_json(text1)}")
+print(f"Result 2: {extract_json(text2)}")
+print(f"Result 3: {extract_json(text3)}")
+print(f"Result 4: {extract_json(text4)}")
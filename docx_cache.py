@@ -0,0 +1,117 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from docx_sesion import render_docx
+
+
+class DocxRenderCache:
+    """
+    Pre-renderiza los .docx en un pool de hilos en cuanto se genera la sesión y
+    guarda los bytes por session_id. La caché está acotada por tamaño total en
+    bytes y descarta primero lo menos usado (LRU).
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, workers=2, render=render_docx):
+        self.max_bytes = max_bytes
+        self.render = render
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='docx-render')
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+        self._pending = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.waits = 0
+        self.misses = 0
+        self.renders = 0
+        self.errors = 0
+
+    def schedule(self, key, datos, sesion):
+        """
+        Encola el render en segundo plano (reemplaza cualquier render previo de esa clave).
+        """
+        token = object()
+        with self._lock:
+            future = self._pool.submit(self._render_background, key, token, datos, sesion)
+            self._pending[key] = (token, future)
+        return future
+
+    def _render_background(self, key, token, datos, sesion):
+        try:
+            data = self.render(datos, sesion)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+                if self._pending.get(key, (None,))[0] is token:
+                    del self._pending[key]
+            print(f"ERROR PRE-RENDER DOCX ({key}): {e}")
+            raise
+        with self._lock:
+            self.renders += 1
+            # Solo se guarda si nadie invalidó o reprogramó esta clave mientras tanto
+            if self._pending.get(key, (None,))[0] is token:
+                del self._pending[key]
+                self._put(key, data)
+        return data
+
+    def _put(self, key, data):
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.total_bytes -= len(old)
+        if len(data) > self.max_bytes:
+            return
+        self._items[key] = data
+        self.total_bytes += len(data)
+        while self.total_bytes > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.total_bytes -= len(evicted)
+
+    def get(self, key, datos, sesion):
+        """
+        Devuelve los bytes del documento: desde la caché, esperando el render en
+        curso, o renderizando en el momento si no hay nada (p. ej. otro worker).
+        """
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return data
+            pending = self._pending.get(key)
+
+        if pending is not None:
+            try:
+                data = pending[1].result()
+                with self._lock:
+                    self.waits += 1
+                return data
+            except Exception:
+                pass
+
+        data = self.render(datos, sesion)
+        with self._lock:
+            self.misses += 1
+            self.renders += 1
+            self._put(key, data)
+        return data
+
+    def invalidate(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.total_bytes -= len(old)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._items),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'pending': len(self._pending),
+                'hits': self.hits,
+                'waited_for_background': self.waits,
+                'misses': self.misses,
+                'renders': self.renders,
+                'errors': self.errors,
+            }
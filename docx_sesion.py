@@ -0,0 +1,637 @@
+import os
+import threading
+from io import BytesIO
+
+from docx import Document
+from docx.shared import Pt, Inches, RGBColor
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml.ns import qn
+from docx.oxml import OxmlElement
+
+from ooxml_writer import CompiledDocx, SlotRecorder
+from metrics import stage, record_fallback
+
+
+DOCX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+# 'ooxml' (por defecto): esqueleto compilado + ZIP directo; 'python-docx': el camino anterior
+DOCX_WRITER = os.environ.get('DOCX_WRITER', 'ooxml')
+
+
+# --- RECURSOS COMPARTIDOS (Helpers) ---
+def shade_cell(cell, shade_color):
+    shading_elm = OxmlElement('w:shd')
+    shading_elm.set(qn('w:fill'), shade_color)
+    cell._element.get_or_add_tcPr().append(shading_elm)
+
+
+def add_bold_centered_text(cell, text, font_size=10, shade_color=None):
+    if shade_color:
+        shade_cell(cell, shade_color)
+    if cell.paragraphs:
+        p = cell.paragraphs[0]
+    else:
+        p = cell.add_paragraph()
+    p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    run = p.add_run(str(text) if text else '-')
+    run.bold = True
+    run.font.size = Pt(font_size)
+    run.font.name = 'Arial'
+
+
+def add_bold_text(cell, text, font_size=10, shade_color=None, align='left'):
+    if shade_color:
+        shade_cell(cell, shade_color)
+    if cell.paragraphs:
+        p = cell.paragraphs[0]
+    else:
+        p = cell.add_paragraph()
+    if align == 'center':
+        p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    elif align == 'justify':
+        p.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+    elif align == 'right':
+        p.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+    run = p.add_run(str(text) if text else '-')
+    run.bold = True
+    run.font.size = Pt(font_size)
+    run.font.name = 'Arial'
+
+
+def add_normal_text(cell, text, font_size=10, align='left'):
+    if cell.paragraphs:
+        p = cell.paragraphs[0]
+    else:
+        p = cell.add_paragraph()
+    if align == 'center':
+        p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    elif align == 'justify':
+        p.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+    elif align == 'right':
+        p.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+    run = p.add_run(str(text) if text else '-')
+    run.font.size = Pt(font_size)
+    run.font.name = 'Arial'
+
+
+def format_criterios(criterios_list):
+    if isinstance(criterios_list, list):
+        return "\n".join([f"• {c}" for c in criterios_list])
+    return str(criterios_list)
+
+
+# --- GENERADORES ESPECÍFICOS ---
+# Cada formato se separa en sus campos variables (campos_*) y en el diseño fijo
+# (_layout_*), que escribe cada campo con los helpers. Así el mismo diseño sirve
+# para python-docx y para compilar el esqueleto del writer OOXML directo.
+def campos_secundaria(datos, sesion):
+    # ... Data Preparation ...
+    datos_adicionales = sesion.get('datos_adicionales', {})
+    try:
+        tiempo_total = int(str(datos_adicionales.get('tiempo_total', '90')).split(' ')[0])
+    except (ValueError, IndexError):
+        tiempo_total = 90
+
+    inicio_min = round(tiempo_total * 0.2)
+    desarrollo_min = round(tiempo_total * 0.6)
+    cierre_min = round(tiempo_total * 0.2)
+
+    sd = sesion.get('secuencia_didactica', {})
+    return {
+        # Variables de tiempo para el doc
+        'ini_str': f"{inicio_min}'",
+        'des_str': f"{desarrollo_min}'",
+        'cie_str': f"{cierre_min}'",
+        # ... Datos Administrativos ...
+        'dre': datos.get('dre', 'San Martín'),
+        'ugel': datos.get('ugel', 'San Martín'),
+        'ie': datos.get('ie', 'N/A'),
+        'distrito': datos.get('distrito', 'Tarapoto'),
+        'seccion': datos.get('seccion', 'A, B, C, D'),
+        'ciclo': datos.get('ciclo', 'VI'), # Secundaria suele ser VI o VII
+        'director': datos.get('director', 'N/A'),
+        'docente': datos.get('docente', 'N/A'),
+        'fecha': datos.get('fecha', 'N/A'),
+        'duracion': datos.get('duracion', '90\''),
+        'tema': datos.get('tema', ''),
+        'area': datos.get('area', 'N/A'),
+        'grado': datos.get('grado', 'N/A'),
+        'competencia': datos.get('competencia', ''),
+        'capacidad': datos.get('capacidad', ''),
+        'desempeno': datos.get('desempeno', ''),
+        'criterios': format_criterios(sesion.get('criterios_evaluacion', [])),
+        'comp_transversal': datos.get('comp_transversal'),
+        'cap_transversal': datos.get('cap_transversal', ''),
+        'enfoque': datos.get('enfoque', ''),
+        'valor': datos.get('valor', ''),
+        'inicio': sd.get('inicio', ''),
+        'desarrollo': sd.get('desarrollo', ''),
+        'cierre': sd.get('cierre', ''),
+    }
+
+
+def fila_transversal_secundaria(campos):
+    comp_trans = campos['comp_transversal']
+    return bool(comp_trans and comp_trans not in ['N/A', ''])
+
+
+def generar_docx_secundaria(doc, datos, sesion):
+    campos = campos_secundaria(datos, sesion)
+    _layout_secundaria(doc, campos, fila_transversal_secundaria(campos))
+
+
+def _layout_secundaria(doc, c, fila_transversal):
+    # 1. TÍTULO PRINCIPAL
+    titulo_principal = doc.add_paragraph()
+    titulo_principal.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    run_titulo = titulo_principal.add_run('SESIÓN DE APRENDIZAJE\nINNOVACIÓN PEDAGÓGICA')
+    run_titulo.bold = True
+    run_titulo.font.size = Pt(14)
+    run_titulo.font.name = 'Arial'
+    doc.add_paragraph()
+
+    # 2. TÍTULO SESIÓN
+    tabla_titulo = doc.add_table(rows=1, cols=1)
+    tabla_titulo.style = 'Table Grid'
+    add_bold_centered_text(tabla_titulo.cell(0, 0), c['tema'], 11)
+    doc.add_paragraph()
+
+    # 3. DATOS INFORMATIVOS
+    p_datos = doc.add_paragraph()
+    p_datos.add_run('☰ ').bold = True
+    p_datos.add_run('DATOS INFORMATIVOS:').bold = True
+    
+    tabla_info = doc.add_table(rows=5, cols=8)
+    tabla_info.style = 'Table Grid'
+    
+    add_bold_text(tabla_info.cell(0, 0), 'DRE', 9, 'D9D9D9')
+    add_normal_text(tabla_info.cell(0, 1), c['dre'], 9)
+    add_bold_text(tabla_info.cell(0, 2), 'UGEL', 9, 'D9D9D9')
+    add_normal_text(tabla_info.cell(0, 3).merge(tabla_info.cell(0, 7)), c['ugel'], 9)
+    
+    add_bold_text(tabla_info.cell(1, 0), 'Institución Educativa', 9, 'D9D9D9')
+    add_normal_text(tabla_info.cell(1, 1).merge(tabla_info.cell(1, 3)), c['ie'], 9)
+    add_bold_text(tabla_info.cell(1, 4), 'Distrito', 9, 'D9D9D9')
+    add_normal_text(tabla_info.cell(1, 5).merge(tabla_info.cell(1, 7)), c['distrito'], 9)
+    
+    add_bold_text(tabla_info.cell(2, 0), 'Área curricular', 9, 'D9D9D9')
+    add_normal_text(tabla_info.cell(2, 1), c['area'], 9)
+    add_bold_text(tabla_info.cell(2, 2), 'Grado', 9, 'D9D9D9')
+    add_normal_text(tabla_info.cell(2, 3), c['grado'], 9)
+    add_bold_text(tabla_info.cell(2, 4), 'Sección', 9, 'D9D9D9')
+    add_normal_text(tabla_info.cell(2, 5), c['seccion'], 9)
+    add_bold_text(tabla_info.cell(2, 6), 'Duración', 9, 'D9D9D9')
+    add_normal_text(tabla_info.cell(2, 7), c['duracion'], 9)
+    
+    add_bold_text(tabla_info.cell(3, 0), 'Ciclo', 9, 'D9D9D9')
+    add_normal_text(tabla_info.cell(3, 1), c['ciclo'], 9)
+    add_bold_text(tabla_info.cell(3, 2), 'Fecha', 9, 'D9D9D9')
+    add_normal_text(tabla_info.cell(3, 3).merge(tabla_info.cell(3, 5)), c['fecha'], 9)
+    add_bold_text(tabla_info.cell(3, 6), 'Director(a)', 9, 'D9D9D9')
+    add_normal_text(tabla_info.cell(3, 7), c['director'], 9)
+    
+    add_bold_text(tabla_info.cell(4, 0), 'Docente', 9, 'D9D9D9')
+    add_normal_text(tabla_info.cell(4, 1).merge(tabla_info.cell(4, 7)), c['docente'], 9)
+    doc.add_paragraph()
+
+    # 4. PROPÓSITO
+    p_proposito = doc.add_paragraph()
+    p_proposito.add_run('☰ ').bold = True
+    p_proposito.add_run('PROPÓSITO DE APRENDIZAJE').bold = True
+    
+    tabla_proposito = doc.add_table(rows=2, cols=5)
+    tabla_proposito.style = 'Table Grid'
+    add_bold_centered_text(tabla_proposito.cell(0, 0), 'COMPETENCIA', 9, 'D9D9D9')
+    add_bold_centered_text(tabla_proposito.cell(0, 1), 'CAPACIDAD', 9, 'D9D9D9')
+    add_bold_centered_text(tabla_proposito.cell(0, 2), 'DESEMPEÑOS\nPRECISADOS', 9, 'D9D9D9')
+    add_bold_centered_text(tabla_proposito.cell(0, 3), 'CRITERIOS DE EVALUACIÓN', 9, 'D9D9D9')
+    add_bold_centered_text(tabla_proposito.cell(0, 4), 'INSTRUMENTO', 9, 'D9D9D9')
+    
+    row = tabla_proposito.rows[1].cells
+    add_normal_text(row[0], c['competencia'], 9, 'justify')
+    add_normal_text(row[1], c['capacidad'], 9, 'justify')
+    add_normal_text(row[2], c['desempeno'], 9, 'justify')
+    add_normal_text(row[3], c['criterios'], 9, 'justify')
+    add_normal_text(row[4], 'Lista de cotejo', 9, 'center')
+    
+    if fila_transversal:
+        row_t = tabla_proposito.add_row().cells
+        add_normal_text(row_t[0], c['comp_transversal'], 9, 'justify')
+        add_normal_text(row_t[1], c['cap_transversal'], 9, 'justify')
+        add_normal_text(row_t[2], 'Se desenvuelve...', 9, 'justify')
+        add_normal_text(row_t[3], 'Observación', 9, 'justify')
+        add_normal_text(row_t[4], 'Ficha', 9, 'center')
+    doc.add_paragraph()
+
+    # 5. ENFOQUES
+    p_enfoque = doc.add_paragraph()
+    p_enfoque.add_run('☰ ').bold = True
+    p_enfoque.add_run('ENFOQUES TRANSVERSALES').bold = True
+    tabla_enfoques = doc.add_table(rows=2, cols=4)
+    tabla_enfoques.style = 'Table Grid'
+    add_bold_centered_text(tabla_enfoques.cell(0, 0), 'ENFOQUE', 9, 'D9D9D9')
+    add_bold_centered_text(tabla_enfoques.cell(0, 1), 'VALORES', 9, 'D9D9D9')
+    add_bold_centered_text(tabla_enfoques.cell(0, 2), 'ACTITUDES', 9, 'D9D9D9')
+    add_bold_centered_text(tabla_enfoques.cell(0, 3), 'ACCIONES', 9, 'D9D9D9')
+    
+    add_normal_text(tabla_enfoques.cell(1, 0), c['enfoque'], 9, 'justify')
+    add_normal_text(tabla_enfoques.cell(1, 1), c['valor'], 9, 'justify')
+    add_normal_text(tabla_enfoques.cell(1, 2), 'Actitud de ejemplo.', 9, 'justify')
+    add_normal_text(tabla_enfoques.cell(1, 3), 'Acciones observables.', 9, 'justify')
+    doc.add_paragraph()
+
+    # 6. SECUENCIA
+    p_secuencia = doc.add_paragraph()
+    p_secuencia.add_run('☰ ').bold = True
+    p_secuencia.add_run('SECUENCIA DIDÁCTICA').bold = True
+    tabla_sec = doc.add_table(rows=4, cols=4)
+    tabla_sec.style = 'Table Grid'
+    add_bold_centered_text(tabla_sec.cell(0, 0), 'MOMENTOS', 10, 'D9D9D9')
+    add_bold_centered_text(tabla_sec.cell(0, 1), 'ACTIVIDADES', 10, 'D9D9D9')
+    add_bold_centered_text(tabla_sec.cell(0, 2), 'MATERIALES', 10, 'D9D9D9')
+    add_bold_centered_text(tabla_sec.cell(0, 3), 'TIEMPO', 10, 'D9D9D9')
+    
+    # Inicio
+    add_bold_text(tabla_sec.cell(1, 0), 'MOTIVACIÓN', 9)
+    add_normal_text(tabla_sec.cell(1, 1), c['inicio'], 9, 'justify')
+    add_normal_text(tabla_sec.cell(1, 2), 'Recursos clase', 9)
+    add_bold_centered_text(tabla_sec.cell(1, 3), c['ini_str'], 10)
+    # Desarrollo
+    add_bold_text(tabla_sec.cell(2, 0), 'DESARROLLO', 9)
+    add_normal_text(tabla_sec.cell(2, 1), c['desarrollo'], 9, 'justify')
+    add_normal_text(tabla_sec.cell(2, 2), 'Recursos clase', 9)
+    add_bold_centered_text(tabla_sec.cell(2, 3), c['des_str'], 10)
+    # Cierre
+    add_bold_text(tabla_sec.cell(3, 0), 'CIERRE', 9)
+    add_normal_text(tabla_sec.cell(3, 1), c['cierre'], 9, 'justify')
+    add_normal_text(tabla_sec.cell(3, 2), 'Recursos clase', 9)
+    add_bold_centered_text(tabla_sec.cell(3, 3), c['cie_str'], 10)
+    
+    doc.add_paragraph()
+    doc.add_paragraph('• Bibliografía referencial.')
+    
+    # Firmas
+    t_firmas = doc.add_table(rows=1, cols=2)
+    t_firmas.rows[0].cells[0].paragraphs[0].add_run('___________________\nV.B. Director').alignment = WD_ALIGN_PARAGRAPH.CENTER
+    t_firmas.rows[0].cells[1].paragraphs[0].add_run('___________________\nDocente').alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+
+def campos_primaria(datos, sesion):
+    # ... Data Preparation ...
+    comp_t = datos.get('comp_transversal', '')
+    cap_t = datos.get('cap_transversal', '')
+
+    recursos = sesion.get('recursos_virtuales', [])
+    if isinstance(recursos, list):
+        recursos_txt = "\n".join([f"• {r}" for r in recursos])
+    else:
+        recursos_txt = str(recursos)
+
+    sd = sesion.get('secuencia_didactica', {})
+    return {
+        # Datos Administrativos
+        'dre': datos.get('dre', 'San Martín'),
+        'ugel': datos.get('ugel', 'San Martín'),
+        'ie': datos.get('ie', ''),
+        'distrito': datos.get('distrito', ''),
+        'seccion': datos.get('seccion', ''),
+        'ciclo': datos.get('ciclo', 'III/IV/V'),
+        'director': datos.get('director', ''),
+        'docente': datos.get('docente', ''),
+        'fecha': datos.get('fecha', ''),
+        'duracion': datos.get('duracion', '90 min'),
+        'tema': datos.get('tema', 'TEMA DE SESIÓN'),
+        'area': datos.get('area', 'N/A'),
+        'grado': datos.get('grado', 'N/A'),
+        'competencia': datos.get('competencia', ''),
+        'capacidad': datos.get('capacidad', ''),
+        'desempeno': datos.get('desempeno', ''),
+        'criterios': format_criterios(sesion.get('criterios_evaluacion', [])),
+        'estandar': sesion.get('estandar_aprendizaje', 'No especificado en la sesión generada.'),
+        'enfoque': datos.get('enfoque', ''),
+        'valor': datos.get('valor', ''),
+        'comp_transversal': comp_t if comp_t else 'Se desenvuelve en entornos virtuales...',
+        'cap_transversal': cap_t if cap_t else 'Personaliza entornos...',
+        'inicio': sd.get('inicio', ''),
+        'desarrollo': sd.get('desarrollo', ''),
+        'cierre': sd.get('cierre', ''),
+        'recursos': recursos_txt if recursos_txt else "Bibliografía del MED.",
+    }
+
+
+def generar_docx_primaria(doc, datos, sesion):
+    _layout_primaria(doc, campos_primaria(datos, sesion))
+
+
+def _layout_primaria(doc, c):
+    # Colores
+    YELLOW_HEADER = 'FEF2CC' # Amarillo claro
+    GREEN_HEADER = 'E2EFDA' # Verde claro
+    GREEN_BRIGHT = '548235' # Verde fuerte para texto
+
+    # 1. Título General
+    doc.add_paragraph() 
+    titulo = doc.add_paragraph()
+    titulo.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    run = titulo.add_run('SESIÓN DE APRENDIZAJE')
+    run.bold = True
+    run.font.size = Pt(14)
+    run.font.name = 'Arial'
+    run.font.color.rgb = RGBColor(0, 0, 0)
+    doc.add_paragraph()
+
+    # 2. Título Sesión (Recuadro)
+    tbl_tit = doc.add_table(rows=1, cols=1)
+    tbl_tit.style = 'Table Grid'
+    add_bold_centered_text(tbl_tit.cell(0, 0), c['tema'], 12)
+    doc.add_paragraph()
+
+    p_inf = doc.add_paragraph()
+    p_inf.add_run('☰ ').bold = True
+    p_inf.add_run('DATOS INFORMATIVOS:').bold = True
+    # run_inf = p_inf.add_run('I. DATOS INFORMATIVOS:') # Old style
+
+    tabla_info = doc.add_table(rows=5, cols=8)
+    tabla_info.style = 'Table Grid'
+    
+    add_bold_text(tabla_info.cell(0, 0), 'DRE', 9, 'D9D9D9')
+    add_normal_text(tabla_info.cell(0, 1), c['dre'], 9)
+    add_bold_text(tabla_info.cell(0, 2), 'UGEL', 9, 'D9D9D9')
+    add_normal_text(tabla_info.cell(0, 3).merge(tabla_info.cell(0, 7)), c['ugel'], 9)
+    
+    add_bold_text(tabla_info.cell(1, 0), 'Institución Educativa', 9, 'D9D9D9')
+    add_normal_text(tabla_info.cell(1, 1).merge(tabla_info.cell(1, 3)), c['ie'], 9)
+    add_bold_text(tabla_info.cell(1, 4), 'Distrito', 9, 'D9D9D9')
+    add_normal_text(tabla_info.cell(1, 5).merge(tabla_info.cell(1, 7)), c['distrito'], 9)
+    
+    add_bold_text(tabla_info.cell(2, 0), 'Área curricular', 9, 'D9D9D9')
+    add_normal_text(tabla_info.cell(2, 1), c['area'], 9)
+    add_bold_text(tabla_info.cell(2, 2), 'Grado', 9, 'D9D9D9')
+    add_normal_text(tabla_info.cell(2, 3), c['grado'], 9)
+    add_bold_text(tabla_info.cell(2, 4), 'Sección', 9, 'D9D9D9')
+    add_normal_text(tabla_info.cell(2, 5), c['seccion'], 9)
+    add_bold_text(tabla_info.cell(2, 6), 'Duración', 9, 'D9D9D9')
+    add_normal_text(tabla_info.cell(2, 7), c['duracion'], 9)
+    
+    add_bold_text(tabla_info.cell(3, 0), 'Ciclo', 9, 'D9D9D9')
+    add_normal_text(tabla_info.cell(3, 1), c['ciclo'], 9)
+    add_bold_text(tabla_info.cell(3, 2), 'Fecha', 9, 'D9D9D9')
+    add_normal_text(tabla_info.cell(3, 3).merge(tabla_info.cell(3, 5)), c['fecha'], 9)
+    add_bold_text(tabla_info.cell(3, 6), 'Director(a)', 9, 'D9D9D9')
+    add_normal_text(tabla_info.cell(3, 7), c['director'], 9)
+    
+    add_bold_text(tabla_info.cell(4, 0), 'Docente', 9, 'D9D9D9')
+    add_normal_text(tabla_info.cell(4, 1).merge(tabla_info.cell(4, 7)), c['docente'], 9)
+    
+    doc.add_paragraph()
+
+    # 4. PROPÓSITOS DE APRENDIZAJE (Estilo Primaria - Amarillo)
+    p_prop = doc.add_paragraph()
+    run_prop = p_prop.add_run('II. PROPÓSITOS DE APRENDIZAJE Y EVIDENCIAS DE APRENDIZAJE:')
+    run_prop.bold = True
+    run_prop.font.color.rgb = RGBColor(255, 0, 0) # Rojo
+
+    t_prop = doc.add_table(rows=2, cols=4)
+    t_prop.style = 'Table Grid'
+    # Encabezados Amarillos
+    add_bold_centered_text(t_prop.cell(0, 0), 'Competencias', 10, YELLOW_HEADER)
+    add_bold_centered_text(t_prop.cell(0, 1), 'Capacidades', 10, YELLOW_HEADER)
+    add_bold_centered_text(t_prop.cell(0, 2), 'Desempeños', 10, YELLOW_HEADER)
+    add_bold_centered_text(t_prop.cell(0, 3), 'Criterios de\nevaluación', 10, YELLOW_HEADER)
+
+    # Contenido
+    row_p = t_prop.rows[1].cells
+    add_normal_text(row_p[0], c['competencia'], 9)
+    add_normal_text(row_p[1], c['capacidad'], 9)
+    add_normal_text(row_p[2], c['desempeno'], 9)
+    add_normal_text(row_p[3], c['criterios'], 9)
+
+    # TABLA ESTÁNDAR (Amarilla)
+    doc.add_paragraph()
+    t_stand = doc.add_table(rows=2, cols=2) # 2 filas: Header y Contenido
+    t_stand.style = 'Table Grid'
+    
+    # Header Merged
+    cell_header = t_stand.cell(0, 0)
+    cell_header.merge(t_stand.cell(0, 1))
+    add_bold_text(cell_header, 'ESTÁNDAR DE APRENDIZAJE POR COMPETENCIAS Y GRADOS', 10, YELLOW_HEADER)
+    
+    # Contenido (Estándar real)
+    cell_cont = t_stand.cell(1, 0)
+    cell_cont.merge(t_stand.cell(1, 1))
+    
+    add_normal_text(cell_cont, c['estandar'], 9, 'justify')
+    
+    # Tabla Enfoques (Verde)
+    doc.add_paragraph()
+    t_enf = doc.add_table(rows=5, cols=3)
+    t_enf.style = 'Table Grid'
+    # Header color background check image: shows bright Green headers.
+    # Lets try to match the image: Green header for "ENFOQUES TRANSVERSALES", "VALORES", "EJEMPLOS"
+    add_bold_text(t_enf.cell(0, 0), 'ENFOQUES TRANSVERSALES', 9, '548235')
+    add_bold_text(t_enf.cell(0, 1), 'VALORES', 9, '548235')
+    add_bold_text(t_enf.cell(0, 2), 'EJEMPLOS', 9, '548235')
+    # Shading header cells green
+    shade_cell(t_enf.cell(0, 0), '70AD47')
+    shade_cell(t_enf.cell(0, 1), '70AD47')
+    shade_cell(t_enf.cell(0, 2), '70AD47')
+    
+    # Contenido Enfoques
+    add_normal_text(t_enf.cell(1, 0), c['enfoque'], 9)
+    add_normal_text(t_enf.cell(1, 1), c['valor'], 9)
+    add_normal_text(t_enf.cell(1, 2), 'Ejemplo observable...', 9)
+
+    # Competencias Transversales (Yellow Headers separate)
+    doc.add_paragraph()
+    
+    # Comp Transversal 1
+    t_ct1 = doc.add_table(rows=2, cols=2)
+    t_ct1.style = 'Table Grid'
+    add_bold_centered_text(t_ct1.cell(0, 0), 'Competencia transversal', 9, YELLOW_HEADER)
+    add_bold_centered_text(t_ct1.cell(0, 1), 'Capacidades Transversales', 9, YELLOW_HEADER)
+    add_normal_text(t_ct1.cell(1, 0), c['comp_transversal'], 9)
+    add_normal_text(t_ct1.cell(1, 1), c['cap_transversal'], 9)
+
+    doc.add_paragraph()
+    
+    # Comp Transversal 2 (Gestiona su aprendizaje - Default en primaria muchas veces)
+    t_ct2 = doc.add_table(rows=2, cols=2)
+    t_ct2.style = 'Table Grid'
+    add_bold_centered_text(t_ct2.cell(0, 0), 'Competencia transversal', 9, YELLOW_HEADER)
+    add_bold_centered_text(t_ct2.cell(0, 1), 'Capacidades Transversales', 9, YELLOW_HEADER)
+    add_normal_text(t_ct2.cell(1, 0), 'Gestiona su aprendizaje de manera autónoma', 9)
+    add_normal_text(t_ct2.cell(1, 1), 'Define metas de aprendizaje', 9)
+
+
+    # III. PREPARACIÓN DE LA SESIÓN
+    doc.add_paragraph()
+    p_prep = doc.add_paragraph()
+    run_prep = p_prep.add_run('III. PREPARACIÓN DE LA SESIÓN')
+    run_prep.bold = True
+    run_prep.font.color.rgb = RGBColor(255, 0, 0)
+
+    t_prep = doc.add_table(rows=2, cols=2)
+    t_prep.style = 'Table Grid'
+    add_bold_centered_text(t_prep.cell(0, 0), '¿Qué se debe hacer antes de la sesión?', 10, YELLOW_HEADER)
+    add_bold_centered_text(t_prep.cell(0, 1), '¿Qué recursos o materiales utilizarán en la sesión?', 10, YELLOW_HEADER)
+    add_normal_text(t_prep.cell(1, 0), 'Preparar fichas, revisar materiales.', 10)
+    add_normal_text(t_prep.cell(1, 1), 'Plumones, papelógrafos, fichas.', 10)
+
+    # IV. MOMENTOS
+    doc.add_paragraph()
+    p_mom = doc.add_paragraph()
+    run_mom = p_mom.add_run('IV. MOMENTOS DE LA SESIÓN')
+    run_mom.bold = True
+    run_mom.font.color.rgb = RGBColor(255, 0, 0)
+    
+    # Función helper para momento CON CUADRO NEGRO (Table Grid)
+    def add_moment_table(moment_name, time_val, content):
+        # Tabla 2 filas: 
+        # Fila 1: Título (Verde) | Tiempo (Verde)
+        # Fila 2: Contenido (Blanco, con bordes negros)
+        
+        t = doc.add_table(rows=2, cols=2)
+        t.style = 'Table Grid' 
+        
+        # HEADER (Verde)
+        # Celda 1: Nombre
+        c_name = t.cell(0, 0)
+        shade_cell(c_name, 'E2EFDA') # Verde claro header
+        p1 = c_name.paragraphs[0]
+        run1 = p1.add_run(moment_name)
+        run1.bold = True
+        run1.font.size = Pt(10)
+
+        # Celda 2: Tiempo
+        c_time = t.cell(0, 1)
+        shade_cell(c_time, 'E2EFDA') # Verde claro header
+        p2 = c_time.paragraphs[0]
+        p2.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+        run2 = p2.add_run(f"Tiempo aproximado: {time_val} min")
+        run2.font.size = Pt(9)
+        
+        # CONTENIDO (Merged)
+        c_content = t.cell(1, 0)
+        c_content.merge(t.cell(1, 1))
+        add_normal_text(c_content, content, 10, 'justify')
+
+        doc.add_paragraph() # Espacio entre tablas
+
+    add_moment_table('INICIO', '15', c['inicio'])
+    add_moment_table('DESARROLLO', '60', c['desarrollo'])
+    add_moment_table('CIERRE', '15', c['cierre'])
+
+    # V. RECURSOS / BIBLIOGRAFÍA
+    p_rec = doc.add_paragraph()
+    run_rec = p_rec.add_run('V. RECURSOS Y BIBLIOGRAFÍA')
+    run_rec.bold = True
+    run_rec.font.color.rgb = RGBColor(255, 0, 0) # Rojo
+    
+    t_rec = doc.add_table(rows=1, cols=1)
+    t_rec.style = 'Table Grid'
+    c_rec = t_rec.cell(0,0)
+    add_normal_text(c_rec, c['recursos'], 9)
+
+    # Footer / Docente Ref
+
+    # Footer / Docente Ref
+    doc.add_paragraph()
+    t_foo = doc.add_table(rows=1, cols=1)
+    t_foo.align = WD_ALIGN_PARAGRAPH.CENTER
+    p_foo = t_foo.cell(0,0).paragraphs[0]
+    p_foo.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    p_foo.add_run('__________________________\nDOCENTE')
+
+
+def nuevo_documento():
+    doc = Document()
+    # Margenes
+    sections = doc.sections
+    for section in sections:
+        section.top_margin = Inches(0.5)
+        section.bottom_margin = Inches(0.5)
+        section.left_margin = Inches(0.7)
+        section.right_margin = Inches(0.7)
+    return doc
+
+
+def guardar_documento(doc):
+    file_stream = BytesIO()
+    doc.save(file_stream)
+    return file_stream.getvalue()
+
+
+def render_docx_python_docx(datos, sesion):
+    """
+    Arma el documento con el modelo de objetos de python-docx (camino de respaldo).
+    """
+    doc = nuevo_documento()
+
+    nivel = datos.get('nivel', 'Secundaria')
+
+    # Lógica de selección
+    if nivel == 'Primaria':
+        generar_docx_primaria(doc, datos, sesion)
+    else:
+        generar_docx_secundaria(doc, datos, sesion)
+
+    # Guardar
+    return guardar_documento(doc)
+
+
+def _compilar(layout, *args):
+    # Se ejecuta el diseño una sola vez con marcadores en lugar de los campos
+    doc = nuevo_documento()
+    layout(doc, SlotRecorder(), *args)
+    return CompiledDocx(guardar_documento(doc))
+
+
+# (formato, fila transversal) -> esqueleto compilado, creado la primera vez que se usa
+_compilados = {}
+_compilados_lock = threading.Lock()
+
+
+def _compilado(clave):
+    compilado = _compilados.get(clave)
+    if compilado is None:
+        with _compilados_lock:
+            compilado = _compilados.get(clave)
+            if compilado is None:
+                if clave[0] == 'Primaria':
+                    compilado = _compilar(_layout_primaria)
+                else:
+                    compilado = _compilar(_layout_secundaria, clave[1])
+                _compilados[clave] = compilado
+    return compilado
+
+
+def render_docx_ooxml(datos, sesion):
+    """
+    Rellena el esqueleto de document.xml del formato y escribe el ZIP directamente,
+    sin construir el documento con python-docx en cada descarga.
+    """
+    if datos.get('nivel', 'Secundaria') == 'Primaria':
+        return _compilado(('Primaria', False)).render(campos_primaria(datos, sesion))
+    campos = campos_secundaria(datos, sesion)
+    return _compilado(('Secundaria', fila_transversal_secundaria(campos))).render(campos)
+
+
+def render_docx(datos, sesion):
+    """
+    Arma el documento Word de la sesión (formato Primaria o Secundaria) y devuelve sus bytes.
+    Usa el writer OOXML directo; si falla (o DOCX_WRITER=python-docx), vuelve a python-docx.
+    """
+    if DOCX_WRITER == 'ooxml':
+        try:
+            with stage('docx_render'):
+                return render_docx_ooxml(datos, sesion)
+        except Exception as e:
+            print(f"ALERTA: Falló el writer OOXML ({e}); usando python-docx")
+            record_fallback('docx_python_docx')
+    with stage('docx_render_python_docx'):
+        return render_docx_python_docx(datos, sesion)
+
+
+def docx_filename(datos):
+    nivel = datos.get('nivel', 'Secundaria')
+    return f"Sesion_{nivel}_{datos.get('grado','').replace(' ','_')}.docx"
@@ -0,0 +1,182 @@
+"""
+Catálogo curricular de EPT (competencias, capacidades y desempeños) por
+(especialidad, nivel, grado), guardado en SQLite dentro de CACHE_DIR.
+
+/generate_ept_structure responde desde aquí y solo llama a la IA para
+especialidades que todavía no están (o si se pide refresh); las respuestas
+válidas de la IA se agregan al catálogo. Para llenarlo de antemano:
+
+    python ept_catalog.py --warm                                  # especialidades frecuentes, 1° a 5°
+    python ept_catalog.py --warm --especialidad Cocina --refresh  # regenera una especialidad
+    python ept_catalog.py --list
+"""
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from response_cache import data_path, make_key
+
+
+EPT_CATALOG_FILE = 'ept_catalog.sqlite3'
+
+# Especialidades más pedidas (se pueden agregar otras con --especialidad)
+ESPECIALIDADES_EPT = [
+    'Carpintería', 'Ebanistería', 'Computación', 'Industria del Vestido', 'Industria Alimentaria',
+    'Cocina', 'Electricidad', 'Electrónica', 'Mecánica Automotriz', 'Construcciones Metálicas',
+    'Cosmetología', 'Agropecuaria',
+]
+GRADOS_EPT = ['1°', '2°', '3°', '4°', '5°']
+
+
+def catalog_key(especialidad, nivel, grado):
+    return make_key(especialidad, nivel, grado)
+
+
+def estructura_valida(data):
+    """
+    True si la estructura tiene al menos una competencia completa (se guarda en el catálogo).
+    """
+    competencias = data.get('competencias') if isinstance(data, dict) else None
+    if not isinstance(competencias, list) or not competencias:
+        return False
+    for comp in competencias:
+        if not isinstance(comp, dict) or not isinstance(comp.get('nombre'), str) or not comp['nombre'].strip():
+            return False
+        for campo in ('capacidades', 'desempenos'):
+            valores = comp.get(campo)
+            if not isinstance(valores, list) or not valores or not all(isinstance(v, str) for v in valores):
+                return False
+    return True
+
+
+class EptCatalog:
+    """
+    Estructuras EPT por make_key(especialidad, nivel, grado). Sin TTL: una
+    entrada solo se reemplaza con refresh (desde el endpoint o con --refresh).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS ept_catalog ('
+            'key TEXT PRIMARY KEY, especialidad TEXT NOT NULL, nivel TEXT NOT NULL, grado TEXT NOT NULL, '
+            'estructura TEXT NOT NULL, origen TEXT NOT NULL, updated REAL NOT NULL)'
+        )
+        self._conn.commit()
+
+    def get(self, especialidad, nivel, grado):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT estructura FROM ept_catalog WHERE key = ?', (catalog_key(especialidad, nivel, grado),)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, especialidad, nivel, grado, estructura, origen='ia'):
+        """
+        Guarda la estructura si es válida. Devuelve True si quedó en el catálogo.
+        """
+        if not estructura_valida(estructura):
+            return False
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO ept_catalog (key, especialidad, nivel, grado, estructura, origen, updated) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (catalog_key(especialidad, nivel, grado), especialidad, nivel, grado,
+                 json.dumps(estructura, ensure_ascii=False), origen, time.time())
+            )
+            self._conn.commit()
+            self.stored += 1
+        return True
+
+    def entries(self):
+        with self._lock:
+            return self._conn.execute(
+                'SELECT especialidad, nivel, grado, origen, updated FROM ept_catalog ORDER BY especialidad, nivel, grado'
+            ).fetchall()
+
+    def stats(self):
+        with self._lock:
+            size = self._conn.execute('SELECT COUNT(*) FROM ept_catalog').fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            'entries': size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+            'stored': self.stored,
+        }
+
+
+def open_catalog(filename=EPT_CATALOG_FILE):
+    return EptCatalog(data_path(filename))
+
+
+def warm(catalog, generar, especialidades, nivel='Secundaria', grados=GRADOS_EPT, refresh=False, workers=3):
+    """
+    Llena el catálogo llamando a generar(especialidad, nivel, grado) para lo que
+    falta (o para todo, con refresh). Devuelve (generadas, omitidas, fallidas).
+    """
+    pendientes = [(esp, nivel, grado) for esp in especialidades for grado in grados
+                  if refresh or catalog.get(esp, nivel, grado) is None]
+    omitidas = len(especialidades) * len(grados) - len(pendientes)
+    generadas = fallidas = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(generar, *item): item for item in pendientes}
+        for future in as_completed(futures):
+            esp, _, grado = futures[future]
+            try:
+                ok = catalog.put(esp, nivel, grado, future.result(), origen='warmup')
+            except Exception as e:
+                print(f"  {esp} {grado}: ERROR {e}")
+                ok = False
+            if ok:
+                generadas += 1
+                print(f"  {esp} {grado}: ok")
+            else:
+                fallidas += 1
+    return generadas, omitidas, fallidas
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Catálogo curricular de EPT por especialidad y grado.')
+    parser.add_argument('--warm', action='store_true', help='Genera con la IA las entradas que faltan')
+    parser.add_argument('--refresh', action='store_true', help='Regenera también las entradas existentes')
+    parser.add_argument('--especialidad', action='append', help='Especialidad a generar (repetible); por defecto las frecuentes')
+    parser.add_argument('--nivel', default='Secundaria')
+    parser.add_argument('--grado', action='append', help='Grado a generar (repetible); por defecto 1° a 5°')
+    parser.add_argument('--list', action='store_true', help='Muestra lo que hay en el catálogo')
+    args = parser.parse_args()
+
+    if args.warm:
+        # Misma configuración de IA que la app (gateway, rutas, salida estructurada)
+        from app import ept_catalog, generar_estructura_ept
+        especialidades = args.especialidad or ESPECIALIDADES_EPT
+        generadas, omitidas, fallidas = warm(ept_catalog, generar_estructura_ept, especialidades,
+                                             args.nivel, args.grado or GRADOS_EPT, args.refresh)
+        print(f"Catálogo EPT: {generadas} generadas, {omitidas} ya estaban, {fallidas} fallidas -> {ept_catalog.path}")
+        catalog = ept_catalog
+    else:
+        catalog = open_catalog()
+
+    if args.list:
+        for especialidad, nivel, grado, origen, updated in catalog.entries():
+            print(f"{especialidad} | {nivel} | {grado} | {origen} | {time.strftime('%Y-%m-%d', time.localtime(updated))}")
+    if not args.warm and not args.list:
+        print(json.dumps(catalog.stats(), ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
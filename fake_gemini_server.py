@@ -0,0 +1,122 @@
+"""
+Servidor local que imita la API REST de Gemini (generateContent y
+streamGenerateContent?alt=sse) para pruebas de carga sin gastar cuota.
+
+Uso:
+    python fake_gemini_server.py --port 8089 --latency-ms 800 --latency-sigma 0.5 --rate-429 0.05
+    LLM_BACKEND=fake_server FAKE_GEMINI_URL=http://127.0.0.1:8089 python app.py
+"""
+import argparse
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from google.genai import errors
+
+from fake_genai import FakeScenario, error_body, fake_usage, simulated_text
+
+
+def _candidate(text, finish=True, usage=None):
+    candidate = {'content': {'parts': [{'text': text}], 'role': 'model'}, 'index': 0}
+    body = {'candidates': [candidate], 'modelVersion': 'fake'}
+    if finish:
+        candidate['finishReason'] = 'STOP'
+    if usage is not None:
+        body['usageMetadata'] = {
+            'promptTokenCount': usage.prompt_token_count,
+            'candidatesTokenCount': usage.candidates_token_count,
+            'totalTokenCount': usage.prompt_token_count + usage.candidates_token_count,
+        }
+    return body
+
+
+def _prompt_of(body):
+    partes = []
+    for content in body.get('contents', []):
+        for part in content.get('parts', []):
+            partes.append(part.get('text', ''))
+    return '\n'.join(partes)
+
+
+def make_handler(scenario, chunk_size=40):
+    class FakeGeminiHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, payload):
+            data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'{}')
+            schema = (body.get('generationConfig') or {}).get('responseJsonSchema')
+
+            if ':generateContent' not in self.path and ':streamGenerateContent' not in self.path:
+                self._send_json(404, {'error': {'code': 404, 'message': 'Not found', 'status': 'NOT_FOUND'}})
+                return
+
+            time.sleep(scenario.latency())
+            prompt = _prompt_of(body)
+            try:
+                text = simulated_text(scenario, prompt, schema)
+            except errors.APIError as e:
+                self._send_json(e.code, error_body(e.code))
+                return
+            usage = fake_usage(prompt, text)
+
+            if ':generateContent' in self.path:
+                self._send_json(200, _candidate(text, usage=usage))
+                return
+
+            # Streaming SSE: un evento por fragmento, el último con finishReason
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            pieces = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)] or ['']
+            for i, piece in enumerate(pieces):
+                last = i == len(pieces) - 1
+                event = json.dumps(_candidate(piece, finish=last, usage=usage if last else None), ensure_ascii=False)
+                self.wfile.write(f"data: {event}\r\n\r\n".encode('utf-8'))
+                self.wfile.flush()
+            self.close_connection = True
+
+    return FakeGeminiHandler
+
+
+def serve(host='127.0.0.1', port=8089, scenario=None):
+    server = ThreadingHTTPServer((host, port), make_handler(scenario or FakeScenario()))
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency-ms', type=float, default=800, help='Mediana de la latencia simulada')
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help='Dispersión log-normal (0 = latencia fija)')
+    parser.add_argument('--rate-429', type=float, default=0.0)
+    parser.add_argument('--rate-503', type=float, default=0.0)
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help='Fracción de respuestas con JSON truncado')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    scenario = FakeScenario(args.latency_ms, args.latency_sigma, args.rate_429, args.rate_503, args.malformed_rate, args.seed)
+    server = serve(args.host, args.port, scenario)
+    print(f"Fake Gemini escuchando en http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
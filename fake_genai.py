@@ -0,0 +1,281 @@
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+from google.genai import errors
+
+
+# Respuestas enlatadas con la forma que esperan los endpoints
+CANNED_SESION = {
+    "titulo_sesion": "Sesión de prueba",
+    "proposito": "Que los estudiantes resuelvan problemas aplicando lo aprendido en clase.",
+    "evidencia": "Resolución de una ficha de problemas en parejas.",
+    "estandar_aprendizaje": "Resuelve problemas referidos a una o más acciones de agregar, quitar, igualar o comparar cantidades.",
+    "datos_adicionales": {
+        "competencia_transversal": "Gestiona su aprendizaje de manera autónoma",
+        "capacidad_transversal": "Define metas de aprendizaje",
+        "enfoque_transversal": "Enfoque de orientación al bien común",
+        "valor_asociado": "Solidaridad",
+        "tiempo_total": "90 minutos"
+    },
+    "criterios_evaluacion": [
+        "Representa el problema con material concreto.",
+        "Explica el procedimiento que siguió para resolverlo."
+    ],
+    "secuencia_didactica": {
+        "inicio": "El docente saluda, recoge saberes previos con preguntas y comunica el propósito.",
+        "desarrollo": "Los estudiantes trabajan en equipos, resuelven situaciones y socializan sus estrategias.",
+        "cierre": "Metacognición: ¿qué aprendimos?, ¿cómo lo aprendimos?, ¿para qué nos sirve?"
+    }
+}
+
+CANNED_EPT = {
+    "competencias": [
+        {
+            "nombre": "Gestiona proyectos de emprendimiento económico o social",
+            "capacidades": [
+                "Crea propuestas de valor",
+                "Aplica habilidades técnicas",
+                "Trabaja cooperativamente para lograr objetivos y metas",
+                "Evalúa los resultados del proyecto de emprendimiento"
+            ],
+            "desempenos": [
+                "Selecciona una necesidad o problema de su entorno.",
+                "Formula una propuesta de valor innovadora.",
+                "Emplea herramientas y técnicas de la especialidad con seguridad.",
+                "Evalúa los procesos y resultados parciales de su proyecto."
+            ]
+        }
+    ]
+}
+
+CANNED_SUGERENCIAS = [
+    "Sugerencia de prueba 1",
+    "Sugerencia de prueba 2",
+    "Sugerencia de prueba 3",
+    "Sugerencia de prueba 4"
+]
+
+_SUGERENCIAS_RE = re.compile(r'"(\w+)_sugerencias"')
+
+
+def example_from_schema(schema, key='valor'):
+    """
+    Construye un objeto de ejemplo que cumple el esquema (para respuestas falsas).
+    """
+    tipo = schema.get('type')
+    if tipo == 'object':
+        return {k: example_from_schema(sub, k) for k, sub in schema.get('properties', {}).items()}
+    if tipo == 'array':
+        return [example_from_schema(schema.get('items', {'type': 'string'}), f"{key} {i + 1}") for i in range(3)]
+    if tipo in ('number', 'integer'):
+        return 1
+    if tipo == 'boolean':
+        return True
+    return f"Texto de ejemplo para {key}"
+
+
+def canned_payload(prompt, schema=None):
+    """
+    Elige la respuesta enlatada según el prompt (sesión, sugerencias o estructura EPT).
+    """
+    if 'SALIDA OBLIGATORIA' in prompt:
+        return CANNED_SESION
+    campos = _SUGERENCIAS_RE.findall(prompt)
+    if campos:
+        return {f"{campo}_sugerencias": CANNED_SUGERENCIAS for campo in campos}
+    if '"competencias"' in prompt:
+        return CANNED_EPT
+    if schema is not None:
+        return example_from_schema(schema)
+    return {'respuesta': 'Texto de ejemplo'}
+
+
+def _env_float(name, default=0.0):
+    return float(os.environ.get(name, default))
+
+
+class FakeScenario:
+    """
+    Comportamiento simulado del modelo: latencia log-normal (mediana latency_ms,
+    dispersión latency_sigma), fracción de errores 429/503 y de respuestas con
+    JSON malformado (truncado).
+    """
+
+    def __init__(self, latency_ms=0.0, latency_sigma=0.0, rate_429=0.0, rate_503=0.0, malformed_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.rate_429 = rate_429
+        self.rate_503 = rate_503
+        self.malformed_rate = malformed_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            latency_ms=_env_float('FAKE_LLM_LATENCY_MS'),
+            latency_sigma=_env_float('FAKE_LLM_LATENCY_SIGMA'),
+            rate_429=_env_float('FAKE_LLM_RATE_429'),
+            rate_503=_env_float('FAKE_LLM_RATE_503'),
+            malformed_rate=_env_float('FAKE_LLM_MALFORMED_RATE'),
+        )
+
+    def latency(self):
+        """
+        Segundos de espera para una llamada.
+        """
+        if self.latency_ms <= 0:
+            return 0.0
+        with self._lock:
+            factor = self._random.lognormvariate(0, self.latency_sigma) if self.latency_sigma else 1.0
+        return self.latency_ms * factor / 1000
+
+    def outcome(self):
+        """
+        'ok', '429', '503' o 'malformed' según las tasas configuradas.
+        """
+        with self._lock:
+            r = self._random.random()
+        if r < self.rate_429:
+            return '429'
+        r -= self.rate_429
+        if r < self.rate_503:
+            return '503'
+        r -= self.rate_503
+        if r < self.malformed_rate:
+            return 'malformed'
+        return 'ok'
+
+
+def malform(text):
+    # Simula una respuesta cortada a mitad de camino (el caso más común en producción)
+    return text[:max(1, int(len(text) * 0.6))]
+
+
+def error_body(code):
+    status = 'RESOURCE_EXHAUSTED' if code == 429 else 'UNAVAILABLE'
+    message = 'Resource has been exhausted (e.g. check quota).' if code == 429 else 'The model is overloaded. Please try again later.'
+    return {'error': {'code': code, 'message': message, 'status': status}}
+
+
+def simulated_text(scenario, prompt, schema=None):
+    """
+    Texto de respuesta (o excepción 429/503 del SDK) según el escenario.
+    """
+    outcome = scenario.outcome()
+    if outcome == '429':
+        raise errors.ClientError(429, error_body(429))
+    if outcome == '503':
+        raise errors.ServerError(503, error_body(503))
+    text = json.dumps(canned_payload(prompt, schema), ensure_ascii=False)
+    return malform(text) if outcome == 'malformed' else text
+
+
+def _schema_of(config):
+    if config is None:
+        return None
+    return getattr(config, 'response_json_schema', None) or getattr(config, 'response_schema', None)
+
+
+def fake_usage(prompt, text):
+    # Aproximación de ~4 caracteres por token, suficiente para probar las métricas
+    return SimpleNamespace(prompt_token_count=len(prompt) // 4 + 1, candidates_token_count=len(text) // 4 + 1)
+
+
+class FakeResponse:
+    """
+    Imita lo que usa la app de types.GenerateContentResponse: .text, .parsed y .usage_metadata.
+    """
+
+    def __init__(self, text, parsed=None, usage_metadata=None):
+        self.text = text
+        self.parsed = parsed
+        self.usage_metadata = usage_metadata
+
+
+class FakeModels:
+    """
+    Superficie síncrona (client.models). `handler(model, prompt, config)` puede
+    devolver un str (texto crudo), un dict/list (se serializa) o lanzar una
+    excepción; sin handler responde según el escenario (payloads enlatados).
+    """
+
+    def __init__(self, handler=None, latency=0.0, scenario=None):
+        self.handler = handler
+        self.latency = latency
+        self.scenario = scenario or FakeScenario(latency_ms=latency * 1000)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _respond(self, model, contents, config):
+        with self._lock:
+            self.calls.append({'model': model, 'prompt': contents, 'config': config})
+        schema = _schema_of(config)
+        if self.handler is not None:
+            result = self.handler(model, contents, config)
+            text = result if isinstance(result, str) else json.dumps(result, ensure_ascii=False)
+        else:
+            text = simulated_text(self.scenario, contents, schema)
+
+        parsed = None
+        if schema is not None:
+            # Igual que el SDK: solo hay .parsed si el texto es JSON válido
+            try:
+                parsed = json.loads(text)
+            except json.JSONDecodeError:
+                pass
+        return FakeResponse(text, parsed, fake_usage(contents, text))
+
+    def generate_content(self, model, contents, config=None):
+        time.sleep(self.scenario.latency())
+        return self._respond(model, contents, config)
+
+
+class FakeAioModels:
+    """
+    Superficie async (client.aio.models), con streaming en fragmentos de chunk_size caracteres.
+    """
+
+    def __init__(self, models, chunk_size=40):
+        self._models = models
+        self.chunk_size = chunk_size
+
+    async def generate_content(self, model, contents, config=None):
+        await asyncio.sleep(self._models.scenario.latency())
+        return self._models._respond(model, contents, config)
+
+    async def generate_content_stream(self, model, contents, config=None):
+        response = await self.generate_content(model, contents, config)
+        size = self.chunk_size
+
+        async def _chunks():
+            for i in range(0, len(response.text), size):
+                last = i + size >= len(response.text)
+                yield FakeResponse(response.text[i:i + size], usage_metadata=response.usage_metadata if last else None)
+        return _chunks()
+
+
+class _Aio:
+    def __init__(self, models, chunk_size):
+        self.models = FakeAioModels(models, chunk_size)
+
+
+class FakeClient:
+    """
+    Reemplazo de google.genai.Client para pruebas sin red ni API key:
+
+        client = FakeClient(scenario=FakeScenario(latency_ms=800, rate_429=0.05))
+        llm_gateway.client = client
+        ...
+        len(client.models.calls)
+    """
+
+    def __init__(self, handler=None, latency=0.0, chunk_size=40, scenario=None):
+        self.models = FakeModels(handler, latency, scenario)
+        self.aio = _Aio(self.models, chunk_size)
@@ -0,0 +1,199 @@
+"""
+Corpus de respaldo para /suggest cuando la IA no está disponible.
+
+Se construye offline a partir del currículo (minedu_data.js) y de las respuestas
+exitosas que ya quedaron en la caché de sugerencias, y se guarda como JSON
+compacto. La app lo carga una vez al iniciar y responde con búsquedas O(1):
+
+    python fallback_corpus.py --suggest-cache instance/suggest_cache.sqlite3
+"""
+import argparse
+import json
+import os
+from collections import Counter
+
+from curriculo import load_curriculo
+from response_cache import ResponseCache, make_key, normalize_text
+from retrieval import CAMPO_TIPOS
+
+
+FALLBACK_CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fallback_corpus.json')
+PER_KEY = 4
+
+# Grados tal como los ofrece el formulario (getGradeOptions en home.html)
+GRADOS_POR_NIVEL = {
+    'Inicial': ['0-2 años', '3-5 años'],
+    'Primaria': ['1°', '2°', '3°', '4°', '5°', '6°'],
+    'Secundaria': ['1°', '2°', '3°', '4°', '5°'],
+}
+
+# Respaldo genérico por nivel (el que antes vivía dentro de /suggest)
+DEFAULT_SUGGESTIONS = {
+    "Inicial": {
+        "desempeno": ["Participa en conversaciones espontáneas.", "Explora materiales con sus sentidos.", "Reconoce partes de su cuerpo.", "Expresa sus emociones verbal y no verbalmente."]
+    },
+    "Primaria": {
+        "desempeno": ["Recupera información explícita de textos orales.", "Explica el tema y el propósito comunicativo.", "Deduce características implícitas de personas y personajes.", "Adecúa el texto a la situación comunicativa."]
+    },
+    "Secundaria": {
+        "desempeno": ["Identifica información explícita, relevante y complementaria.", "Infiere e interpreta información del texto escrito.", "Justifica su posición sobre textos leídos.", "Evalúa el uso del lenguaje y la intención del autor."]
+    }
+}
+
+GENERIC_SUGGESTIONS = ["Opción sugerida estándar 1 (IA ocupada)", "Opción sugerida estándar 2 (IA ocupada)"]
+
+
+def campo_tipo(campo):
+    """
+    Tipo de sugerencia para un campo del formulario ("Desempeño" -> "desempeno").
+    Los campos que no son del currículo se usan tal cual (normalizados).
+    """
+    campo = normalize_text(campo).replace('_', ' ')
+    return CAMPO_TIPOS.get(campo, campo)
+
+
+def corpus_key(nivel, area, grado, tipo):
+    return make_key(nivel, area, grado, tipo)
+
+
+def _add(entries, key, textos):
+    # Completa la lista de una clave sin repetir textos, hasta PER_KEY
+    lista = entries.setdefault(key, [])
+    vistos = {normalize_text(t) for t in lista}
+    for texto in textos:
+        if len(lista) >= PER_KEY:
+            break
+        if isinstance(texto, str) and texto.strip() and normalize_text(texto) not in vistos:
+            vistos.add(normalize_text(texto))
+            lista.append(texto.strip())
+
+
+def _curriculum_entries(curriculo):
+    """
+    Claves con su lista de sugerencias derivadas solo del currículo. Lo que no
+    depende del grado (o del área) se guarda una vez en la clave más general.
+    """
+    entries = {}
+    for nivel, areas in curriculo.areas_por_nivel.items():
+        for d in DEFAULT_SUGGESTIONS.get(nivel, {}).get('desempeno', []):
+            _add(entries, corpus_key(nivel, '', '', 'desempeno'), [d])
+        for area in areas:
+            comps = curriculo.curriculo.get(area, {})
+            capacidades = [cap for caps in comps.values() for cap in caps]
+            _add(entries, corpus_key(nivel, area, '', 'competencia'), list(comps))
+            _add(entries, corpus_key(nivel, area, '', 'capacidad'), capacidades)
+            # Sin desempeños por grado, las capacidades del área son la mejor aproximación
+            _add(entries, corpus_key(nivel, area, '', 'desempeno'), capacidades)
+
+    # desempenos_data: {"Competencia": {"Grado": ["D1", ...]}}
+    for comp, por_grado in curriculo.data.get('desempenos_data', {}).items():
+        areas = [a for a, comps in curriculo.curriculo.items() if comp in comps]
+        for grado, desempenos in por_grado.items():
+            for nivel, areas_nivel in curriculo.areas_por_nivel.items():
+                for area in areas:
+                    if area in areas_nivel and grado in GRADOS_POR_NIVEL.get(nivel, []):
+                        _add(entries, corpus_key(nivel, area, grado, 'desempeno'), desempenos)
+
+    capacidades_transversales = [cap for caps in curriculo.transversales.values() for cap in caps]
+    valores = [v for info in curriculo.enfoques.values() for v in info.get('valores', [])]
+    _add(entries, corpus_key('', '', '', 'competencia_transversal'), list(curriculo.transversales))
+    _add(entries, corpus_key('', '', '', 'capacidad_transversal'), capacidades_transversales)
+    _add(entries, corpus_key('', '', '', 'enfoque'), list(curriculo.enfoques))
+    _add(entries, corpus_key('', '', '', 'valor'), valores)
+    _add(entries, corpus_key('', '', '', 'desempeno'), DEFAULT_SUGGESTIONS['Primaria']['desempeno'])
+    return entries
+
+
+def _cached_answers(suggest_cache):
+    """
+    Cuenta cuántas veces apareció cada sugerencia de la IA por (nivel, área, grado, tipo).
+    Las claves de suggest_cache son make_key(campo, tema, nivel, grado, area).
+    """
+    conteos = {}
+    for key, value in suggest_cache.items():
+        partes = key.split('|')
+        if len(partes) != 5 or not isinstance(value, list):
+            continue
+        campo, _tema, nivel, grado, area = partes
+        tipo = campo_tipo(campo)
+        for clave in (corpus_key(nivel, area, grado, tipo), corpus_key(nivel, area, '', tipo)):
+            conteos.setdefault(clave, Counter()).update(t for t in value if isinstance(t, str))
+    return conteos
+
+
+def build_corpus(curriculo, suggest_cache=None):
+    """
+    Construye {clave: [sugerencias]}. Las respuestas reales de la IA van primero
+    (las más repetidas) y se completan con el currículo de la clave más general.
+    """
+    curriculares = _curriculum_entries(curriculo)
+    entries = {}
+    if suggest_cache is not None:
+        for clave, conteo in _cached_answers(suggest_cache).items():
+            _add(entries, clave, [texto for texto, _ in conteo.most_common()])
+    for clave in list(entries):
+        nivel, area, _grado, tipo = clave.split('|')
+        for general in (corpus_key(nivel, area, '', tipo), corpus_key(nivel, '', '', tipo)):
+            _add(entries, clave, curriculares.get(general, []))
+    for clave, textos in curriculares.items():
+        _add(entries, clave, textos)
+    return {clave: textos for clave, textos in sorted(entries.items()) if textos}
+
+
+class FallbackCorpus:
+    """
+    Sugerencias de respaldo indexadas por make_key(nivel, area, grado, tipo).
+    Si la combinación exacta no existe se prueba sin grado, sin área y sin nivel.
+    """
+
+    def __init__(self, entries, source=None):
+        self.entries = entries
+        self.source = source
+        self.hits = 0
+        self.generic = 0
+
+    @classmethod
+    def load(cls, path=FALLBACK_CORPUS_PATH, curriculo=None):
+        """
+        Lee el corpus generado offline; si no existe se arma en memoria desde el currículo.
+        """
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return cls(json.load(f)['entries'], source=path)
+        print(f"Aviso: no existe {path}; se usa un corpus de respaldo armado solo desde el currículo.")
+        return cls(build_corpus(curriculo or load_curriculo()), source='curriculo')
+
+    def lookup(self, nivel, area, grado, campo):
+        tipo = campo_tipo(campo)
+        for clave in (corpus_key(nivel, area, grado, tipo), corpus_key(nivel, area, '', tipo),
+                      corpus_key(nivel, '', '', tipo), corpus_key('', '', '', tipo)):
+            sugerencias = self.entries.get(clave)
+            if sugerencias:
+                self.hits += 1
+                return sugerencias
+        self.generic += 1
+        return GENERIC_SUGGESTIONS
+
+    def stats(self):
+        return {'entries': len(self.entries), 'source': self.source, 'hits': self.hits, 'generic': self.generic}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Genera el corpus de respaldo de /suggest.')
+    parser.add_argument('--output', default=FALLBACK_CORPUS_PATH)
+    parser.add_argument('--suggest-cache', help='suggest_cache.sqlite3 con respuestas exitosas de la IA')
+    args = parser.parse_args()
+
+    suggest_cache = None
+    if args.suggest_cache:
+        # TTL amplio: para el respaldo sirven también respuestas antiguas
+        suggest_cache = ResponseCache(args.suggest_cache, ttl=10 * 365 * 24 * 3600)
+    entries = build_corpus(load_curriculo(), suggest_cache)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'version': 1, 'per_key': PER_KEY, 'entries': entries}, f, ensure_ascii=False, separators=(',', ':'))
+    print(f"Corpus de respaldo: {len(entries)} claves -> {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+import itertools
+import math
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+
+from metrics import RequestTimings, bind_timings
+
+
+PRIORIDADES = {'alta': 0, 'normal': 1, 'baja': 2}
+
+
+class QueueFull(Exception):
+    """
+    La cola está llena. retry_after: segundos estimados hasta que haya lugar.
+    """
+
+    def __init__(self, retry_after):
+        super().__init__("Cola de generación llena")
+        self.retry_after = retry_after
+
+
+class JobQueue:
+    """
+    Cola de trabajos con prioridad atendida por un pool acotado de hilos. El
+    estado de cada trabajo se guarda en `store` (caché SQLite compartida), así
+    que cualquier worker de gunicorn puede responder la consulta; el proceso que
+    tiene el trabajo además avisa al instante a quien está esperando (long-poll).
+
+    `handler(payload)` devuelve (respuesta, status, headers), igual que las
+    funciones compartidas de app.py.
+
+    La cola en sí vive en memoria de cada proceso: depth(), la posición y
+    retry_after() cuentan solo los trabajos de este proceso, y max_depth es el
+    tope por proceso (con N workers de gunicorn caben hasta N × max_depth).
+    Si el proceso muere, sus trabajos quedan en el almacén sin nadie que los
+    atienda; status() los da por perdidos pasado stale_factor veces lo que
+    tardaría en vaciarse la cola (mínimo min_stale segundos).
+    """
+
+    def __init__(self, handler, store, workers=4, max_depth=100, endpoint='job',
+                 stale_factor=3, min_stale=300):
+        self.handler = handler
+        self.store = store
+        self.workers = workers
+        self.max_depth = max_depth
+        self.endpoint = endpoint
+        self.stale_factor = stale_factor
+        self.min_stale = min_stale
+        self._queue = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._queued = {}
+        self._running = set()
+        self._events = {}
+        # Duración de los últimos trabajos y momento en que terminaron (para Retry-After)
+        self._durations = deque(maxlen=50)
+        self._finished = deque(maxlen=200)
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.running = 0
+        self.lost = 0
+
+    def _ensure_workers(self):
+        # Los hilos se crean perezosamente (y de nuevo tras un fork de gunicorn)
+        with self._lock:
+            if self._queue is None or self._pid != os.getpid():
+                self._queue = queue.PriorityQueue()
+                self._pid = os.getpid()
+                for i in range(self.workers):
+                    threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True).start()
+        return self._queue
+
+    def depth(self):
+        with self._lock:
+            return len(self._queued)
+
+    def _typical_duration(self):
+        with self._lock:
+            durations = list(self._durations)
+        # Sin historial todavía: ~10 s por generación
+        return sum(durations) / len(durations) if durations else 10.0
+
+    def _throughput(self):
+        # Trabajos terminados por segundo en el último minuto
+        now = time.monotonic()
+        with self._lock:
+            recientes = [t for t in self._finished if now - t <= 60]
+            durations = list(self._durations)
+        if len(recientes) >= 2:
+            return len(recientes) / max(now - recientes[0], 1.0)
+        if durations:
+            return self.workers / (sum(durations) / len(durations))
+        return None
+
+    def retry_after(self, depth=None):
+        """
+        Segundos estimados hasta que se procesen los trabajos que ya están en cola.
+        """
+        depth = self.depth() if depth is None else depth
+        rate = self._throughput()
+        if not rate:
+            # Sin historial todavía: ~10 s por generación
+            rate = self.workers / 10.0
+        return max(1, math.ceil((depth + 1) / rate))
+
+    def submit(self, payload, prioridad='normal'):
+        """
+        Encola el trabajo y devuelve su estado inicial. Lanza QueueFull si no hay lugar.
+        """
+        q = self._ensure_workers()
+        job_id = uuid.uuid4().hex
+        prioridad_num = PRIORIDADES.get(prioridad, PRIORIDADES['normal'])
+        with self._lock:
+            depth = len(self._queued)
+            full = depth >= self.max_depth
+            if full:
+                self.rejected += 1
+            else:
+                self._queued[job_id] = prioridad_num
+                self._events[job_id] = threading.Event()
+                self.submitted += 1
+        if full:
+            raise QueueFull(self.retry_after(depth))
+        estado = {'job_id': job_id, 'estado': 'en_cola', 'prioridad': prioridad, 'creado': time.time()}
+        self.store.set(job_id, estado)
+        q.put((prioridad_num, next(self._seq), job_id, payload))
+        return self.status(job_id)
+
+    def _position(self, job_id):
+        with self._lock:
+            prioridad = self._queued.get(job_id)
+            if prioridad is None:
+                return None
+            # Aproximada: trabajos en la cola local con prioridad igual o mayor
+            return sum(1 for p in self._queued.values() if p <= prioridad)
+
+    def _stale_after(self, estado):
+        # En cola: lo que tarda en vaciarse una cola llena; procesando: un trabajo
+        typical = self._typical_duration()
+        if estado['estado'] == 'en_cola':
+            typical *= self.max_depth / self.workers + 1
+        return max(self.min_stale, self.stale_factor * typical)
+
+    def _lost(self, job_id, estado):
+        """
+        True si el trabajo quedó huérfano: no lo tiene este proceso y lleva
+        demasiado tiempo sin avanzar (p. ej. se reinició el worker que lo tenía).
+        """
+        with self._lock:
+            propio = job_id in self._queued or job_id in self._running
+        if propio:
+            return False
+        desde = estado.get('iniciado') if estado['estado'] == 'procesando' else estado.get('creado')
+        return desde is not None and time.time() - desde > self._stale_after(estado)
+
+    def status(self, job_id):
+        estado = self.store.get(job_id)
+        if estado is None:
+            return None
+        if estado['estado'] in ('en_cola', 'procesando') and self._lost(job_id, estado):
+            estado.update({
+                'estado': 'error',
+                'status': 503,
+                'resultado': {'error': 'El trabajo se perdió (se reinició el servidor). Vuelve a generarlo.'},
+                'terminado': time.time(),
+            })
+            self.store.set(job_id, estado)
+            with self._lock:
+                self.lost += 1
+            return estado
+        if estado['estado'] == 'en_cola':
+            posicion = self._position(job_id)
+            if posicion is not None:
+                estado['posicion'] = posicion
+                estado['retry_after'] = self.retry_after(posicion - 1)
+        return estado
+
+    def wait(self, job_id, timeout):
+        """
+        Long-poll: espera hasta `timeout` segundos a que el trabajo termine.
+        """
+        deadline = time.monotonic() + timeout
+        event = self._events.get(job_id)
+        while True:
+            estado = self.status(job_id)
+            if estado is None or estado['estado'] in ('completado', 'error'):
+                return estado
+            restante = deadline - time.monotonic()
+            if restante <= 0:
+                return estado
+            if event is not None:
+                event.wait(restante)
+                event = None
+            else:
+                # El trabajo lo tiene otro worker: se consulta el almacén compartido
+                time.sleep(min(0.5, restante))
+
+    def _work(self):
+        while True:
+            _, _, job_id, payload = self._queue.get()
+            with self._lock:
+                self._queued.pop(job_id, None)
+                self._running.add(job_id)
+                self.running += 1
+            estado = self.store.get(job_id) or {'job_id': job_id}
+            estado['estado'] = 'procesando'
+            estado['iniciado'] = time.time()
+            self.store.set(job_id, estado)
+
+            start = time.monotonic()
+            # Las etapas (llm, extract...) se miden como en un request normal
+            bind_timings(RequestTimings(self.endpoint))
+            try:
+                respuesta, status, headers = self.handler(payload)
+            except Exception as e:
+                print(f"ERROR TRABAJO {job_id}: {e}")
+                respuesta, status, headers = {'error': str(e)}, 500, {}
+
+            estado.update({
+                'estado': 'completado' if status < 400 else 'error',
+                'status': status,
+                'resultado': respuesta,
+                'terminado': time.time(),
+            })
+            if 'Retry-After' in headers:
+                estado['retry_after'] = int(headers['Retry-After'])
+            self.store.set(job_id, estado)
+
+            with self._lock:
+                self._running.discard(job_id)
+                self.running -= 1
+                if status < 400:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                self._durations.append(time.monotonic() - start)
+                self._finished.append(time.monotonic())
+                event = self._events.pop(job_id, None)
+            if event is not None:
+                event.set()
+
+    def stats(self):
+        rate = self._throughput()
+        return {
+            'workers': self.workers,
+            'max_depth': self.max_depth,
+            'depth': self.depth(),
+            'running': self.running,
+            'submitted': self.submitted,
+            'rejected': self.rejected,
+            'completed': self.completed,
+            'failed': self.failed,
+            'lost': self.lost,
+            'throughput_per_second': round(rate, 3) if rate else None,
+            'retry_after_seconds': self.retry_after(),
+        }
@@ -0,0 +1,187 @@
+import json
+import re
+import threading
+
+from metrics import record_fallback
+
+
+_DECODER = json.JSONDecoder()
+_CLOSERS = {'{': '}', '[': ']'}
+_OBJECT_RE = re.compile(r'\{')
+_LIST_RE = re.compile(r'\[')
+# Espacios y una cerca de markdown opcional antes del primer valor (```json ...)
+_LEAD_RE = re.compile(r'\s*(?:```[\w-]*\s*)?')
+# Un string completo (con escapes), o un caracter estructural, o una comilla sin cierre
+_TOKEN_RE = re.compile(r'"(?:[^"\\]|\\.)*"|[{}\[\],:"]', re.DOTALL)
+
+# Contadores de extracción (para /llm_stats y el benchmark)
+_stats_lock = threading.Lock()
+EXTRACT_STATS = {'parsed': 0, 'repaired': 0, 'failed': 0}
+
+
+def _count(key):
+    with _stats_lock:
+        EXTRACT_STATS[key] += 1
+
+
+def _close(fragment, stack):
+    # Cierra los contenedores abiertos después de limpiar comas o ":" colgantes
+    fragment = fragment.rstrip()
+    while fragment.endswith(','):
+        fragment = fragment[:-1].rstrip()
+    if fragment.endswith(':'):
+        fragment += ' null'
+    return fragment + ''.join(_CLOSERS[c] for c in reversed(stack))
+
+
+def _repair(text, start, stack, in_string, safe):
+    """
+    Intenta reparar un JSON truncado: primero cerrando lo que quedó abierto
+    (arrays, objetos) y, si no alcanza, cortando en el último valor completo.
+    Un string cortado nunca se cierra: se descarta entero (una sugerencia "Tr"
+    a medio escribir no es un valor válido).
+    """
+    if not in_string:
+        try:
+            return json.loads(_close(text[start:], stack))
+        except json.JSONDecodeError:
+            pass
+
+    if safe is not None:
+        end, safe_stack = safe
+        try:
+            return json.loads(_close(text[start:end], safe_stack))
+        except json.JSONDecodeError:
+            pass
+    raise json.JSONDecodeError("No se pudo reparar el JSON truncado", text, start)
+
+
+def _next_start(starts, pos):
+    # Próximo inicio candidato desde pos; el iterador solo avanza, así el total sigue siendo lineal
+    for p in starts:
+        if p >= pos:
+            return p
+    return -1
+
+
+def _find(text, starts, repair):
+    """
+    Prueba los inicios candidatos en orden. Devuelve (valor, 'parsed' | 'repaired')
+    del primero que sea JSON válido (o reparable, si es el último), o None.
+    """
+    i = _next_start(starts, 0)
+    n = len(text)
+
+    while 0 <= i < n:
+        start = i
+        # Camino rápido (en C): un JSON válido desde aquí, ignorando lo que venga después
+        try:
+            return _DECODER.raw_decode(text, start)[0], 'parsed'
+        except json.JSONDecodeError:
+            pass
+
+        stack = []
+        in_string = False
+        expect_key = False
+        # Último punto de corte seguro: (posición, pila) tras un valor completo
+        safe = None
+        i = n
+
+        # Solo se visitan tokens estructurales; el contenido de los strings lo salta la regex
+        for m in _TOKEN_RE.finditer(text, start):
+            tok = m.group()
+            ch = tok[0]
+            if ch == '"':
+                if len(tok) == 1:
+                    # String sin cerrar hasta el final del texto (respuesta truncada)
+                    in_string = True
+                    break
+                # Una clave sola no es un punto de corte válido
+                if not expect_key:
+                    safe = (m.end(), tuple(stack))
+            elif ch == ':':
+                expect_key = False
+            elif ch == '{' or ch == '[':
+                stack.append(ch)
+                expect_key = ch == '{'
+                # Cortar justo después de abrir: si lo que sigue es un escalar truncado
+                # ({"a": tru), se descarta ese par y queda el contenedor vacío
+                safe = (m.end(), tuple(stack))
+            elif ch == '}' or ch == ']':
+                if not stack or _CLOSERS[stack[-1]] != ch:
+                    i = m.start()
+                    break
+                stack.pop()
+                if not stack:
+                    i = m.start()
+                    break
+                expect_key = False
+                safe = (m.end(), tuple(stack))
+            else:
+                safe = (m.start(), tuple(stack))
+                expect_key = stack[-1] == '{'
+
+        if i < n:
+            if not stack:
+                # Objeto balanceado: normalmente el JSON buscado
+                try:
+                    return json.loads(text[start:i + 1]), 'parsed'
+                except json.JSONDecodeError:
+                    pass
+            # Texto entre llaves que no era JSON: seguir con el próximo inicio
+            i = _next_start(starts, i + 1)
+            continue
+
+        if repair:
+            try:
+                return _repair(text, start, stack, in_string, safe), 'repaired'
+            except json.JSONDecodeError:
+                pass
+        break
+    return None
+
+
+def extract_json(text, repair=True):
+    """
+    Extrae y parsea el JSON de un texto (con o sin markdown) en pasadas lineales
+    que respetan strings y escapes. Si la respuesta quedó truncada, intenta
+    repararla. Devuelve el valor parseado o lanza json.JSONDecodeError (con
+    .doc = texto original).
+
+    Se busca primero un objeto {...}: una lista solo se acepta si es la
+    respuesta entera ("[{...}]") o, como último recurso, si no hay ningún
+    objeto (así "Nota [1]: {...}" devuelve el objeto y no [1]).
+
+    Cada posible inicio se prueba primero con JSONDecoder.raw_decode; el escaneo
+    token a token solo corre cuando ese intento falla (texto roto o truncado).
+    """
+    return extract_json_detail(text, repair)[0]
+
+
+def extract_json_detail(text, repair=True):
+    """
+    Como extract_json, pero devuelve (valor, reparado): reparado es True si la
+    respuesta venía truncada y hubo que cortarla o cerrarla (no es la original).
+    """
+    found = None
+    lead = _LEAD_RE.match(text).end()
+    if text.startswith('[', lead):
+        found = _find(text, iter((lead,)), repair)
+    if found is None:
+        found = _find(text, (m.start() for m in _OBJECT_RE.finditer(text)), repair)
+    if found is None:
+        found = _find(text, (m.start() for m in _LIST_RE.finditer(text)), repair)
+
+    if found is None:
+        _count('failed')
+        raise json.JSONDecodeError("No se encontró un objeto JSON válido", text, 0)
+    data, how = found
+    _count(how)
+    if how == 'repaired':
+        record_fallback('json_repair')
+    return data, how == 'repaired'
+
+
+def extract_stats():
+    with _stats_lock:
+        return dict(EXTRACT_STATS)
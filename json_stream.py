@@ -0,0 +1,111 @@
+import json
+
+
+class IncrementalJSONParser:
+    """
+    Parser JSON incremental para respuestas que llegan por partes (streaming).
+
+    Se le van entregando fragmentos de texto con feed() y devuelve los valores
+    que quedaron completos en ese fragmento como pares (ruta, valor), donde la
+    ruta es una tupla de claves/índices, p. ej. ('secuencia_didactica', 'inicio').
+    Ignora cualquier texto previo a la primera llave (markdown, ```json, etc.).
+    """
+
+    def __init__(self, max_depth=2):
+        self.max_depth = max_depth
+        self.buffer = ''
+        self.pos = 0
+        self.started = False
+        self.finished = False
+        # Pila de contenedores: [tipo, inicio, clave_actual, esperando_clave, indice]
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.scalar_start = None
+
+    def _path(self):
+        path = []
+        for kind, _, key, _, index in self.stack:
+            path.append(key if kind == '{' else index)
+        return tuple(path)
+
+    def _complete(self, start, end, events):
+        # Ruta del valor que acaba de terminar dentro del contenedor actual
+        if not self.stack:
+            return
+        path = self._path()
+        if len(path) > self.max_depth:
+            return
+        try:
+            events.append((path, json.loads(self.buffer[start:end])))
+        except json.JSONDecodeError:
+            pass
+
+    def _end_scalar(self, end, events):
+        if self.scalar_start is not None:
+            self._complete(self.scalar_start, end, events)
+            self.scalar_start = None
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        events = []
+        buf = self.buffer
+        i = self.pos
+
+        while i < len(buf) and not self.finished:
+            ch = buf[i]
+
+            if not self.started:
+                if ch == '{':
+                    self.started = True
+                    self.stack.append(['{', i, None, True, 0])
+                i += 1
+                continue
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == '\\':
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    top = self.stack[-1]
+                    text = buf[self.string_start:i + 1]
+                    if top[0] == '{' and top[3]:
+                        top[2] = json.loads(text)
+                    else:
+                        self._complete(self.string_start, i + 1, events)
+                i += 1
+                continue
+
+            if ch == '"':
+                self.in_string = True
+                self.string_start = i
+            elif ch in '{[':
+                self.stack.append([ch, i, None, ch == '{', 0])
+            elif ch in '}]':
+                self._end_scalar(i, events)
+                start = self.stack.pop()[1]
+                if self.stack:
+                    self._complete(start, i + 1, events)
+                else:
+                    self.finished = True
+            elif ch == ',':
+                self._end_scalar(i, events)
+                top = self.stack[-1]
+                if top[0] == '{':
+                    top[3] = True
+                else:
+                    top[4] += 1
+            elif ch == ':':
+                self.stack[-1][3] = False
+            elif ch in ' \t\r\n':
+                self._end_scalar(i, events)
+            elif self.scalar_start is None:
+                # Números, true, false, null
+                self.scalar_start = i
+            i += 1
+
+        self.pos = i
+        return events
@@ -0,0 +1,26 @@
+import os
+
+from google.genai import Client, types
+
+
+BACKENDS = ('gemini', 'fake', 'fake_server')
+
+
+def create_llm_client(backend=None, api_key=None):
+    """
+    Crea el cliente LLM según LLM_BACKEND:
+    - gemini (por defecto): google.genai.Client con la API key real.
+    - fake: cliente en proceso (fake_genai.FakeClient) con el escenario de FAKE_LLM_*.
+    - fake_server: google.genai.Client apuntando a fake_gemini_server.py (FAKE_GEMINI_URL),
+      así se prueba también la capa HTTP del SDK.
+    """
+    backend = backend or os.environ.get('LLM_BACKEND', 'gemini')
+    if backend == 'gemini':
+        return Client(api_key=api_key)
+    if backend == 'fake':
+        from fake_genai import FakeClient, FakeScenario
+        return FakeClient(scenario=FakeScenario.from_env())
+    if backend == 'fake_server':
+        url = os.environ.get('FAKE_GEMINI_URL', 'http://127.0.0.1:8089')
+        return Client(api_key=api_key or 'fake', http_options=types.HttpOptions(base_url=url))
+    raise ValueError(f"LLM_BACKEND desconocido: {backend} (opciones: {', '.join(BACKENDS)})")
@@ -0,0 +1,513 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import math
+import os
+import queue
+import threading
+import time
+
+from metrics import LLM_CALLS, LLM_HEDGES, LLM_RETRIES, bind_timings, current_endpoint, current_timings, record_stage, record_tokens
+from model_router import LatencyTracker
+
+
+def is_throttle_error(e):
+    """
+    Detecta errores 503 ("overloaded") o 429 ("ResourceExhausted") de Gemini.
+    """
+    error_str = str(e)
+    is_overloaded = "503" in error_str or "overloaded" in error_str.lower()
+    is_resource_exhausted = "429" in error_str or "ResourceExhausted" in error_str or "RESOURCE_EXHAUSTED" in error_str
+    return is_overloaded or is_resource_exhausted
+
+
+class LLMUnavailable(Exception):
+    """
+    Gemini no está disponible (429/503 persistentes, circuito abierto o sin
+    presupuesto de reintentos). retry_after: segundos sugeridos antes de reintentar.
+    """
+
+    def __init__(self, retry_after=None, reason='throttled'):
+        # Mismo mensaje que antes para los endpoints que buscan "SERVICE_UNAVAILABLE_429"
+        super().__init__("SERVICE_UNAVAILABLE_429")
+        self.retry_after = retry_after
+        self.reason = reason
+
+    def retry_after_header(self):
+        return str(max(1, math.ceil(self.retry_after or 1)))
+
+
+class CircuitBreaker:
+    """
+    Corta las llamadas a un modelo tras varios 429/503 seguidos. Mientras está
+    abierto se rechaza todo de inmediato; pasado el enfriamiento deja pasar una
+    sola llamada de prueba (semiabierto) y se cierra si esa llamada sale bien.
+    Cada reapertura duplica el enfriamiento hasta max_cooldown.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, threshold=5, cooldown=30.0, max_cooldown=300.0, probe_timeout=60.0):
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.probe_timeout = probe_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.cooldown = cooldown
+        self.opened_at = 0.0
+        self.probe_started = None
+        self.opens = 0
+        self.rejected = 0
+
+    def retry_after(self):
+        if self.state == self.OPEN:
+            return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+        return self.base_cooldown if self.state == self.HALF_OPEN else 0.0
+
+    def allow(self):
+        """
+        True si la llamada puede salir. En semiabierto solo pasa una prueba a la vez.
+        """
+        now = time.monotonic()
+        if self.state == self.OPEN and now >= self.opened_at + self.cooldown:
+            self.state = self.HALF_OPEN
+            self.probe_started = None
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN:
+            # Si la prueba anterior quedó colgada (p. ej. cancelada) se permite otra
+            if self.probe_started is None or now - self.probe_started > self.probe_timeout:
+                self.probe_started = now
+                return True
+        self.rejected += 1
+        return False
+
+    def _open(self):
+        if self.state == self.HALF_OPEN:
+            self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.probe_started = None
+        self.opens += 1
+        print(f"ALERTA: Circuito de Gemini abierto por {self.cooldown:.0f}s tras {self.failures} errores 429/503.")
+
+    def on_success(self):
+        if self.state != self.CLOSED:
+            print("Circuito de Gemini cerrado: la llamada de prueba respondió bien.")
+        self.state = self.CLOSED
+        self.failures = 0
+        self.cooldown = self.base_cooldown
+        self.probe_started = None
+
+    def on_throttle(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.threshold):
+            self._open()
+
+    def on_release(self):
+        # La prueba terminó sin veredicto (error que no es 429/503 o cancelación)
+        if self.state == self.HALF_OPEN:
+            self.probe_started = None
+
+    def stats(self):
+        return {
+            'state': self.state,
+            'consecutive_failures': self.failures,
+            'cooldown_seconds': self.cooldown,
+            'retry_after_seconds': round(self.retry_after(), 1),
+            'opens': self.opens,
+            'rejected': self.rejected,
+        }
+
+
+class RetryBudget:
+    """
+    Presupuesto de reintentos compartido por todos los requests: cada llamada
+    nueva deposita `ratio` fichas, cada reintento gasta una, y además se
+    acumulan `min_per_second` fichas por segundo (hasta `max_tokens`). Así los
+    reintentos no pueden superar ~ratio de las llamadas y no multiplican la
+    sobrecarga durante un corte.
+    """
+
+    def __init__(self, ratio=0.2, min_per_second=0.2, max_tokens=10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self.updated = time.monotonic()
+        self.exhausted = 0
+
+    def _refill(self, amount=0.0):
+        now = time.monotonic()
+        self.tokens = min(self.max_tokens, self.tokens + (now - self.updated) * self.min_per_second + amount)
+        self.updated = now
+
+    def on_request(self):
+        self._refill(self.ratio)
+
+    def try_spend(self):
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        self.exhausted += 1
+        return False
+
+    def stats(self):
+        self._refill()
+        return {'tokens': round(self.tokens, 2), 'ratio': self.ratio, 'exhausted': self.exhausted}
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket compartido. Baja la tasa a la mitad ante un 429/503 y la
+    recupera de a poco con cada respuesta exitosa (AIMD).
+    """
+
+    def __init__(self, rate, burst, min_rate=0.2):
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.throttles = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def on_throttle(self):
+        self._refill()
+        self.throttles += 1
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = min(self.tokens, 0)
+
+    def on_success(self):
+        self._refill()
+        self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+
+class LLMGateway:
+    """
+    Puerta de entrada única a Gemini. Corre un event loop propio en un hilo de
+    fondo y usa la superficie async del cliente (client.aio), de modo que las
+    esperas por reintentos o por el limitador no ocupan hilos del servidor.
+    """
+
+    def __init__(self, client, max_concurrency=8, rate=2.0, burst=4,
+                 breaker_threshold=5, breaker_cooldown=30.0, retry_budget_ratio=0.2,
+                 hedge_budget_ratio=0.1, tracker=None, request_timeout=120.0):
+        self.client = client
+        # Tope (s) que una vista síncrona espera a Gemini, reintentos incluidos
+        self.request_timeout = request_timeout
+        self.max_concurrency = max_concurrency
+        self.limiter = AdaptiveRateLimiter(rate, burst)
+        self.retry_budget = RetryBudget(retry_budget_ratio)
+        # Los duplicados (hedged) tienen su propio presupuesto: como mucho ~ratio de las llamadas
+        self.hedge_budget = RetryBudget(hedge_budget_ratio, min_per_second=0.05, max_tokens=3.0)
+        self.tracker = tracker or LatencyTracker()
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        # Un circuito por modelo: la cuota de Gemini se agota por modelo
+        self.breakers = {}
+        self._loop = None
+        self._pid = None
+        self._semaphore = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.waiting = 0
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.timeouts = 0
+
+    def _ensure_loop(self):
+        # Se crea perezosamente (y de nuevo tras un fork de gunicorn)
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='llm-gateway', daemon=True).start()
+                self._loop = loop
+                self._pid = os.getpid()
+                self._semaphore = None
+        return self._loop
+
+    def submit(self, coro):
+        """
+        Programa una corrutina en el loop del gateway y devuelve un concurrent.futures.Future.
+        """
+        timings = current_timings()
+
+        async def _with_timings():
+            # Las etapas medidas en el loop se suman al request que hizo la llamada
+            bind_timings(timings)
+            return await coro
+
+        return asyncio.run_coroutine_threadsafe(_with_timings(), self._ensure_loop())
+
+    def breaker(self, model_name):
+        breaker = self.breakers.get(model_name)
+        if breaker is None:
+            breaker = self.breakers[model_name] = CircuitBreaker(self.breaker_threshold, self.breaker_cooldown)
+        return breaker
+
+    def _admit(self, model_name, attempt):
+        # Antes de cada intento: el circuito debe dejar pasar y los reintentos deben tener presupuesto
+        breaker = self.breaker(model_name)
+        if not breaker.allow():
+            LLM_CALLS.inc(endpoint=current_endpoint(), model=model_name, outcome='rejected')
+            raise LLMUnavailable(breaker.retry_after(), reason='circuit_open')
+        if attempt == 0:
+            self.retry_budget.on_request()
+        elif not self.retry_budget.try_spend():
+            breaker.on_release()
+            LLM_CALLS.inc(endpoint=current_endpoint(), model=model_name, outcome='rejected')
+            raise LLMUnavailable(self.breaker_cooldown, reason='retry_budget')
+
+    @contextlib.asynccontextmanager
+    async def _slot(self):
+        # Espera turno en el limitador y en el semáforo de concurrencia
+        if self.client is None:
+            raise RuntimeError("El cliente Gemini no está inicializado.")
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.waiting += 1
+        start = time.perf_counter()
+        try:
+            await self.limiter.acquire()
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+            record_stage('llm_queue', time.perf_counter() - start)
+
+        self.in_flight += 1
+        self.calls += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+            record_stage('llm_call', time.perf_counter() - start)
+
+    async def _backoff(self, e, model_name, attempt, retries, delay):
+        # Solo se reintentan los 429/503; el último intento se reporta como SERVICE_UNAVAILABLE_429
+        breaker = self.breaker(model_name)
+        if not is_throttle_error(e):
+            breaker.on_release()
+            LLM_CALLS.inc(endpoint=current_endpoint(), model=model_name, outcome='error')
+            raise e
+        LLM_CALLS.inc(endpoint=current_endpoint(), model=model_name, outcome='throttled')
+        self.limiter.on_throttle()
+        breaker.on_throttle()
+        if breaker.state == CircuitBreaker.OPEN:
+            # No tiene sentido seguir esperando: el circuito ya rechaza las llamadas
+            raise LLMUnavailable(breaker.retry_after(), reason='circuit_open')
+        if attempt == retries - 1:
+            raise LLMUnavailable(delay * (2 ** attempt))
+        self.retries += 1
+        LLM_RETRIES.inc(endpoint=current_endpoint(), model=model_name)
+        wait_time = delay * (2 ** attempt)
+        print(f"ALERTA: Modelo ocupado (429/503). Reintentando en {wait_time}s... (Intento {attempt + 1}/{retries})")
+        start = time.perf_counter()
+        await asyncio.sleep(wait_time)
+        record_stage('retry_sleep', time.perf_counter() - start)
+
+    def _on_success(self, model_name, usage):
+        self.limiter.on_success()
+        self.breaker(model_name).on_success()
+        LLM_CALLS.inc(endpoint=current_endpoint(), model=model_name, outcome='ok')
+        record_tokens(model_name, usage)
+
+    def _kwargs(self, model_name, prompt, config):
+        kwargs = {'model': model_name, 'contents': prompt}
+        if config is not None:
+            kwargs['config'] = config
+        return kwargs
+
+    async def agenerate(self, model_name, prompt, config=None, retries=5, delay=3, ruta=None):
+        kwargs = self._kwargs(model_name, prompt, config)
+        for attempt in range(retries):
+            self._admit(model_name, attempt)
+            start = None
+            try:
+                async with self._slot():
+                    start = time.perf_counter()
+                    response = await self.client.aio.models.generate_content(**kwargs)
+            except asyncio.CancelledError:
+                self.breaker(model_name).on_release()
+                if start is not None:
+                    # Llamada cancelada (casi siempre el lento que perdió contra el duplicado):
+                    # su latencia es al menos esta. Sin la muestra el p95 solo vería a los
+                    # ganadores y bajaría hasta duplicar casi todo. No cuenta como error.
+                    self.tracker.observe(model_name, time.perf_counter() - start, ruta)
+                raise
+            except Exception as e:
+                self.tracker.outcome(model_name, ok=False)
+                await self._backoff(e, model_name, attempt, retries, delay)
+                continue
+            self.tracker.observe(model_name, time.perf_counter() - start, ruta)
+            self.tracker.outcome(model_name, ok=True)
+            self._on_success(model_name, getattr(response, 'usage_metadata', None))
+            return response
+
+    async def agenerate_routed(self, route, prompt, config=None, retries=5, delay=3):
+        """
+        Llamada según la decisión del router (model_router.Route). Si el modelo
+        principal no respondió pasado route.hedge_after segundos, se envía un
+        duplicado al alternativo; gana la primera respuesta válida y la otra se
+        cancela. Devuelve (modelo, respuesta).
+
+        Si el router ya pasó al alternativo (route.failover), ese modelo tiene un
+        solo intento: sus reintentos se sumarían a los que ya gastó el principal.
+        """
+        self.hedge_budget.on_request()
+        if route.failover:
+            retries = 1
+        primary = asyncio.ensure_future(
+            self.agenerate(route.model, prompt, config=config, retries=retries, delay=delay, ruta=route.name))
+        modelos = {primary: route.model}
+        pending = {primary}
+        try:
+            if route.alternate is not None and route.hedge_after is not None:
+                done, _ = await asyncio.wait({primary}, timeout=route.hedge_after)
+                if not done and self.hedge_budget.try_spend():
+                    # El duplicado no reintenta: si falla, seguimos esperando al principal
+                    self.hedges += 1
+                    LLM_HEDGES.inc(endpoint=current_endpoint(), outcome='sent')
+                    hedge = asyncio.ensure_future(
+                        self.agenerate(route.alternate, prompt, config=config, retries=1, delay=delay, ruta=route.name))
+                    modelos[hedge] = route.alternate
+                    pending.add(hedge)
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                            LLM_HEDGES.inc(endpoint=current_endpoint(), outcome='won')
+                        return modelos[task], task.result()
+            # Fallaron todos: se reporta el error del principal
+            raise primary.exception()
+        finally:
+            # El perdedor (o todo, si el request se canceló) se cancela upstream
+            for task in pending:
+                task.cancel()
+
+    async def astream(self, model_name, prompt, config=None, retries=5, delay=3):
+        """
+        Genera en streaming y va entregando el texto de cada fragmento.
+        Solo reintenta si el error ocurre antes de recibir el primer fragmento.
+        """
+        kwargs = self._kwargs(model_name, prompt, config)
+        for attempt in range(retries):
+            self._admit(model_name, attempt)
+            started = False
+            usage = None
+            try:
+                async with self._slot():
+                    stream = await self.client.aio.models.generate_content_stream(**kwargs)
+                    async for chunk in stream:
+                        started = True
+                        # El uso de tokens llega en el último fragmento
+                        usage = getattr(chunk, 'usage_metadata', None) or usage
+                        if chunk.text:
+                            yield chunk.text
+            except (asyncio.CancelledError, GeneratorExit):
+                self.breaker(model_name).on_release()
+                raise
+            except Exception as e:
+                if started:
+                    self.breaker(model_name).on_release()
+                    LLM_CALLS.inc(endpoint=current_endpoint(), model=model_name, outcome='error')
+                    raise
+                await self._backoff(e, model_name, attempt, retries, delay)
+                continue
+            self._on_success(model_name, usage)
+            return
+
+    def stream(self, model_name, prompt, **kwargs):
+        """
+        Versión síncrona de astream(): un generador de fragmentos de texto.
+        """
+        chunks = queue.Queue()
+        done = object()
+
+        async def _pump():
+            try:
+                async for text in self.astream(model_name, prompt, **kwargs):
+                    chunks.put(text)
+            except Exception as e:
+                chunks.put(e)
+            finally:
+                chunks.put(done)
+
+        future = self.submit(_pump())
+        try:
+            while True:
+                item = chunks.get()
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Si el cliente se desconecta, cancelamos la llamada upstream
+            future.cancel()
+
+    def _wait(self, future, timeout):
+        # Sin tope un Gemini colgado retendría el hilo del request para siempre
+        timeout = self.request_timeout if timeout is None else timeout
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            # Cancela la corrutina en el loop: libera su slot y su circuito
+            future.cancel()
+            self.timeouts += 1
+            raise LLMUnavailable(min(timeout, self.breaker_cooldown), reason='timeout') from None
+
+    def generate(self, model_name, prompt, timeout=None, **kwargs):
+        """
+        Versión bloqueante para las vistas síncronas de Flask. Si no responde en
+        `timeout` segundos (request_timeout por defecto) lanza LLMUnavailable.
+        """
+        return self._wait(self.submit(self.agenerate(model_name, prompt, **kwargs)), timeout)
+
+    def generate_routed(self, route, prompt, timeout=None, **kwargs):
+        """
+        Versión bloqueante de agenerate_routed(): devuelve (modelo, respuesta).
+        Mismo tope que generate().
+        """
+        return self._wait(self.submit(self.agenerate_routed(route, prompt, **kwargs)), timeout)
+
+    def stats(self):
+        return {
+            'calls': self.calls,
+            'retries': self.retries,
+            'in_flight': self.in_flight,
+            'waiting': self.waiting,
+            'max_concurrency': self.max_concurrency,
+            'rate_per_second': round(self.limiter.rate, 3),
+            'max_rate_per_second': self.limiter.max_rate,
+            'throttles': self.limiter.throttles,
+            'retry_budget': self.retry_budget.stats(),
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+            'hedge_budget': self.hedge_budget.stats(),
+            'request_timeout': self.request_timeout,
+            'timeouts': self.timeouts,
+            'circuit_breakers': {model: breaker.stats() for model, breaker in self.breakers.items()},
+        }
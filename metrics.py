@@ -0,0 +1,243 @@
+import contextlib
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+
+
+# --- MÉTRICAS EN FORMATO PROMETHEUS (sin dependencias) ---
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels_text(names, values, extra=()):
+    pairs = [f'{n}="{_escape_label(v)}"' for n, v in zip(names, values)]
+    pairs.extend(f'{n}="{v}"' for n, v in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _fmt(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, '')) for n in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_items(items))
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_items(self, items):
+        return [f"{self.name}{_labels_text(self.labelnames, key)} {_fmt(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _render_items(self, items):
+        lines = []
+        for key, (counts, total, n) in items:
+            for bound, c in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_labels_text(self.labelnames, key, [('le', _fmt(bound))])} {c}")
+            lines.append(f"{self.name}_bucket{_labels_text(self.labelnames, key, [('le', '+Inf')])} {n}")
+            lines.append(f"{self.name}_sum{_labels_text(self.labelnames, key)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{_labels_text(self.labelnames, key)} {n}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'app_request_duration_seconds', 'Duración de cada request por endpoint', ('endpoint', 'method', 'status')))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'app_stage_duration_seconds', 'Duración de cada etapa (llm, cola, reintentos, extracción, docx...)', ('endpoint', 'stage')))
+LLM_CALLS = REGISTRY.register(Counter(
+    'llm_calls_total', 'Llamadas a Gemini por resultado', ('endpoint', 'model', 'outcome')))
+LLM_RETRIES = REGISTRY.register(Counter(
+    'llm_retries_total', 'Reintentos por 429/503', ('endpoint', 'model')))
+LLM_HEDGES = REGISTRY.register(Counter(
+    'llm_hedges_total', 'Duplicados enviados al modelo alternativo y cuántos respondieron primero', ('endpoint', 'outcome')))
+LLM_TOKENS = REGISTRY.register(Counter(
+    'llm_tokens_total', 'Tokens de prompt y respuesta informados por Gemini', ('endpoint', 'model', 'kind')))
+FALLBACKS = REGISTRY.register(Counter(
+    'app_fallbacks_total', 'Respuestas servidas por un camino de respaldo', ('endpoint', 'kind')))
+
+
+# --- TIEMPOS POR ETAPA DE CADA REQUEST ---
+class RequestTimings:
+    """
+    Acumula la duración de cada etapa de un request (para Server-Timing y el log).
+    """
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint or 'desconocido'
+        self.request_id = os.urandom(6).hex()
+        self.start = time.perf_counter()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def server_timing(self):
+        with self._lock:
+            parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items()]
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ', '.join(parts)
+
+
+# Se usa fuera del contexto de Flask (p. ej. en el loop del gateway LLM)
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+def current_timings():
+    try:
+        from flask import g, has_app_context
+        if has_app_context():
+            timings = g.get('timings')
+            if timings is not None:
+                return timings
+    except ImportError:
+        pass
+    return _current.get()
+
+
+def bind_timings(timings):
+    """
+    Asocia los tiempos al contexto actual (hilos o tareas que no tienen el request de Flask).
+    """
+    _current.set(timings)
+
+
+def current_endpoint():
+    timings = current_timings()
+    return timings.endpoint if timings is not None else 'background'
+
+
+def record_stage(stage, seconds):
+    timings = current_timings()
+    if timings is not None:
+        timings.add(stage, seconds)
+    STAGE_SECONDS.observe(seconds, endpoint=current_endpoint(), stage=stage)
+
+
+@contextlib.contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def record_tokens(model, usage):
+    """
+    Suma los tokens de usage_metadata de una respuesta de Gemini (si viene).
+    """
+    if usage is None:
+        return
+    endpoint = current_endpoint()
+    prompt = getattr(usage, 'prompt_token_count', None)
+    response = getattr(usage, 'candidates_token_count', None)
+    if prompt:
+        LLM_TOKENS.inc(prompt, endpoint=endpoint, model=model, kind='prompt')
+    if response:
+        LLM_TOKENS.inc(response, endpoint=endpoint, model=model, kind='response')
+
+
+def record_fallback(kind):
+    FALLBACKS.inc(endpoint=current_endpoint(), kind=kind)
+
+
+# --- LOGS ESTRUCTURADOS ---
+RAW_RESPONSE_SAMPLE_RATE = float(os.environ.get('RAW_RESPONSE_SAMPLE_RATE', 0.01))
+RAW_RESPONSE_MAX_CHARS = int(os.environ.get('RAW_RESPONSE_MAX_CHARS', 4000))
+
+
+def log_event(event, **fields):
+    """
+    Una línea JSON por evento (stdout, como el resto de los logs de la app).
+    """
+    timings = current_timings()
+    record = {'ts': round(time.time(), 3), 'event': event}
+    if timings is not None:
+        record['request_id'] = timings.request_id
+        record['endpoint'] = timings.endpoint
+    record.update(fields)
+    print(json.dumps(record, ensure_ascii=False, default=str), flush=True)
+
+
+def capture_raw_response(model, text, force=False):
+    """
+    Registra la respuesta cruda de Gemini en una muestra de las llamadas
+    (RAW_RESPONSE_SAMPLE_RATE), o siempre si force=True (p. ej. al fallar el parseo).
+    """
+    if not force and random.random() >= RAW_RESPONSE_SAMPLE_RATE:
+        return
+    text = text or ''
+    log_event('llm_raw_response', model=model, chars=len(text), forced=force,
+              text=text[:RAW_RESPONSE_MAX_CHARS])
@@ -0,0 +1,171 @@
+import json
+import math
+import os
+import threading
+from collections import deque
+
+
+# Modelo, alternativo (para el duplicado "hedged") y tope de tokens de salida por ruta.
+# Las sesiones se separan por tipo_sesion: una Resumida responde bastante menos texto.
+DEFAULT_ROUTES = {
+    'suggest': {'model': 'gemini-2.5-flash-lite', 'alternate': 'gemini-2.0-flash-lite', 'max_output_tokens': 512},
+    'suggest_bulk': {'model': 'gemini-2.5-flash-lite', 'alternate': 'gemini-2.0-flash-lite', 'max_output_tokens': 2048},
+    'sesion_resumida': {'model': 'gemini-2.5-flash-lite', 'alternate': 'gemini-2.0-flash', 'max_output_tokens': 3072},
+    'sesion_detallada': {'model': 'gemini-2.5-flash-lite', 'alternate': 'gemini-2.0-flash', 'max_output_tokens': 8192},
+    'seccion': {'model': 'gemini-2.5-flash-lite', 'alternate': 'gemini-2.0-flash', 'max_output_tokens': 3072},
+    'ept': {'model': 'gemini-2.5-flash-lite', 'alternate': 'gemini-2.0-flash', 'max_output_tokens': 4096},
+}
+
+
+def load_routes(overrides=None):
+    """
+    Rutas por defecto con los cambios de LLM_ROUTES (JSON), p. ej.
+    {"sesion_detallada": {"alternate": null}} para no duplicar esa ruta.
+    """
+    if overrides is None:
+        overrides = json.loads(os.environ.get('LLM_ROUTES') or '{}')
+    routes = {nombre: dict(route) for nombre, route in DEFAULT_ROUTES.items()}
+    for nombre, cambios in overrides.items():
+        routes.setdefault(nombre, dict(DEFAULT_ROUTES['suggest'])).update(cambios)
+    return routes
+
+
+def _quantile(values, q):
+    ordenados = sorted(values)
+    return ordenados[min(len(ordenados) - 1, math.ceil(q * len(ordenados)) - 1)]
+
+
+class LatencyTracker:
+    """
+    Latencias recientes por (ruta, modelo) y tasa de error reciente por modelo.
+    Lo alimenta el gateway después de cada llamada y lo consulta el router.
+    """
+
+    def __init__(self, window=200, error_window=50, min_samples=20):
+        self.window = window
+        self.error_window = error_window
+        self.min_samples = min_samples
+        self._latencies = {}
+        self._outcomes = {}
+        self._lock = threading.Lock()
+
+    def observe(self, model, seconds, ruta=None):
+        with self._lock:
+            self._latencies.setdefault((ruta, model), deque(maxlen=self.window)).append(seconds)
+
+    def outcome(self, model, ok):
+        with self._lock:
+            self._outcomes.setdefault(model, deque(maxlen=self.error_window)).append(not ok)
+
+    def quantile(self, model, q, ruta=None):
+        """
+        Cuantil q de la latencia, o None si todavía no hay min_samples muestras.
+        """
+        with self._lock:
+            values = list(self._latencies.get((ruta, model), ()))
+        if len(values) < self.min_samples:
+            return None
+        return _quantile(values, q)
+
+    def error_rate(self, model):
+        with self._lock:
+            errores = list(self._outcomes.get(model, ()))
+        return sum(errores) / len(errores) if errores else 0.0
+
+    def stats(self):
+        with self._lock:
+            latencias = {k: list(v) for k, v in self._latencies.items()}
+            modelos = {m: list(v) for m, v in self._outcomes.items()}
+        por_ruta = {}
+        for (ruta, model), values in sorted(latencias.items(), key=lambda kv: (str(kv[0][0]), kv[0][1])):
+            por_ruta.setdefault(ruta or '-', {})[model] = {
+                'samples': len(values),
+                'p50_seconds': round(_quantile(values, 0.5), 3),
+                'p95_seconds': round(_quantile(values, 0.95), 3),
+                'p99_seconds': round(_quantile(values, 0.99), 3),
+            }
+        return {
+            'latency': por_ruta,
+            'error_rate': {m: round(sum(v) / len(v), 3) for m, v in modelos.items() if v},
+        }
+
+
+class Route:
+    """
+    Decisión del router para una llamada: modelo, alternativo y cuándo duplicar.
+    hedge_after: segundos tras los que se envía el duplicado (None = no duplicar).
+    failover: True si `model` es el alternativo porque el principal no está sano.
+    """
+
+    __slots__ = ('name', 'model', 'alternate', 'max_output_tokens', 'hedge_after', 'failover')
+
+    def __init__(self, name, model, alternate=None, max_output_tokens=None, hedge_after=None, failover=False):
+        self.name = name
+        self.model = model
+        self.alternate = alternate
+        self.max_output_tokens = max_output_tokens
+        self.hedge_after = hedge_after
+        self.failover = failover
+
+
+class ModelRouter:
+    """
+    Elige el modelo de cada llamada según la ruta (endpoint y tipo de sesión) y
+    lo que observó el LatencyTracker:
+
+      - si el modelo principal tiene el circuito abierto o una tasa de error
+        mayor que max_error_rate y el alternativo está mejor, se usa el alternativo;
+      - el duplicado se envía cuando la llamada supera el p95 observado de esa
+        ruta (nunca antes de min_hedge_delay), así que sale en ~5% de las llamadas.
+    """
+
+    def __init__(self, routes, gateway, hedge_quantile=0.95, min_hedge_delay=0.5, max_error_rate=0.5):
+        self.routes = routes
+        self.gateway = gateway
+        self.tracker = gateway.tracker
+        self.hedge_quantile = hedge_quantile
+        self.min_hedge_delay = min_hedge_delay
+        self.max_error_rate = max_error_rate
+        self.failovers = 0
+
+    def _health(self, model):
+        # (circuito abierto y enfriándose, tasa de error reciente): menor es mejor
+        breaker = self.gateway.breakers.get(model)
+        cooling = breaker is not None and breaker.state == breaker.OPEN and breaker.retry_after() > 0
+        return cooling, self.tracker.error_rate(model)
+
+    def _unhealthy(self, model):
+        cooling, error_rate = self._health(model)
+        return cooling or error_rate > self.max_error_rate
+
+    def _resolve(self, nombre):
+        config = self.routes.get(nombre) or self.routes['suggest']
+        model, alternate = config['model'], config.get('alternate')
+        failover = bool(alternate) and self._unhealthy(model) and self._health(alternate) < self._health(model)
+        if failover:
+            model, alternate = alternate, model
+
+        hedge_after = None
+        if alternate:
+            p95 = self.tracker.quantile(model, self.hedge_quantile, ruta=nombre)
+            if p95 is not None:
+                hedge_after = max(self.min_hedge_delay, p95)
+        return Route(nombre, model, alternate, config.get('max_output_tokens'), hedge_after, failover)
+
+    def route(self, nombre):
+        route = self._resolve(nombre)
+        if route.failover:
+            self.failovers += 1
+        return route
+
+    def stats(self):
+        rutas = {}
+        for nombre in self.routes:
+            route = self._resolve(nombre)
+            rutas[nombre] = {
+                'model': route.model,
+                'alternate': route.alternate,
+                'max_output_tokens': route.max_output_tokens,
+                'hedge_after_seconds': round(route.hedge_after, 3) if route.hedge_after else None,
+            }
+        return {'routes': rutas, 'failovers': self.failovers, **self.tracker.stats()}
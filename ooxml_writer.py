@@ -0,0 +1,131 @@
+import re
+import struct
+import time
+import zipfile
+import zlib
+from io import BytesIO
+
+
+# Marcadores de posición: caracteres de uso privado que python-docx deja intactos
+_SLOT = '\ue000{}\ue001'
+_SLOT_RE = re.compile('<w:t>\ue000(\\w+)\ue001</w:t>'.encode('utf-8'))
+# Caracteres que no se pueden escribir en XML 1.0 (python-docx/lxml también los rechaza)
+_INVALID_XML_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]')
+_RUN_SPLIT_RE = re.compile('([\t\r\n])')
+
+
+class SlotRecorder(dict):
+    """
+    Diccionario de campos que devuelve un marcador por cada clave pedida, para
+    compilar un diseño escrito con python-docx.
+    """
+
+    def __missing__(self, key):
+        value = _SLOT.format(key)
+        self[key] = value
+        return value
+
+
+def _escape(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def run_content_xml(text):
+    """
+    Contenido de un <w:r> para `text`, igual que lo arma python-docx: tramos en
+    <w:t> (con xml:space="preserve" si tienen espacios en los extremos), <w:tab/>
+    por cada tabulación y <w:br/> por cada salto de línea.
+    """
+    if _INVALID_XML_RE.search(text):
+        raise ValueError("El texto contiene caracteres no válidos en XML")
+    out = []
+    for part in _RUN_SPLIT_RE.split(text):
+        if not part:
+            continue
+        if part == '\t':
+            out.append('<w:tab/>')
+        elif part in '\r\n':
+            out.append('<w:br/>')
+        elif len(part.strip()) < len(part):
+            out.append(f'<w:t xml:space="preserve">{_escape(part)}</w:t>')
+        else:
+            out.append(f'<w:t>{_escape(part)}</w:t>')
+    return ''.join(out).encode('utf-8')
+
+
+def _dos_datetime(t):
+    return ((t.tm_year - 1980) << 9 | t.tm_mon << 5 | t.tm_mday,
+            t.tm_hour << 11 | t.tm_min << 5 | t.tm_sec // 2)
+
+
+class _Entry:
+    """
+    Un miembro del ZIP con su CRC y su contenido ya comprimido (deflate crudo).
+    """
+
+    __slots__ = ('name', 'crc', 'size', 'data')
+
+    def __init__(self, name, raw):
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        self.name = name.encode('utf-8')
+        self.crc = zlib.crc32(raw)
+        self.size = len(raw)
+        self.data = compressor.compress(raw) + compressor.flush()
+
+
+def write_zip(entries):
+    """
+    Escribe el paquete ZIP directamente (cabeceras locales + directorio central)
+    a partir de miembros ya comprimidos.
+    """
+    date, clock = _dos_datetime(time.localtime())
+    out = BytesIO()
+    central = []
+    for e in entries:
+        offset = out.tell()
+        out.write(struct.pack('<IHHHHHIIIHH', 0x04034b50, 20, 0, zipfile.ZIP_DEFLATED, clock, date,
+                              e.crc, len(e.data), e.size, len(e.name), 0))
+        out.write(e.name)
+        out.write(e.data)
+        central.append(struct.pack('<IHHHHHHIIIHHHHHII', 0x02014b50, 0x0314, 20, 0, zipfile.ZIP_DEFLATED,
+                                   clock, date, e.crc, len(e.data), e.size, len(e.name), 0, 0, 0, 0,
+                                   0o600 << 16, offset) + e.name)
+    start = out.tell()
+    directory = b''.join(central)
+    out.write(directory)
+    out.write(struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, len(entries), len(entries), len(directory), start, 0))
+    return out.getvalue()
+
+
+class CompiledDocx:
+    """
+    Documento de diseño fijo compilado una sola vez: las partes estáticas del
+    paquete quedan comprimidas y word/document.xml se guarda partido en los
+    marcadores. Cada render solo rellena los textos y escribe el ZIP.
+    """
+
+    DOCUMENT_PART = 'word/document.xml'
+
+    def __init__(self, docx_bytes):
+        with zipfile.ZipFile(BytesIO(docx_bytes)) as zf:
+            names = zf.namelist()
+            parts = {name: zf.read(name) for name in names}
+
+        pieces = _SLOT_RE.split(parts[self.DOCUMENT_PART])
+        # split alterna texto fijo y nombre de campo: [fijo, campo, fijo, campo, ..., fijo]
+        self.fixed = pieces[0::2]
+        self.slots = [p.decode('utf-8') for p in pieces[1::2]]
+        self.names = names
+        self.static = {name: _Entry(name, raw) for name, raw in parts.items() if name != self.DOCUMENT_PART}
+
+    def document_xml(self, values):
+        out = [self.fixed[0]]
+        for slot, fixed in zip(self.slots, self.fixed[1:]):
+            value = values[slot]
+            out.append(run_content_xml(str(value) if value else '-'))
+            out.append(fixed)
+        return b''.join(out)
+
+    def render(self, values):
+        document = _Entry(self.DOCUMENT_PART, self.document_xml(values))
+        return write_zip([document if name == self.DOCUMENT_PART else self.static[name] for name in self.names])
@@ -0,0 +1,156 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+
+def normalize_text(value):
+    """
+    Normaliza un texto para usarlo como parte de una clave de caché:
+    minúsculas, sin tildes y con los espacios colapsados.
+    """
+    text = unicodedata.normalize('NFKD', str(value or ''))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r'\s+', ' ', text).strip().lower()
+    return text
+
+
+def make_key(*parts):
+    """
+    Construye una clave estable a partir de varios campos normalizados.
+    """
+    return '|'.join(normalize_text(p) for p in parts)
+
+
+class ResponseCache:
+    """
+    Caché LRU con TTL respaldada en SQLite, compartida entre workers de gunicorn
+    y persistente entre reinicios.
+    """
+
+    def __init__(self, path, max_entries=5000, ttl=7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+            'created REAL NOT NULL, last_access REAL NOT NULL, version INTEGER NOT NULL DEFAULT 1)'
+        )
+        columnas = {row[1] for row in self._conn.execute('PRAGMA table_info(cache)')}
+        if 'version' not in columnas:
+            # Bases creadas antes de compare_and_set
+            self._conn.execute('ALTER TABLE cache ADD COLUMN version INTEGER NOT NULL DEFAULT 1')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_access ON cache(last_access)')
+        self._conn.commit()
+
+    def get(self, key):
+        return self.get_versioned(key)[0]
+
+    def get_versioned(self, key):
+        """
+        (valor, versión) de la clave, o (None, None) si no está o expiró.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, created, version FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None, None
+            self._conn.execute('UPDATE cache SET last_access = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0]), row[2]
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO cache (key, value, created, last_access, version) VALUES (?, ?, ?, ?, 1)',
+                (key, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def compare_and_set(self, key, value, version):
+        """
+        Reemplaza el valor solo si la clave sigue en `version` (atómico también
+        entre procesos). Devuelve True si se guardó; la versión pasa a version + 1.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                'UPDATE cache SET value = ?, created = ?, last_access = ?, version = version + 1 '
+                'WHERE key = ? AND version = ? AND created >= ?',
+                (json.dumps(value, ensure_ascii=False), now, now, key, version, now - self.ttl)
+            )
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+            self._conn.commit()
+
+    def items(self):
+        """
+        Pares (clave, valor) vigentes, sin tocar last_access (para procesos offline).
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT key, value FROM cache WHERE created >= ?', (time.time() - self.ttl,)
+            ).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def _evict(self, now):
+        # Primero lo expirado, luego lo menos usado recientemente
+        self._conn.execute('DELETE FROM cache WHERE created < ?', (now - self.ttl,))
+        self._conn.execute(
+            'DELETE FROM cache WHERE key IN ('
+            'SELECT key FROM cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,)
+        )
+
+    def stats(self):
+        with self._lock:
+            size = self._conn.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+            'entries': size,
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl,
+        }
+
+
+def data_path(filename):
+    """
+    Ruta de un archivo de datos locales dentro de CACHE_DIR. Por defecto es
+    instance/ junto a app.py (la carpeta de instancia de Flask), que no se sirve
+    por HTTP: ahí quedan las sesiones de los docentes.
+    """
+    cache_dir = os.environ.get('CACHE_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance')
+    os.makedirs(cache_dir, exist_ok=True)
+    return os.path.join(cache_dir, filename)
+
+
+def open_cache(filename, **kwargs):
+    """
+    Abre una caché SQLite dentro de CACHE_DIR.
+    """
+    return ResponseCache(data_path(filename), **kwargs)
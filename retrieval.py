@@ -0,0 +1,167 @@
+import math
+import threading
+
+import numpy as np
+
+from response_cache import normalize_text
+
+
+# campo (tal como lo envía el frontend, normalizado) -> tipo de documento del corpus
+CAMPO_TIPOS = {
+    'competencia': 'competencia',
+    'capacidad': 'capacidad',
+    'desempeno': 'desempeno',
+    'comp transversal': 'competencia_transversal',
+    'competencia transversal': 'competencia_transversal',
+    'cap transversal': 'capacidad_transversal',
+    'capacidad transversal': 'capacidad_transversal',
+    'enfoque': 'enfoque',
+    'valor': 'valor',
+}
+
+
+def char_ngrams(text, n=3):
+    padded = f" {normalize_text(text)} "
+    return [padded[i:i + n] for i in range(len(padded) - n + 1)]
+
+
+class CurriculumRetriever:
+    """
+    Motor de recuperación local sobre el texto del currículo: vectores TF-IDF de
+    n-gramas de caracteres precalculados con NumPy al iniciar. Si el mejor
+    candidato supera el umbral, /suggest responde sin llamar a Gemini.
+    """
+
+    def __init__(self, curriculo, ngram=3):
+        self.ngram = ngram
+        self.docs = []
+        self._collect(curriculo)
+
+        vocab = {}
+        rows = []
+        for doc in self.docs:
+            counts = {}
+            for g in char_ngrams(doc['texto'], ngram):
+                j = vocab.setdefault(g, len(vocab))
+                counts[j] = counts.get(j, 0) + 1
+            rows.append(counts)
+        self.vocab = vocab
+
+        tf = np.zeros((len(self.docs), len(vocab)), dtype=np.float32)
+        for i, counts in enumerate(rows):
+            for j, c in counts.items():
+                tf[i, j] = c
+        df = (tf > 0).sum(axis=0)
+        self.idf = (np.log((1 + len(self.docs)) / (1 + df)) + 1).astype(np.float32)
+        matrix = tf * self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.matrix = matrix / np.where(norms == 0, 1, norms)
+
+        # Índices de filas por tipo para filtrar sin recorrer todo el corpus
+        self._by_tipo = {}
+        for i, doc in enumerate(self.docs):
+            self._by_tipo.setdefault(doc['tipo'], []).append(i)
+        self._by_tipo = {t: np.array(ids) for t, ids in self._by_tipo.items()}
+        self._areas = np.array([doc.get('area') or '' for doc in self.docs], dtype=object)
+        self._grados = np.array([normalize_text(doc.get('grado', '')) for doc in self.docs], dtype=object)
+
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.below_threshold = 0
+        # Campos sin equivalente en el currículo (van siempre a la IA)
+        self.unsupported = 0
+        self.forced_ai = 0
+
+    def _collect(self, curriculo):
+        def add(tipo, texto, **extra):
+            self.docs.append(dict(tipo=tipo, texto=texto, **extra))
+
+        for area, comps in curriculo.curriculo.items():
+            for comp, caps in comps.items():
+                add('competencia', comp, area=area)
+                for cap in caps:
+                    add('capacidad', cap, area=area, competencia=comp)
+        # desempenos_data: {"Competencia": {"Grado": ["D1", ...]}}
+        for comp, por_grado in curriculo.data.get('desempenos_data', {}).items():
+            areas = [a for a, comps in curriculo.curriculo.items() if comp in comps] or [None]
+            for grado, desempenos in por_grado.items():
+                for area in areas:
+                    for d in desempenos:
+                        add('desempeno', d, area=area, competencia=comp, grado=grado)
+        for comp, caps in curriculo.transversales.items():
+            add('competencia_transversal', comp)
+            for cap in caps:
+                add('capacidad_transversal', cap, competencia=comp)
+        for enfoque, info in curriculo.enfoques.items():
+            add('enfoque', enfoque)
+            for valor in info.get('valores', []):
+                add('valor', valor, enfoque=enfoque)
+
+    def _vector(self, text):
+        q = np.zeros(len(self.vocab), dtype=np.float32)
+        for g in char_ngrams(text, self.ngram):
+            j = self.vocab.get(g)
+            if j is not None:
+                q[j] += 1
+        q *= self.idf
+        norm = np.linalg.norm(q)
+        return q / norm if norm else q
+
+    def rank(self, tema, tipo, area=None, grado=None, k=4):
+        """
+        Devuelve hasta k pares (puntaje, texto) ordenados por similitud con el tema.
+        """
+        rows = self._by_tipo.get(tipo)
+        if rows is None or not len(rows):
+            return []
+        if area is not None and tipo in ('competencia', 'capacidad', 'desempeno'):
+            rows = rows[self._areas[rows] == area]
+        if grado and tipo == 'desempeno':
+            rows = rows[self._grados[rows] == normalize_text(grado)]
+        if not len(rows):
+            return []
+
+        scores = self.matrix[rows] @ self._vector(tema)
+        top = np.argsort(-scores)[:k]
+        resultados = []
+        vistos = set()
+        for t in top:
+            texto = self.docs[rows[t]]['texto']
+            if texto not in vistos:
+                vistos.add(texto)
+                resultados.append((float(scores[t]), texto))
+        return resultados
+
+    def suggest(self, tema, campo, area, grado, threshold, min_results=2):
+        """
+        Sugerencias locales si hay confianza suficiente; None para ir por la IA.
+        """
+        tipo = CAMPO_TIPOS.get(normalize_text(campo).replace('_', ' '))
+        if tipo is None:
+            with self._lock:
+                self.unsupported += 1
+            return None
+        ranked = self.rank(tema, tipo, area=area, grado=grado)
+        if len(ranked) < min_results or ranked[0][0] < threshold or math.isnan(ranked[0][0]):
+            with self._lock:
+                self.below_threshold += 1
+            return None
+        with self._lock:
+            self.local_hits += 1
+        return [texto for _, texto in ranked]
+
+    def record_forced(self):
+        with self._lock:
+            self.forced_ai += 1
+
+    def stats(self):
+        total = self.local_hits + self.below_threshold + self.unsupported + self.forced_ai
+        return {
+            'documents': len(self.docs),
+            'vocabulary': len(self.vocab),
+            'served_locally': self.local_hits,
+            'sent_to_ai': self.below_threshold + self.unsupported,
+            'unsupported_field': self.unsupported,
+            'forced_ai': self.forced_ai,
+            'local_ratio': round(self.local_hits / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,248 @@
+import json
+import threading
+
+from google.genai import types
+
+from json_extract import extract_json_detail
+
+
+# Esquemas JSON de las respuestas de Gemini (modo de salida estructurada)
+_TEXTO = {'type': 'string'}
+_LISTA_TEXTO = {'type': 'array', 'items': _TEXTO}
+
+SESION_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'titulo_sesion': _TEXTO,
+        'proposito': _TEXTO,
+        'evidencia': _TEXTO,
+        'estandar_aprendizaje': _TEXTO,
+        'datos_adicionales': {
+            'type': 'object',
+            'properties': {
+                'competencia_transversal': _TEXTO,
+                'capacidad_transversal': _TEXTO,
+                'enfoque_transversal': _TEXTO,
+                'valor_asociado': _TEXTO,
+                'tiempo_total': _TEXTO,
+            },
+            'required': ['competencia_transversal', 'capacidad_transversal', 'enfoque_transversal',
+                         'valor_asociado', 'tiempo_total'],
+        },
+        'criterios_evaluacion': _LISTA_TEXTO,
+        'secuencia_didactica': {
+            'type': 'object',
+            'properties': {'inicio': _TEXTO, 'desarrollo': _TEXTO, 'cierre': _TEXTO},
+            'required': ['inicio', 'desarrollo', 'cierre'],
+        },
+    },
+    'required': ['titulo_sesion', 'proposito', 'evidencia', 'estandar_aprendizaje', 'datos_adicionales',
+                 'criterios_evaluacion', 'secuencia_didactica'],
+}
+
+EPT_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'competencias': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'nombre': _TEXTO,
+                    'capacidades': _LISTA_TEXTO,
+                    'desempenos': _LISTA_TEXTO,
+                },
+                'required': ['nombre', 'capacidades', 'desempenos'],
+            },
+        },
+    },
+    'required': ['competencias'],
+}
+
+
+def sugerencias_schema(campo):
+    """
+    Esquema de /suggest: la clave depende del campo ("desempeno_sugerencias", ...).
+    """
+    key = f"{campo}_sugerencias"
+    return {
+        'type': 'object',
+        'properties': {key: _LISTA_TEXTO},
+        'required': [key],
+    }
+
+
+def sugerencias_bulk_schema(claves):
+    """
+    Esquema de /suggest_bulk: una lista "<clave>_sugerencias" por cada campo pedido.
+    """
+    keys = [f"{clave}_sugerencias" for clave in claves]
+    return {
+        'type': 'object',
+        'properties': {key: _LISTA_TEXTO for key in keys},
+        'required': keys,
+    }
+
+
+def seccion_schema(path):
+    """
+    Esquema de /regenerate_section: {"<última clave>": <subesquema de SESION_SCHEMA>}.
+    None si la ruta no existe en la sesión.
+    """
+    schema = SESION_SCHEMA
+    for key in path:
+        schema = schema.get('properties', {}).get(key)
+        if schema is None:
+            return None
+    return {'type': 'object', 'properties': {path[-1]: schema}, 'required': [path[-1]]}
+
+
+def structured_config(schema, max_output_tokens=None):
+    """
+    Configuración de generación que obliga a Gemini a responder JSON con el esquema dado.
+    """
+    return types.GenerateContentConfig(
+        response_mime_type='application/json',
+        response_json_schema=schema,
+        max_output_tokens=max_output_tokens,
+    )
+
+
+def generation_config(schema=None, max_output_tokens=None):
+    """
+    Configuración de una llamada: salida estructurada si hay esquema y, en
+    cualquier caso, el tope de tokens de la ruta. None si no hace falta ninguna.
+    """
+    if schema is not None:
+        return structured_config(schema, max_output_tokens)
+    if max_output_tokens:
+        return types.GenerateContentConfig(max_output_tokens=max_output_tokens)
+    return None
+
+
+_TIPOS = {
+    'object': dict,
+    'array': list,
+    'string': str,
+    'number': (int, float),
+    'integer': int,
+    'boolean': bool,
+}
+
+
+def validate(data, schema, path='$'):
+    """
+    Valida un objeto contra el subconjunto de JSON Schema que usan estos esquemas
+    (type, properties, required, items). Devuelve una lista de errores.
+    """
+    tipo = schema.get('type')
+    if tipo and not isinstance(data, _TIPOS[tipo]):
+        return [f"{path}: se esperaba {tipo}"]
+    errores = []
+    if tipo == 'object':
+        for key in schema.get('required', []):
+            if key not in data:
+                errores.append(f"{path}.{key}: falta")
+        for key, sub in schema.get('properties', {}).items():
+            if key in data:
+                errores.extend(validate(data[key], sub, f"{path}.{key}"))
+    elif tipo == 'array' and 'items' in schema:
+        for i, item in enumerate(data):
+            errores.extend(validate(item, schema['items'], f"{path}[{i}]"))
+    return errores
+
+
+# Contadores del modo estructurado (para /llm_stats)
+_stats_lock = threading.Lock()
+STRUCTURED_STATS = {
+    # Objeto ya parseado por el SDK y conforme al esquema
+    'structured': 0,
+    # Reparadas con extract_json (el modo texto habría hecho lo mismo)
+    'repaired': 0,
+    # Respuestas que en modo texto habrían terminado en error y aquí se recuperaron
+    'parse_failures_avoided': 0,
+    'schema_errors': 0,
+    'failed': 0,
+}
+
+
+def count(key):
+    with _stats_lock:
+        STRUCTURED_STATS[key] += 1
+
+
+def structured_stats():
+    with _stats_lock:
+        return dict(STRUCTURED_STATS)
+
+
+class SchemaError(json.JSONDecodeError):
+    """
+    Respuesta con JSON válido pero fuera del esquema. Es un JSONDecodeError para
+    que los endpoints la traten igual que una respuesta ilegible (.doc = texto).
+    """
+
+    def __init__(self, errores, text):
+        mensaje = f"Respuesta fuera del esquema: {'; '.join(errores[:5])}"
+        super().__init__(mensaje, text, 0)
+        # Sin el sufijo "line 1 column 1 (char 0)": el JSON en sí estaba bien
+        self.args = (mensaje,)
+        self.errores = errores
+
+
+def _wrap_list(data, schema):
+    # La IA a veces devuelve directamente la lista (p. ej. las competencias EPT sin la clave)
+    props = schema.get('properties', {})
+    if isinstance(data, list) and schema.get('type') == 'object' and len(props) == 1:
+        (key, sub), = props.items()
+        if sub.get('type') == 'array':
+            return {key: data}
+    return None
+
+
+def parse_structured(text, schema, parsed=None):
+    """
+    Como parse_structured_detail, pero devuelve solo el objeto.
+    """
+    return parse_structured_detail(text, schema, parsed)[0]
+
+
+def parse_structured_detail(text, schema, parsed=None):
+    """
+    Devuelve el objeto de una respuesta en modo estructurado. Usa lo que ya
+    parseó el SDK (response.parsed); si no hay, parsea el texto y, si vino
+    truncado o con basura, lo repara con extract_json. Lanza
+    json.JSONDecodeError si no hay JSON recuperable y SchemaError si el objeto
+    no cumple el esquema (p. ej. una sesión truncada sin sus secciones).
+    Devuelve (objeto, truncado): truncado es True si hubo que cortar la respuesta.
+    """
+    data = parsed
+    repaired = wrapped = truncated = False
+    if data is None:
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            try:
+                data, truncated = extract_json_detail(text)
+            except json.JSONDecodeError:
+                count('failed')
+                raise
+            repaired = True
+
+    lista = _wrap_list(data, schema)
+    if lista is not None:
+        data = lista
+        wrapped = True
+
+    errores = validate(data, schema)
+    if errores:
+        count('schema_errors')
+        raise SchemaError(errores, text)
+    if wrapped:
+        # En modo texto la lista suelta no habría tenido la forma del esquema
+        count('parse_failures_avoided')
+    elif repaired:
+        count('repaired')
+    else:
+        count('structured')
+    return data, truncated
@@ -0,0 +1,191 @@
+import copy
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from response_cache import ResponseCache, data_path
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class MemoryBackend:
+    """
+    Almacén en memoria del proceso (LRU + TTL). Solo sirve con un único worker.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def get(self, key):
+        return self.get_versioned(key)[0]
+
+    def get_versioned(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None, None
+            created, value, version = item
+            if time.time() - created > self.ttl:
+                del self._items[key]
+                return None, None
+            self._items.move_to_end(key)
+            return value, version
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = (time.time(), value, 1)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def compare_and_set(self, key, value, version):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[2] != version or time.time() - item[0] > self.ttl:
+                return False
+            self._items[key] = (time.time(), value, version + 1)
+            self._items.move_to_end(key)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._items), 'max_entries': self.max_entries, 'ttl_seconds': self.ttl}
+
+
+class RedisBackend:
+    """
+    Almacén en Redis (o un sustituto local compatible). La expiración la maneja
+    Redis con SETEX; el tope de memoria se configura con maxmemory/allkeys-lru.
+    La versión de cada sesión va en una clave aparte ("<clave>:version").
+    """
+
+    def __init__(self, url, ttl, prefix='sesion:'):
+        if redis is None:
+            # Dependencia opcional: solo hace falta con SESSION_BACKEND=redis
+            raise RuntimeError("SESSION_BACKEND=redis requiere el paquete 'redis' (pip install redis), "
+                               "que no está en requirements.txt.")
+        self.ttl = ttl
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self.get_versioned(key)[0]
+
+    def get_versioned(self, key):
+        raw, version = self._redis.mget(self.prefix + key, self.prefix + key + ':version')
+        if raw is None:
+            return None, None
+        return json.loads(raw), int(version or 1)
+
+    def set(self, key, value):
+        with self._redis.pipeline() as pipe:
+            pipe.setex(self.prefix + key, self.ttl, json.dumps(value, ensure_ascii=False))
+            pipe.setex(self.prefix + key + ':version', self.ttl, 1)
+            pipe.execute()
+
+    def compare_and_set(self, key, value, version):
+        clave_version = self.prefix + key + ':version'
+        with self._redis.pipeline() as pipe:
+            try:
+                # WATCH: si otro proceso cambia la versión antes del EXEC, no se escribe nada
+                pipe.watch(clave_version)
+                if not pipe.exists(self.prefix + key) or int(pipe.get(clave_version) or 1) != version:
+                    return False
+                pipe.multi()
+                pipe.setex(self.prefix + key, self.ttl, json.dumps(value, ensure_ascii=False))
+                pipe.setex(clave_version, self.ttl, version + 1)
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                return False
+
+    def delete(self, key):
+        self._redis.delete(self.prefix + key, self.prefix + key + ':version')
+
+    def stats(self):
+        return {'ttl_seconds': self.ttl}
+
+
+class SessionStore:
+    """
+    Sesiones generadas, identificadas por un session_id, para que /download
+    devuelva la sesión correcta sin importar qué worker la atienda.
+
+    Cada sesión tiene una versión (1 al guardarla) que update() incrementa con
+    compare-and-set, así dos workers que la modifican a la vez no se pisan.
+    """
+
+    UPDATE_ATTEMPTS = 5
+
+    def __init__(self, backend, name):
+        self.backend = backend
+        self.name = name
+
+    def save(self, datos_form, sesion, session_id=None):
+        session_id = session_id or uuid.uuid4().hex
+        self.backend.set(session_id, {'datos_form': datos_form, 'sesion': sesion})
+        return session_id
+
+    def get(self, session_id):
+        """
+        {'datos_form', 'sesion', 'version'} o None si no existe (o expiró).
+        """
+        if not session_id:
+            return None
+        guardada, version = self.backend.get_versioned(session_id)
+        if guardada is None:
+            return None
+        return {**guardada, 'version': version}
+
+    def update(self, session_id, cambiar):
+        """
+        Aplica cambiar(datos_form, sesion) (que modifica la sesión en el lugar) sobre
+        la versión guardada y la escribe solo si nadie la cambió mientras tanto; si
+        otro worker ganó, se relee y se vuelve a aplicar. Devuelve lo mismo que get().
+        """
+        for _ in range(self.UPDATE_ATTEMPTS):
+            guardada, version = self.backend.get_versioned(session_id)
+            if guardada is None:
+                return None
+            # Copia: el backend en memoria devuelve el objeto guardado
+            guardada = copy.deepcopy(guardada)
+            cambiar(guardada['datos_form'], guardada['sesion'])
+            if self.backend.compare_and_set(session_id, guardada, version):
+                return {**guardada, 'version': version + 1}
+        raise RuntimeError(f"La sesión {session_id} cambió {self.UPDATE_ATTEMPTS} veces seguidas; intenta de nuevo.")
+
+    def delete(self, session_id):
+        self.backend.delete(session_id)
+
+    def stats(self):
+        stats = self.backend.stats()
+        stats['backend'] = self.name
+        return stats
+
+
+def create_session_store():
+    """
+    Crea el almacén según SESSION_BACKEND: "sqlite" (por defecto), "memory" o "redis".
+    """
+    backend = os.environ.get('SESSION_BACKEND', 'sqlite').lower()
+    max_entries = int(os.environ.get('SESSION_MAX', 2000))
+    ttl = int(os.environ.get('SESSION_TTL', 24 * 3600))
+
+    if backend == 'memory':
+        return SessionStore(MemoryBackend(max_entries, ttl), 'memory')
+    if backend == 'redis':
+        return SessionStore(RedisBackend(os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0'), ttl), 'redis')
+    return SessionStore(ResponseCache(data_path('sessions.sqlite3'), max_entries=max_entries, ttl=ttl), 'sqlite')
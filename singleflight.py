@@ -0,0 +1,110 @@
+import asyncio
+import copy
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas idénticas que están en curso al mismo tiempo: la primera
+    ejecuta la función y las demás esperan y reciben su mismo resultado (o error).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            # Copia para que ningún request modifique el resultado de otro
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._calls)
+        total = self.executed + self.coalesced
+        return {
+            'upstream_calls': self.executed,
+            'calls_saved': self.coalesced,
+            'saved_ratio': round(self.coalesced / total, 4) if total else 0.0,
+            'in_flight': in_flight,
+        }
+
+
+class AsyncSingleFlight:
+    """
+    Versión para corrutinas de SingleFlight (un solo event loop, sin hilos):
+    la primera corrutina con una clave lanza `fn()` como tarea propia y todas
+    (incluida ella) la esperan con shield, así cancelar a cualquiera de ellas,
+    también a la primera, no cancela la llamada compartida de las demás.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        task = self._calls.get(key)
+        if task is not None:
+            self.coalesced += 1
+            result = await asyncio.shield(task)
+            # Copia para que ningún request modifique el resultado de otro
+            return copy.deepcopy(result)
+
+        task = asyncio.get_running_loop().create_task(fn())
+        self._calls[key] = task
+        self.executed += 1
+        task.add_done_callback(lambda t: self._finished(key, t))
+        return await asyncio.shield(task)
+
+    def _finished(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Evita el aviso "exception was never retrieved" cuando ya nadie esperaba
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        total = self.executed + self.coalesced
+        return {
+            'upstream_calls': self.executed,
+            'calls_saved': self.coalesced,
+            'saved_ratio': round(self.coalesced / total, 4) if total else 0.0,
+            'in_flight': len(self._calls),
+        }
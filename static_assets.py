@@ -0,0 +1,184 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+import time
+
+from flask import Response, request, send_file, abort
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from build_assets import DIST_DIR, ROOT
+
+
+# Solo los archivos con hash de contenido pueden cachearse "para siempre"
+_HASHED_RE = re.compile(r'\.[0-9a-f]{10}\.\w+$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+# Archivos de la raíz del proyecto que pide el frontend sin build. Solo estos se
+# sirven: el resto de la carpeta (código, cachés SQLite, sesiones) no es público.
+PUBLIC_FILES = ('styles.css', 'script.js', 'minedu_data.js', 'RIO.png', 'animales.png', 'arbol.png', '1.png')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def negotiate(path):
+    """
+    Devuelve (ruta, encoding) de la mejor variante precomprimida que acepta el
+    navegador (br, luego gzip), o la original con encoding None.
+    """
+    aceptados = [enc for enc, ext in ENCODINGS if os.path.exists(path + ext)]
+    best = request.accept_encodings.best_match(aceptados) if aceptados else None
+    if best is None:
+        return path, None
+    return path + dict(ENCODINGS)[best], best
+
+
+def send_precompressed(path, cache_control):
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    ruta, encoding = negotiate(path)
+    response = send_file(ruta, mimetype=mimetype, conditional=True, etag=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def built_page(name, dist_dir=DIST_DIR):
+    """
+    Ruta del HTML generado por build_assets.py, o None si no se corrió el build.
+    """
+    path = os.path.join(dist_dir, name)
+    return path if os.path.exists(path) else None
+
+
+class _Page:
+    __slots__ = ('path', 'mtime', 'bodies', 'etags')
+
+    def __init__(self, path, mtime, bodies):
+        self.path = path
+        self.mtime = mtime
+        self.bodies = bodies
+        digest = hashlib.sha256(bodies[None]).hexdigest()[:20]
+        # ETag fuerte distinto por representación (identity, br, gzip)
+        self.etags = {enc: f"{digest}-{enc}" if enc else digest for enc in bodies}
+
+
+class PageCache:
+    """
+    Páginas HTML de entrada en memoria, ya comprimidas en br/gzip. Se invalidan
+    por mtime, revisado como mucho cada `check_interval` segundos, así que el
+    camino caliente no lee disco. Responde 304 a If-None-Match con ETag fuerte.
+    """
+
+    def __init__(self, dist_dir=DIST_DIR, source_dir=ROOT, check_interval=2.0):
+        self.dist_dir = dist_dir
+        self.source_dir = source_dir
+        self.check_interval = check_interval
+        self._pages = {}
+        self._checked = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.not_modified = 0
+        self.loads = 0
+
+    def _resolve(self, name):
+        # Preferimos la versión de build_assets.py; si no hay build, el archivo original
+        return built_page(name, self.dist_dir) or os.path.join(self.source_dir, name)
+
+    def _read(self, path):
+        with open(path, 'rb') as f:
+            raw = f.read()
+        bodies = {None: raw}
+        for enc, ext in ENCODINGS:
+            if os.path.exists(path + ext):
+                with open(path + ext, 'rb') as f:
+                    bodies[enc] = f.read()
+        if 'gzip' not in bodies:
+            bodies['gzip'] = gzip.compress(raw, compresslevel=9, mtime=0)
+        if 'br' not in bodies and brotli is not None:
+            bodies['br'] = brotli.compress(raw, quality=11)
+        return bodies
+
+    def get(self, name):
+        """
+        Devuelve la página cacheada (recargándola si cambió su mtime), o None si no existe.
+        """
+        now = time.monotonic()
+        page = self._pages.get(name)
+        if page is not None and now - self._checked.get(name, 0) < self.check_interval:
+            return page
+        with self._lock:
+            page = self._pages.get(name)
+            self._checked[name] = now
+            path = self._resolve(name)
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                self._pages.pop(name, None)
+                return None
+            if page is None or page.path != path or page.mtime != mtime:
+                page = self._pages[name] = _Page(path, mtime, self._read(path))
+                self.loads += 1
+            return page
+
+    def response(self, name):
+        page = self.get(name)
+        if page is None:
+            return None
+        encoding = request.accept_encodings.best_match([e for e in page.bodies if e]) or None
+        etag = page.etags[encoding]
+        if request.if_none_match.contains(etag):
+            self.not_modified += 1
+            response = Response(status=304)
+        else:
+            self.hits += 1
+            response = Response(page.bodies[encoding], mimetype='text/html')
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.headers['Vary'] = 'Accept-Encoding'
+        # El HTML siempre se revalida: es lo que apunta a los archivos con hash
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    def stats(self):
+        return {
+            'pages': sorted(self._pages),
+            'hits': self.hits,
+            'not_modified': self.not_modified,
+            'loads': self.loads,
+        }
+
+
+def register_public_files(app, names=PUBLIC_FILES, root=ROOT):
+    """
+    Sirve en /<nombre> solo los archivos de la lista blanca (se revalidan siempre).
+    """
+
+    @app.route(f"/<any({', '.join(names)}):filename>")
+    def public_file(filename):
+        path = os.path.join(root, filename)
+        if not os.path.isfile(path):
+            abort(404)
+        return send_precompressed(path, 'no-cache')
+
+
+def register_static_assets(app, dist_dir=DIST_DIR):
+    """
+    Sirve static/dist con las variantes .br/.gz y cabeceras immutable para los
+    archivos con hash (las páginas HTML se revalidan siempre).
+    """
+
+    @app.route('/static/dist/<path:filename>')
+    def static_dist(filename):
+        path = os.path.realpath(os.path.join(dist_dir, filename))
+        if not path.startswith(os.path.realpath(dist_dir) + os.sep) or not os.path.isfile(path):
+            abort(404)
+        cache_control = IMMUTABLE if _HASHED_RE.search(filename) else 'no-cache'
+        return send_precompressed(path, cache_control)
@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+
+# La app abre sus SQLite y crea el cliente LLM al importarse: sin red ni datos reales
+os.environ.setdefault('LLM_BACKEND', 'fake')
+os.environ.setdefault('CACHE_DIR', tempfile.mkdtemp(prefix='sesiones-test-'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def pytest_configure(config):
+    # python -m pytest -m "not bench" omite los micro-benchmarks
+    config.addinivalue_line('markers', 'bench: compara un micro-benchmark con su baseline guardado')
@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+import bench_docx  # noqa: E402
+
+
+@pytest.mark.bench
+def test_render_docx_sin_regresiones():
+    # Tamaño y memoria son deterministas; el tiempo con holgura amplia porque el
+    # reloj de una máquina compartida varía bastante entre corridas
+    assert bench_docx.main(['--check', '--writer', 'ooxml', '--time-tolerance', '1.0']) == 0
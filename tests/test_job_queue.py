@@ -0,0 +1,30 @@
+import time
+
+from job_queue import JobQueue
+from response_cache import ResponseCache
+
+
+def cola(tmp_path):
+    return JobQueue(lambda payload: ({'ok': True}, 200, {}), ResponseCache(str(tmp_path / 'jobs.sqlite3')))
+
+
+def test_trabajo_huerfano_se_da_por_perdido(tmp_path):
+    jobs = cola(tmp_path)
+    # Encolado por un worker que ya no existe (se reinició antes de procesarlo)
+    jobs.store.set('viejo', {'job_id': 'viejo', 'estado': 'en_cola', 'creado': time.time() - 24 * 3600})
+    jobs.store.set('reciente', {'job_id': 'reciente', 'estado': 'en_cola', 'creado': time.time() - 5})
+
+    estado = jobs.status('viejo')
+
+    assert estado['estado'] == 'error' and estado['status'] == 503
+    assert jobs.store.get('viejo')['estado'] == 'error'
+    # Uno reciente puede estar en la cola de otro worker: se sigue esperando
+    assert jobs.status('reciente')['estado'] == 'en_cola'
+
+
+def test_trabajo_propio_no_se_da_por_perdido(tmp_path):
+    jobs = cola(tmp_path)
+    estado = jobs.submit({'tema': 'T'})
+
+    assert jobs.wait(estado['job_id'], 5)['estado'] == 'completado'
+    assert jobs.stats()['lost'] == 0
@@ -0,0 +1,46 @@
+from response_cache import ResponseCache
+from session_store import MemoryBackend, SessionStore
+
+
+def dos_workers(tmp_path):
+    # Dos procesos de gunicorn: cada uno con su conexión al mismo archivo
+    path = str(tmp_path / 'sessions.sqlite3')
+    return SessionStore(ResponseCache(path), 'sqlite'), SessionStore(ResponseCache(path), 'sqlite')
+
+
+def test_update_no_pisa_lo_que_guardo_otro_worker(tmp_path):
+    a, b = dos_workers(tmp_path)
+    session_id = a.save({'tema': 'T'}, {'proposito': 'P', 'evidencia': 'E'})
+
+    def cambiar_evidencia(datos, sesion):
+        # Mientras este worker aplica su cambio, el otro guarda otra sección
+        if sesion['proposito'] == 'P':
+            b.update(session_id, lambda d, s: s.update(proposito='P2'))
+        sesion['evidencia'] = 'E2'
+
+    guardada = a.update(session_id, cambiar_evidencia)
+
+    assert guardada['sesion'] == {'proposito': 'P2', 'evidencia': 'E2'}
+    assert guardada['version'] == 3
+    assert b.get(session_id) == guardada
+
+
+def test_compare_and_set_rechaza_version_vieja(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite3'))
+    cache.set('k', {'v': 1})
+    assert cache.get_versioned('k') == ({'v': 1}, 1)
+    assert cache.compare_and_set('k', {'v': 2}, 1)
+    assert not cache.compare_and_set('k', {'v': 3}, 1)
+    assert cache.get_versioned('k') == ({'v': 2}, 2)
+
+
+def test_update_en_memoria_y_sesion_inexistente():
+    store = SessionStore(MemoryBackend(10, 60), 'memory')
+    session_id = store.save({}, {'cierre': 'C'})
+    original = store.get(session_id)
+
+    guardada = store.update(session_id, lambda datos, sesion: sesion.update(cierre='C2'))
+
+    assert guardada == {'datos_form': {}, 'sesion': {'cierre': 'C2'}, 'version': 2}
+    assert original['sesion'] == {'cierre': 'C'}
+    assert store.update('no-existe', lambda datos, sesion: None) is None
@@ -0,0 +1,85 @@
+import copy
+import json
+
+import pytest
+
+import app
+from fake_genai import CANNED_SESION, FakeClient
+from schemas import SESION_SCHEMA, SchemaError, sugerencias_schema, structured_stats
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """
+    Reemplaza el cliente del gateway por un FakeClient con el handler dado.
+    """
+    def usar(handler):
+        client = FakeClient(handler=handler)
+        monkeypatch.setattr(app.llm_gateway, 'client', client)
+        return client
+    return usar
+
+
+def delta(antes):
+    despues = structured_stats()
+    return {k: despues[k] - antes[k] for k in despues if despues[k] != antes[k]}
+
+
+def test_sesion_valida_usa_el_esquema(fake_llm):
+    client = fake_llm(lambda model, prompt, config: CANNED_SESION)
+    antes = structured_stats()
+
+    data = app.generate_json('sesion_detallada', 'Sesión válida (prueba)', schema=SESION_SCHEMA)
+
+    assert data == CANNED_SESION
+    assert client.models.calls[0]['config'].response_json_schema == SESION_SCHEMA
+    assert delta(antes) == {'structured': 1}
+
+
+def test_sesion_fuera_del_esquema_falla(fake_llm):
+    incompleta = copy.deepcopy(CANNED_SESION)
+    del incompleta['secuencia_didactica']
+    fake_llm(lambda model, prompt, config: incompleta)
+    antes = structured_stats()
+
+    with pytest.raises(SchemaError) as info:
+        app.generate_json('sesion_detallada', 'Sesión sin secuencia (prueba)', schema=SESION_SCHEMA)
+
+    assert '$.secuencia_didactica: falta' in info.value.errores
+    assert json.loads(info.value.doc) == incompleta
+    assert delta(antes) == {'schema_errors': 1}
+
+
+def test_reparacion_no_cuenta_como_fallo_evitado(fake_llm):
+    # Respuesta truncada: extract_json la repara igual que en modo texto (sin el "Tr" a medias)
+    fake_llm(lambda model, prompt, config: '{"desempeno_sugerencias": ["Uno", "Dos", "Tr')
+    antes = structured_stats()
+
+    data, truncado = app.generate_json_detail('suggest', 'Sugerencias truncadas (prueba)',
+                                              schema=sugerencias_schema('desempeno'))
+
+    assert data == {'desempeno_sugerencias': ['Uno', 'Dos']}
+    assert truncado
+    assert delta(antes) == {'repaired': 1}
+
+
+def test_sugerencias_truncadas_no_se_cachean(fake_llm):
+    fake_llm(lambda model, prompt, config: '{"desempeno_sugerencias": ["Uno", "Dos", "Tr')
+    datos = {'tema': 'Sugerencias truncadas (caché)', 'nivel': 'Primaria', 'grado': '3er Grado',
+             'area': 'Matemática', 'campo': 'desempeno', 'force_ai': True}
+
+    respuesta = app.app.test_client().post('/suggest', json=datos)
+
+    assert respuesta.get_json()['sugerencias'] == ['Uno', 'Dos']
+    assert app.suggest_cache.get(app.make_key('desempeno', datos['tema'], datos['nivel'],
+                                              datos['grado'], datos['area'])) is None
+
+
+def test_lista_suelta_es_un_fallo_evitado(fake_llm):
+    fake_llm(lambda model, prompt, config: '["Uno", "Dos"]')
+    antes = structured_stats()
+
+    data = app.generate_json('suggest', 'Lista suelta (prueba)', schema=sugerencias_schema('desempeno'))
+
+    assert data == {'desempeno_sugerencias': ['Uno', 'Dos']}
+    assert delta(antes) == {'parse_failures_avoided': 1}
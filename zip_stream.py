@@ -0,0 +1,29 @@
+import zipfile
+
+
+class ZipStreamBuffer:
+    """
+    Destino no "seekable" para zipfile.ZipFile: acumula lo escrito y permite
+    vaciarlo por partes, de modo que el ZIP se envía al cliente a medida que
+    se agrega cada archivo.
+    """
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def open_zip_stream():
+    buffer = ZipStreamBuffer()
+    return buffer, zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED)